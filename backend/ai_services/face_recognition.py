@@ -1,42 +1,72 @@
-from deepface import DeepFace
 import os
-import shutil
-from fastapi import UploadFile
-import numpy as np
-import cv2
+import logging
+import threading
+from ..metrics import track_external
 
-# Ensure models are downloaded or handled
+logger = logging.getLogger(__name__)
+
+# DeepFace pulls in TensorFlow and OpenCV (several seconds, ~1 GB). It is imported on
+# first use, or ahead of time by warmup(), so the API starts without it.
 # DeepFace automatically downloads models to ~/.deepface/weights/
+MODEL_NAME = "Facenet512"
+
+_deepface = None
+_deepface_lock = threading.Lock()
+
+
+def _load_deepface():
+    global _deepface
+    if _deepface is None:
+        with _deepface_lock:
+            if _deepface is None:
+                from deepface import DeepFace
+                _deepface = DeepFace
+    return _deepface
+
 
 class FaceRecognitionService:
     @staticmethod
-    def generate_embedding(img_path: str):
+    def warmup():
+        """Import DeepFace and load the embedding model so the first upload does not pay for it."""
+        try:
+            _load_deepface().build_model(model_name=MODEL_NAME)
+            logger.info("%s loaded", MODEL_NAME)
+        except Exception as e:
+            logger.warning("Warmup failed: %s", e)
+
+    @staticmethod
+    def generate_embedding(image):
+        """Face embeddings for an image given as a path or a decoded BGR NumPy array."""
         try:
             # multiple faces? enforce_detection=False to avoid error if no face
-            embedding_objs = DeepFace.represent(
-                img_path=img_path,
-                model_name="Facenet512",
-                enforce_detection=False
-            )
+            DeepFace = _load_deepface()
+            with track_external("deepface", "represent"):
+                embedding_objs = DeepFace.represent(
+                    img_path=image,
+                    model_name=MODEL_NAME,
+                    enforce_detection=False
+                )
             # Return first detection for now, or all
             if embedding_objs:
                 return [obj["embedding"] for obj in embedding_objs]
             return []
         except Exception as e:
-            print(f"Error in generating embedding: {e}")
+            logger.warning("Could not generate face embedding: %s", e)
             return []
 
     @staticmethod
     def find_matches(img_path: str, db_path: str):
         # db_path should be a folder with images to compare against
         try:
-            dfs = DeepFace.find(
-                img_path=img_path,
-                db_path=db_path,
-                model_name="Facenet512",
-                enforce_detection=False
-            )
+            DeepFace = _load_deepface()
+            with track_external("deepface", "find"):
+                dfs = DeepFace.find(
+                    img_path=img_path,
+                    db_path=db_path,
+                    model_name=MODEL_NAME,
+                    enforce_detection=False
+                )
             return dfs
         except Exception as e:
-            print(f"Error in finding matches: {e}")
+            logger.warning("Could not find face matches: %s", e)
             return []
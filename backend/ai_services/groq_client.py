@@ -1,7 +1,12 @@
 import os
 import json
 import base64
-from groq import Groq
+import logging
+from ..metrics import track_external
+from ..ingest_utils import sniff_mime
+from ..log_utils import log_sampled
+
+logger = logging.getLogger(__name__)
 
 class GroqClient:
     client = None
@@ -11,8 +16,9 @@ class GroqClient:
         if not cls.client:
             api_key = os.getenv("GROQ_API_KEY")
             if not api_key:
-                print("Warning: GROQ_API_KEY not found.")
+                logger.warning("GROQ_API_KEY not found; AI features are disabled")
                 return None
+            from groq import Groq  # imported on first use; keeps it off the startup path
             cls.client = Groq(api_key=api_key)
         return cls.client
 
@@ -39,41 +45,59 @@ class GroqClient:
             if json_mode:
                 kwargs["response_format"] = {"type": "json_object"}
 
-            chat_completion = client.chat.completions.create(**kwargs)
+            with track_external("groq", "chat"):
+                chat_completion = client.chat.completions.create(**kwargs)
             content = chat_completion.choices[0].message.content
             if json_mode:
                 return json.loads(content)
             return content
         except Exception as e:
-            print(f"Groq API Error: {e}")
+            logger.warning("Groq API error: %s", e)
             return None
 
+    @staticmethod
+    def encode_image(image, filename: str = None) -> tuple[str, str]:
+        """
+        Base64-encode an image given as a path, bytes, or a seekable binary file
+        object (e.g. the upload spool — it is rewound afterwards). Returns (data, mime).
+        """
+        if isinstance(image, bytes):
+            raw = image
+        elif isinstance(image, str):
+            with open(image, "rb") as f:
+                raw = f.read()
+            filename = filename or image
+        else:
+            image.seek(0)
+            raw = image.read()
+            image.seek(0)
+
+        # Trust the file's magic number over its extension
+        ext = (filename or "").rsplit(".", 1)[-1].lower()
+        mime_map = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png",
+                    "gif": "image/gif", "webp": "image/webp"}
+        mime = sniff_mime(raw[:16]) or mime_map.get(ext, "image/jpeg")
+        return base64.standard_b64encode(raw).decode("utf-8"), mime
+
     @classmethod
-    def analyze_image(cls, image_path: str) -> dict | None:
+    def analyze_image(cls, image, filename: str = None) -> dict | None:
         """
-        Use Groq vision model to classify an image.
-        Returns: {category, is_sensitive, doc_type} or None on failure.
+        Use Groq vision model to classify an image (a path, bytes or a binary file object).
+        Returns: {category, is_sensitive, doc_type, description} or None on failure.
         """
         client = cls.get_client()
         if not client:
             return None
 
         try:
-            # Read and base64-encode the image
-            with open(image_path, "rb") as f:
-                image_data = base64.standard_b64encode(f.read()).decode("utf-8")
-
-            # Detect MIME type from extension
-            ext = image_path.rsplit(".", 1)[-1].lower()
-            mime_map = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png",
-                        "gif": "image/gif", "webp": "image/webp"}
-            mime = mime_map.get(ext, "image/jpeg")
+            image_data, mime = cls.encode_image(image, filename)
 
             prompt = """Analyze this image and respond with ONLY valid JSON in this exact format:
 {
   "category": "Person|Receipt|Document|Note|General",
   "is_sensitive": true|false,
-  "doc_type": "selfie|group_photo|receipt|invoice|aadhaar|pan_card|passport|bank_statement|note|general"
+  "doc_type": "selfie|group_photo|receipt|invoice|aadhaar|pan_card|passport|bank_statement|note|general",
+  "description": "one short sentence: what is shown, notable objects, place, any visible title or text"
 }
 
 Rules:
@@ -83,33 +107,36 @@ Rules:
 - "Note" if it's handwritten or typed notes
 - "General" for anything else
 - "is_sensitive" = true ONLY for ID cards, bank statements, passports, official documents
+- "description" must NOT repeat ID numbers, account numbers or other personal details
 - Be concise, respond ONLY with JSON"""
 
-            completion = client.chat.completions.create(
-                model="meta-llama/llama-4-scout-17b-16e-instruct",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime};base64,{image_data}"
+            with track_external("groq", "vision_classify"):
+                completion = client.chat.completions.create(
+                    model="meta-llama/llama-4-scout-17b-16e-instruct",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:{mime};base64,{image_data}"
+                                    }
+                                },
+                                {
+                                    "type": "text",
+                                    "text": prompt
                                 }
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=100
-            )
+                            ]
+                        }
+                    ],
+                    response_format={"type": "json_object"},
+                    max_tokens=160
+                )
             result = json.loads(completion.choices[0].message.content)
-            print(f"[AI Classification] {image_path}: {result}")
+            log_sampled(logger, "Classified %s as %s (sensitive=%s)", filename or "image",
+                        result.get("category"), result.get("is_sensitive"))
             return result
         except Exception as e:
-            print(f"[Groq Vision] Error analyzing image: {e}")
+            logger.warning("Groq vision error: %s", e)
             return None
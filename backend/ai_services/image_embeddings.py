@@ -0,0 +1,119 @@
+"""
+Optional CLIP-style image/text embeddings for semantic photo search.
+
+Enabled with IMAGE_EMBEDDINGS=1 and the `sentence-transformers` package;
+IMAGE_EMBEDDING_MODEL picks the checkpoint (default clip-ViT-B-32, ~600 MB,
+runs on CPU). The model is loaded on first use, never at import, so servers
+without it start as before and every call simply returns None.
+"""
+import os
+import logging
+import threading
+import numpy as np
+from PIL import Image
+from .. import vector_index
+from ..metrics import track_external
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = os.getenv("IMAGE_EMBEDDING_MODEL", "clip-ViT-B-32")
+ENABLED = os.getenv("IMAGE_EMBEDDINGS", "0").lower() in ("1", "true", "yes")
+MAX_SIDE = 448  # CLIP sees 224px crops; shrink before preprocessing to save memory
+
+
+class ImageEmbedder:
+    model = None
+    failed = False
+    lock = threading.Lock()
+
+    @classmethod
+    def get_model(cls):
+        if not ENABLED or cls.failed:
+            return None
+        if cls.model is None:
+            with cls.lock:
+                if cls.model is None and not cls.failed:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                        cls.model = SentenceTransformer(MODEL_NAME, device="cpu")
+                        logger.info("Loaded %s", MODEL_NAME)
+                    except Exception as e:
+                        cls.failed = True
+                        logger.warning("Semantic search disabled: %s", e)
+        return cls.model
+
+    @classmethod
+    def available(cls) -> bool:
+        return cls.get_model() is not None
+
+    @staticmethod
+    def _load(image) -> Image.Image:
+        if isinstance(image, Image.Image):  # already decoded at ingest
+            img = image.convert("RGB")
+            img.thumbnail((MAX_SIDE, MAX_SIDE))
+            return img
+        with Image.open(image) as img:
+            img.draft("RGB", (MAX_SIDE, MAX_SIDE))  # JPEG: decode at reduced scale
+            img = img.convert("RGB")
+        img.thumbnail((MAX_SIDE, MAX_SIDE))
+        return img
+
+    @classmethod
+    def embed_images(cls, images: list) -> list[np.ndarray | None]:
+        """Unit-length float32 vectors for paths / file objects / PIL images; None for unreadable images."""
+        model = cls.get_model()
+        if model is None:
+            return [None] * len(images)
+        loaded = []
+        for image in images:
+            try:
+                loaded.append(cls._load(image))
+            except Exception as e:
+                logger.warning("Could not read image: %s", e)
+                loaded.append(None)
+        ok = [img for img in loaded if img is not None]
+        with track_external("clip", "embed_images"):
+            encoded = model.encode(ok, batch_size=16, normalize_embeddings=True, convert_to_numpy=True) if ok else []
+        vectors = iter(encoded)
+        return [next(vectors).astype(np.float32) if img is not None else None for img in loaded]
+
+    @classmethod
+    def embed_image(cls, image) -> np.ndarray | None:
+        return cls.embed_images([image])[0]
+
+    @classmethod
+    def embed_text(cls, text: str) -> np.ndarray | None:
+        model = cls.get_model()
+        if model is None:
+            return None
+        with track_external("clip", "embed_text"):
+            return model.encode([text], normalize_embeddings=True, convert_to_numpy=True)[0].astype(np.float32)
+
+
+# ─── Index glue ───────────────────────────────────────────────────────────────
+MIN_SCORE = float(os.getenv("SEMANTIC_SEARCH_MIN_SCORE", 0.2))
+
+
+def index_photo_files(user_id: int, photos: list[tuple[int, str]]):
+    """Embed (photo_id, file path or PIL image) pairs and append them to the user's vector index."""
+    if not ENABLED or not photos:
+        return
+    try:
+        vectors = ImageEmbedder.embed_images([path for _, path in photos])
+        dim = next((len(v) for v in vectors if v is not None), None)
+        if dim is None:
+            return
+        if not vector_index.compatible(MODEL_NAME, dim):
+            logger.error("Vector index was built with another model; run build_image_index.py --rebuild")
+            return
+        vector_index.add(user_id, [pid for pid, _ in photos], vectors)
+    except Exception as e:
+        logger.warning("Could not index photos %s: %s", [pid for pid, _ in photos], e)
+
+
+def semantic_photo_search(user_id: int, query: str, limit: int = 20) -> list[tuple[int, float]] | None:
+    """[(photo_id, score)] for a text query, or None when semantic search is unavailable."""
+    vector = ImageEmbedder.embed_text(query) if query else None
+    if vector is None or not vector_index.compatible(MODEL_NAME, len(vector)):
+        return None
+    return vector_index.search(user_id, vector, limit=limit, min_score=MIN_SCORE)
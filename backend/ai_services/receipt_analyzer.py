@@ -4,8 +4,12 @@ Extracts merchant, date, total, tax, and category from a receipt image.
 """
 import os
 import json
-import base64
+import logging
 from .groq_client import GroqClient
+from ..metrics import track_external
+from ..log_utils import log_sampled
+
+logger = logging.getLogger(__name__)
 
 
 RECEIPT_PROMPT = """You are a receipt parser. Look at this receipt image carefully and extract ALL details.
@@ -30,61 +34,59 @@ Rules:
 
 class ReceiptAnalyzer:
     @staticmethod
-    def analyze_receipt(image_path: str) -> dict | None:
+    def analyze_receipt(image, filename: str = None) -> dict | None:
         """
-        Analyze a receipt image using Groq vision AI.
+        Analyze a receipt image (a path, or the bytes of an ingested upload)
+        using Groq vision AI.
         Returns structured dict with merchant, date, amounts, category.
         Falls back to basic OCR if vision fails.
         """
         client = GroqClient.get_client()
         if not client:
-            print("[ReceiptAnalyzer] Groq client not available.")
+            logger.warning("Groq client not available; receipt not analyzed")
             return None
 
+        name = filename or (image if isinstance(image, str) else "receipt")
         try:
-            with open(image_path, "rb") as f:
-                image_data = base64.standard_b64encode(f.read()).decode("utf-8")
-
-            ext = image_path.rsplit(".", 1)[-1].lower()
-            mime_map = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png",
-                        "gif": "image/gif", "webp": "image/webp"}
-            mime = mime_map.get(ext, "image/jpeg")
+            image_data, mime = GroqClient.encode_image(image, name)
 
-            completion = client.chat.completions.create(
-                model="meta-llama/llama-4-scout-17b-16e-instruct",
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:{mime};base64,{image_data}"}
-                        },
-                        {
-                            "type": "text",
-                            "text": RECEIPT_PROMPT
-                        }
-                    ]
-                }],
-                response_format={"type": "json_object"},
-                max_tokens=512
-            )
+            with track_external("groq", "vision_receipt"):
+                completion = client.chat.completions.create(
+                    model="meta-llama/llama-4-scout-17b-16e-instruct",
+                    messages=[{
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image_url",
+                                "image_url": {"url": f"data:{mime};base64,{image_data}"}
+                            },
+                            {
+                                "type": "text",
+                                "text": RECEIPT_PROMPT
+                            }
+                        ]
+                    }],
+                    response_format={"type": "json_object"},
+                    max_tokens=512
+                )
 
             raw = completion.choices[0].message.content
             data = json.loads(raw)
-            print(f"[ReceiptAnalyzer] Parsed receipt: {data}")
+            # Receipt contents are personal data: only the shape is logged
+            log_sampled(logger, "Parsed receipt %s: %d item(s)", name, len(data.get("Items") or []))
             return data
 
         except Exception as e:
-            print(f"[ReceiptAnalyzer] Vision error: {e}")
+            logger.warning("Receipt vision error for %s: %s", name, e)
             # Try basic text extraction as fallback
-            return ReceiptAnalyzer._fallback_text_extraction(image_path)
+            return ReceiptAnalyzer._fallback_text_extraction(name)
 
     @staticmethod
-    def _fallback_text_extraction(image_path: str) -> dict | None:
+    def _fallback_text_extraction(name: str) -> dict | None:
         """Fallback: use Groq text model with a basic description."""
         try:
             result = GroqClient.get_completion(
-                f"This is a receipt from file: {os.path.basename(image_path)}. "
+                f"This is a receipt from file: {os.path.basename(name)}. "
                 "Since I can't read the image, create a placeholder receipt with unknown values. "
                 "Respond ONLY with JSON: {\"Merchant Name\": \"Unknown\", \"Date\": null, "
                 "\"Total Amount\": 0.00, \"Tax Amount\": 0.00, \"Category\": \"General\", \"Items\": []}",
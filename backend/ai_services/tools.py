@@ -3,6 +3,9 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 # ─── Email ────────────────────────────────────────────────────────────────────
@@ -33,7 +36,7 @@ def send_whatsapp(phone_number: str, message: str, image_path: str = None):
     """
     Sends a WhatsApp message or image via WhatsApp Web automation.
     phone_number must include country code, e.g. '+919876543210'
-    image_path: optional path to image file (relative to project root, e.g. 'uploads/photos/uuid.jpg')
+    image_path: optional stored photo path, e.g. 'photos/ab/cd/<hash>.jpg' (an 'uploads/' prefix is accepted)
     """
     try:
         import pywhatkit
@@ -43,31 +46,31 @@ def send_whatsapp(phone_number: str, message: str, image_path: str = None):
         if not phone_number.startswith("+"):
             phone_number = "+" + phone_number
 
-        # Resolve image path relative to project root
-        abs_image = None
+        # Resolve the stored path to a local file (downloaded first on remote storage)
+        key = None
         if image_path:
-            # Try 1: Exact path given
-            if os.path.exists(image_path):
-                abs_image = os.path.abspath(image_path)
-            # Try 2: Prepend 'uploads/' if missing
-            elif os.path.exists(os.path.join("uploads", image_path)):
-                abs_image = os.path.abspath(os.path.join("uploads", image_path))
-            else:
+            from backend.storage import storage, resolve_key
+            key = resolve_key(image_path)
+            if not storage.exists(key):
                 return {"status": "error", "message": f"Image file not found: {image_path}"}
 
-        if abs_image:
-            # Normalize path for pywhatkit (it can be picky on Windows)
-            abs_image = abs_image.replace("\\", "/")
-            print(f"[WhatsApp] Sending image {abs_image} to {phone_number}")
-            pywhatkit.sendwhats_image(
-                receiver=phone_number,
-                img_path=abs_image,
-                caption=message or "",
-                wait_time=45,
-                tab_close=False
-            )
+        if key:
+            with storage.local_file(key) as local_path:
+                # Normalize path for pywhatkit (it can be picky on Windows)
+                abs_image = os.path.abspath(local_path).replace("\\", "/")
+                logger.debug("Sending WhatsApp image %s to %s", abs_image, phone_number)
+                pywhatkit.sendwhats_image(
+                    receiver=phone_number,
+                    img_path=abs_image,
+                    caption=message or "",
+                    wait_time=45,
+                    tab_close=False
+                )
+                time.sleep(5)
+                pyautogui.press('enter')
+                time.sleep(2)
         else:
-            print(f"[WhatsApp] Sending text to {phone_number}: {message}")
+            logger.debug("Sending WhatsApp text to %s", phone_number)
             pywhatkit.sendwhatmsg_instantly(
                 phone_no=phone_number,
                 message=message,
@@ -75,12 +78,11 @@ def send_whatsapp(phone_number: str, message: str, image_path: str = None):
                 tab_close=False,
                 close_time=3
             )
-
-        time.sleep(5)
-        pyautogui.press('enter')
-        time.sleep(2)
+            time.sleep(5)
+            pyautogui.press('enter')
+            time.sleep(2)
         pyautogui.hotkey('ctrl', 'w')
-        return {"status": "success", "message": f"WhatsApp {'image' if abs_image else 'message'} sent to {phone_number}"}
+        return {"status": "success", "message": f"WhatsApp {'image' if key else 'message'} sent to {phone_number}"}
 
     except ImportError as e:
         return {"status": "error", "message": f"Import failed: {str(e)}. Try installing pywhatkit and pyautogui."}
@@ -111,7 +113,8 @@ def list_photos(user_id: int, category: str = None):
                 "count": len(photos),
                 "photos": [
                     {"id": p.id, "filename": p.filename, "category": p.category,
-                     "path": p.path, "is_sensitive": p.is_sensitive, "created_at": str(p.created_at)}
+                     "path": p.path, "is_sensitive": p.is_sensitive,
+                     "taken_at": str(p.taken_at) if p.taken_at else None, "created_at": str(p.created_at)}
                     for p in photos
                 ]
             }
@@ -130,12 +133,26 @@ def delete_photo(photo_id: int, user_id: int):
             photo = db.query(Photo).filter(Photo.id == photo_id, Photo.user_id == user_id).first()
             if not photo:
                 return {"status": "error", "message": f"Photo {photo_id} not found for this user."}
+            from backend.stats_utils import record_photo_removed
+            from backend.receipt_utils import delete_receipt as delete_receipt_rows
+            from backend.timeline_utils import record_timeline_removed
+            from backend.search_index import remove_documents
+            from backend.storage import release_photo_files
             filename = photo.filename
-            file_path = os.path.join("uploads", photo.path.replace("\\", "/"))
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            files = [(photo.path, photo.thumbnail_path)]
+            was_tagged = any(f.person_id for f in photo.faces)
+            receipt_id = photo.receipt.id if photo.receipt else None
+            if photo.receipt:
+                delete_receipt_rows(db, photo.receipt, user_id)
+            record_photo_removed(db, user_id, photo.category, photo.size_bytes or 0, was_tagged=was_tagged)
+            record_timeline_removed(db, user_id, photo.taken_at)
             db.delete(photo)
+            release_photo_files(db, files)
             db.commit()
+            remove_documents("photo", [photo_id])
+            remove_documents("receipt", [receipt_id])
+            from backend import vector_index
+            vector_index.remove(user_id, [photo_id])
             return {"status": "success", "message": f"Photo #{photo_id} ('{filename}') deleted."}
         finally:
             db.close()
@@ -155,9 +172,13 @@ def move_photo(photo_id: int, category: str, user_id: int):
             photo = db.query(Photo).filter(Photo.id == photo_id, Photo.user_id == user_id).first()
             if not photo:
                 return {"status": "error", "message": f"Photo {photo_id} not found."}
+            from backend.stats_utils import record_photo_moved
+            from backend.search_index import index_documents
             old = photo.category
             photo.category = category
+            record_photo_moved(db, user_id, old, category, photo.size_bytes or 0)
             db.commit()
+            index_documents(db, "photo", [photo_id])
             return {"status": "success", "message": f"Photo #{photo_id} moved from '{old}' to '{category}'"}
         finally:
             db.close()
@@ -190,8 +211,13 @@ def create_person(name: str, user_id: int):
         db = _get_db()
         try:
             from backend.models.person import Person
+            from backend.stats_utils import record_person_added
+            from backend.search_index import index_documents
             p = Person(name=name, user_id=user_id)
-            db.add(p); db.commit(); db.refresh(p)
+            db.add(p)
+            record_person_added(db, user_id)
+            db.commit(); db.refresh(p)
+            index_documents(db, "person", [p.id])
             return {"status": "success", "message": f"Person '{name}' created with ID {p.id}", "person_id": p.id}
         finally:
             db.close()
@@ -201,25 +227,35 @@ def create_person(name: str, user_id: int):
 
 def tag_person_in_photo(photo_id: int, person_id: int, user_id: int):
     """Tag a person in a photo by linking their IDs."""
+    return tag_person_in_photos(person_id, user_id, photo_ids=[photo_id])
+
+
+def _id_list(ids) -> list[int]:
+    if isinstance(ids, str):
+        ids = ids.replace(",", " ").split()
+    return [int(i) for i in ids or []]
+
+
+def tag_person_in_photos(person_id: int, user_id: int, photo_ids=None, face_ids=None):
+    """Tag one person in many photos (every face in each) and/or individual faces, in one transaction."""
     try:
         db = _get_db()
         try:
-            from backend.models.photo import Photo
-            from backend.models.person import Person
-            from backend.models.face import Face
-            photo = db.query(Photo).filter(Photo.id == photo_id, Photo.user_id == user_id).first()
-            person = db.query(Person).filter(Person.id == person_id, Person.user_id == user_id).first()
-            if not photo:
-                return {"status": "error", "message": f"Photo {photo_id} not found."}
-            if not person:
-                return {"status": "error", "message": f"Person {person_id} not found."}
-            faces = db.query(Face).filter(Face.photo_id == photo_id).all()
-            if not faces:
-                db.add(Face(photo_id=photo_id, person_id=person_id, encoding=[]))
-            else:
-                for f in faces: f.person_id = person_id
+            from backend.people_utils import tag_people
+            from backend.search_index import index_documents
+            photo_ids, face_ids = _id_list(photo_ids), _id_list(face_ids)
+            try:
+                result = tag_people(db, user_id, [(i, person_id) for i in photo_ids], [(i, person_id) for i in face_ids])
+            except (LookupError, ValueError) as e:
+                return {"status": "error", "message": str(e)}
             db.commit()
-            return {"status": "success", "message": f"Photo #{photo_id} tagged as '{person.name}'"}
+            index_documents(db, "photo", result["photo_ids"])
+            name = result["people"].get(person_id)
+            if len(photo_ids) == 1 and not face_ids:
+                return {"status": "success", "message": f"Photo #{photo_ids[0]} tagged as '{name}'"}
+            return {"status": "success",
+                    "message": f"Tagged '{name}' in {len(result['photo_ids'])} photo(s)",
+                    "newly_tagged": result["newly_tagged"]}
         finally:
             db.close()
     except Exception as e:
@@ -227,28 +263,29 @@ def tag_person_in_photo(photo_id: int, person_id: int, user_id: int):
 
 
 # ─── Receipts ─────────────────────────────────────────────────────────────────
-def get_receipt_summary(user_id: int):
-    """Get expense summary: total spending and breakdown by category."""
+def get_receipt_summary(user_id: int, group_by: str = "category", start: str = None, end: str = None):
+    """Get expense summary: totals plus a breakdown by category/merchant/month/week, and the latest receipts."""
     try:
         db = _get_db()
         try:
-            from backend.models.receipt import Receipt
-            from backend.models.photo import Photo
-            receipts = db.query(Receipt, Photo).join(Photo).filter(Photo.user_id == user_id).all()
-            total = sum(r.amount or 0 for r, _ in receipts)
-            by_cat = {}
-            for r, _ in receipts:
-                cat = r.category or "General"
-                by_cat[cat] = round(by_cat.get(cat, 0) + (r.amount or 0), 2)
+            from datetime import date
+            from backend.receipt_utils import receipt_totals, spend_breakdown, list_receipts, GROUPINGS
+            if group_by not in GROUPINGS:
+                return {"status": "error", "message": f"Invalid group_by. Use: {', '.join(GROUPINGS)}"}
+            start_d = date.fromisoformat(start) if start else None
+            end_d = date.fromisoformat(end) if end else None
+            totals = receipt_totals(db, user_id, start_d, end_d)
+            groups = spend_breakdown(db, user_id, group_by, start_d, end_d, limit=20)
+            recent = list_receipts(db, user_id, limit=10, start=start_d, end=end_d)
             return {
                 "status": "success",
-                "total": round(total, 2),
-                "count": len(receipts),
-                "by_category": by_cat,
-                "receipts": [
+                "total": totals["total"],
+                "count": totals["count"],
+                "by_" + group_by: groups,
+                "recent_receipts": [
                     {"id": r.id, "merchant": r.merchant, "amount": r.amount,
                      "date": str(r.date), "category": r.category}
-                    for r, _ in receipts
+                    for r, _ in recent
                 ]
             }
         finally:
@@ -257,6 +294,46 @@ def get_receipt_summary(user_id: int):
         return {"status": "error", "message": str(e)}
 
 
+def get_item_spend(user_id: int, item: str, group_by: str = "month", start: str = None, end: str = None):
+    """How much was spent on an item (e.g. 'milk') per month/week, from stored receipt line items."""
+    try:
+        db = _get_db()
+        try:
+            from datetime import date
+            from backend.receipt_utils import item_spend
+            periods = item_spend(db, user_id, item, group_by,
+                                 date.fromisoformat(start) if start else None,
+                                 date.fromisoformat(end) if end else None)
+            return {
+                "status": "success",
+                "item": item,
+                "total": round(sum(p["total"] for p in periods), 2),
+                "periods": periods
+            }
+        finally:
+            db.close()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+def get_top_items(user_id: int, limit: int = 10, order_by: str = "spend", start: str = None, end: str = None):
+    """Most-bought items by spend or count."""
+    try:
+        db = _get_db()
+        try:
+            from datetime import date
+            from backend.receipt_utils import top_items
+            items = top_items(db, user_id,
+                              date.fromisoformat(start) if start else None,
+                              date.fromisoformat(end) if end else None,
+                              order_by, limit)
+            return {"status": "success", "count": len(items), "items": items}
+        finally:
+            db.close()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
 def delete_receipt(receipt_id: int, user_id: int):
     """Delete a receipt record."""
     try:
@@ -267,7 +344,11 @@ def delete_receipt(receipt_id: int, user_id: int):
             r = db.query(Receipt).join(Photo).filter(Receipt.id == receipt_id, Photo.user_id == user_id).first()
             if not r:
                 return {"status": "error", "message": f"Receipt {receipt_id} not found."}
-            db.delete(r); db.commit()
+            from backend.receipt_utils import delete_receipt as delete_receipt_rows
+            from backend.search_index import remove_documents
+            delete_receipt_rows(db, r, user_id)
+            db.commit()
+            remove_documents("receipt", [receipt_id])
             return {"status": "success", "message": f"Receipt #{receipt_id} deleted."}
         finally:
             db.close()
@@ -275,6 +356,48 @@ def delete_receipt(receipt_id: int, user_id: int):
         return {"status": "error", "message": str(e)}
 
 
+# ─── Search ───────────────────────────────────────────────────────────────────
+def search_library(user_id: int, query: str = None, kind: str = None, category: str = None,
+                   start: str = None, end: str = None, limit: int = 20):
+    """Find photos, receipts, vault files and people by words in names, descriptions, merchants and items."""
+    try:
+        from datetime import date
+        from backend.search_index import search, KINDS
+        kinds = [k.strip() for k in kind.split(",")] if kind else None
+        if kinds and any(k not in KINDS for k in kinds):
+            return {"status": "error", "message": f"Invalid kind. Use: {', '.join(KINDS)}"}
+        results = search(user_id, query, kinds=kinds, category=category,
+                         start=date.fromisoformat(start) if start else None,
+                         end=date.fromisoformat(end) if end else None,
+                         limit=max(1, min(int(limit), 50)))
+        return {"status": "success", "count": len(results), "results": results}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+def find_photos(user_id: int, query: str, limit: int = 10):
+    """Photos that look like a description (e.g. 'beach at sunset'), best match first."""
+    try:
+        db = _get_db()
+        try:
+            from backend.search_index import find_photos as find_photo_matches
+            mode, hits = find_photo_matches(db, user_id, query, max(1, min(int(limit), 30)))
+            return {
+                "status": "success",
+                "mode": mode,
+                "count": len(hits),
+                "photos": [
+                    {"id": p.id, "filename": p.filename, "path": p.path, "category": p.category,
+                     "score": round(score, 3) if score is not None else None}
+                    for p, score in hits
+                ]
+            }
+        finally:
+            db.close()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
 # ─── Vault ────────────────────────────────────────────────────────────────────
 def list_vault(user_id: int):
     """List all files in the secure vault."""
@@ -307,9 +430,15 @@ TOOL_REGISTRY = {
     "list_people":         list_people,
     "create_person":       create_person,
     "tag_person_in_photo": tag_person_in_photo,
+    "tag_person_in_photos": tag_person_in_photos,
     # Receipts & expenses
     "get_receipt_summary": get_receipt_summary,
+    "get_item_spend":      get_item_spend,
+    "get_top_items":       get_top_items,
     "delete_receipt":      delete_receipt,
     # Vault
     "list_vault":          list_vault,
+    # Search
+    "search_library":      search_library,
+    "find_photos":         find_photos,
 }
@@ -15,6 +15,10 @@ from backend.models.vault import VaultFile
 from backend.models.receipt import Receipt
 from backend.models.person import Person
 from backend.models.face import Face
+from backend.models.user_stats import UserStats
+from backend.models.photo_timeline import PhotoTimelineBucket
+from backend.models.receipt_monthly import ReceiptMonthly
+from backend.models.receipt_item import ReceiptItem
 
 def get_db_columns(conn, table_name):
     try:
@@ -2,6 +2,9 @@ from datetime import datetime, timedelta
 from typing import Optional, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import secrets
 import os
 
 # Configuration
@@ -9,15 +12,53 @@ SECRET_KEY = os.getenv("SECRET_KEY", "replace_this_with_a_secure_random_key_in_p
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Using pbkdf2_sha256 as safe fallback
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Password hashing policy. The first scheme in PASSWORD_SCHEMES hashes new
+# passwords; the rest are only verified, and such hashes (or hashes with older
+# cost settings) are upgraded on the next successful login. Costs come from the
+# environment; `python backend/benchmarks/bench_password_hashing.py --calibrate`
+# suggests values for a target latency on this hardware.
+PASSWORD_SCHEMES = [s.strip() for s in os.getenv("PASSWORD_SCHEMES", "argon2,pbkdf2_sha256").split(",") if s.strip()]
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+
+def _hash_settings() -> dict:
+    # argon2id defaults follow the OWASP baseline (19 MiB, 2 passes, 1 lane): ~20-40 ms per hash
+    settings = {
+        "argon2__memory_cost": int(os.getenv("ARGON2_MEMORY_COST", 19456)),  # KiB
+        "argon2__time_cost": int(os.getenv("ARGON2_TIME_COST", 2)),
+        "argon2__parallelism": int(os.getenv("ARGON2_PARALLELISM", 1)),
+    }
+    if os.getenv("BCRYPT_ROUNDS"):
+        settings["bcrypt__rounds"] = int(os.getenv("BCRYPT_ROUNDS"))
+    if os.getenv("PBKDF2_ROUNDS"):
+        settings["pbkdf2_sha256__rounds"] = int(os.getenv("PBKDF2_ROUNDS"))
+    return {k: v for k, v in settings.items() if k.split("__")[0] in PASSWORD_SCHEMES}
+
+pwd_context = CryptContext(schemes=PASSWORD_SCHEMES, deprecated="auto", **_hash_settings())
+
+# Verified against when the account does not exist, so unknown emails cost the same as wrong passwords
+DUMMY_HASH = pwd_context.hash(secrets.token_urlsafe(16))
+
+# Hashing is CPU-bound; a dedicated pool keeps a login storm from occupying
+# every worker thread the rest of the API runs sync endpoints on
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update(plain_password, hashed_password) -> tuple[bool, Optional[str]]:
+    """(valid, new_hash); new_hash is set when the stored hash should be upgraded to the current policy."""
+    if not hashed_password:
+        pwd_context.verify(plain_password, DUMMY_HASH)
+        return False, None
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_and_update_async(plain_password, hashed_password) -> tuple[bool, Optional[str]]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -35,15 +76,81 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from .database import get_db
 from .models.user import User
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+import threading
+import time
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Verified token -> user snapshot, so authenticated requests skip the users lookup.
+# Entries live at most USER_CACHE_TTL seconds (and never past the token's exp);
+# changes to a user made in this process call forget_user().
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """The fields request handlers read from the current user; not bound to a session."""
+    id: int
+    email: str
+    full_name: Optional[str]
+    dob: Optional[date]
+
+    @classmethod
+    def of(cls, user: User) -> "UserSnapshot":
+        return cls(id=user.id, email=user.email, full_name=user.full_name, dob=user.dob)
+
+
+_user_cache: "OrderedDict[str, tuple[float, UserSnapshot]]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+
+def _cached_user(token: str) -> Optional[UserSnapshot]:
+    with _user_cache_lock:
+        entry = _user_cache.get(token)
+        if entry is None:
+            return None
+        expires, snapshot = entry
+        if expires <= time.time():
+            del _user_cache[token]
+            return None
+        _user_cache.move_to_end(token)
+        return snapshot
+
+
+def _cache_user(token: str, snapshot: UserSnapshot, token_exp: Optional[float]):
+    expires = time.time() + USER_CACHE_TTL
+    if token_exp is not None:
+        expires = min(expires, token_exp)
+    with _user_cache_lock:
+        _user_cache[token] = (expires, snapshot)
+        _user_cache.move_to_end(token)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+
+def forget_user(user_id: int = None):
+    """Drop cached snapshots of one user (or everyone) after the user row changes."""
+    with _user_cache_lock:
+        if user_id is None:
+            _user_cache.clear()
+            return
+        for token in [t for t, (_, snap) in _user_cache.items() if snap.id == user_id]:
+            del _user_cache[token]
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserSnapshot:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    snapshot = _cached_user(token)
+    if snapshot is not None:
+        return snapshot
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -51,7 +158,19 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.email == username).first()
+
+    user_id = payload.get("user_id")
+    if user_id is not None:
+        # Primary-key lookup; the email check rejects a token whose user was deleted and the id reused
+        user = db.get(User, user_id)
+        if user is not None and user.email != username:
+            user = None
+    else:
+        # Tokens issued before user_id was added to the claims
+        user = db.query(User).filter(User.email == username).first()
     if user is None:
         raise credentials_exception
-    return user
+
+    snapshot = UserSnapshot.of(user)
+    _cache_user(token, snapshot, payload.get("exp"))
+    return snapshot
@@ -0,0 +1,318 @@
+"""
+Recompute derived photo data after a model, prompt or extractor change.
+
+    python backend/backfill.py --stages classify              # re-run vision classification
+    python backend/backfill.py --stages embed,thumbnails      # CLIP vectors + missing thumbnails
+    python backend/backfill.py --stages exif --user-id 4      # re-read media metadata for one user
+    python backend/backfill.py --stages classify --rate 5     # at most 5 photos/s (protects the live API)
+    python backend/backfill.py --stages classify --retry-failed  # re-run only the photos that failed
+
+Stages:
+  classify    category / is_sensitive / doc_type / description from the vision
+              model (rows are left alone when the model gives no answer).
+              Changes the upload path would route elsewhere (a photo becoming
+              or ceasing to be sensitive, or moving into or out of Receipt)
+              are not applied: they need the vault or a receipt row, so they
+              are listed for review at the end instead
+  embed       CLIP vectors in the semantic search index (IMAGE_EMBEDDINGS=1)
+  thumbnails  thumbnails for photos without one (all photos with --force)
+  exif        size, dimensions, MIME type, capture time, camera and GPS
+
+Photos are read in keyset batches (id order). Each batch is loaded and
+decoded once by a pool of --workers threads, shared by every stage, then
+written in one transaction that also moves the counters, timeline buckets
+and search index entries the changes affect. The last committed id and the
+ids of photos that failed (or got no answer from the model) are saved to
+--checkpoint after every batch, so an interrupted run resumes where it
+stopped (--restart begins again). Once a run completes the file is removed,
+unless photos failed: then it is kept, and --retry-failed processes just
+those photos until none are left.
+--rate caps photos per second and --pause sleeps between batches. Progress
+lines report throughput and an ETA.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import SessionLocal
+from backend.models.photo import Photo
+from backend.ingest_utils import load_stored
+from backend.media_utils import extract_media_metadata, METADATA_FIELDS
+from backend.stats_utils import apply_stats_delta, category_bytes_column, record_photo_moved
+from backend.timeline_utils import record_timeline_added, record_timeline_removed
+from backend.search_index import index_documents
+from backend.storage import storage
+
+STAGES = ("classify", "embed", "thumbnails", "exif")
+CLASSIFY_MAX_SIDE = 1024  # as at upload (routers/photos.py)
+CLASSIFY_FIELDS = ("category", "is_sensitive", "doc_type", "description")
+RECEIPT_CATEGORY = "Receipt"  # receipts have a Receipt row (routers/receipts.py)
+
+
+def hold_for_review(photo: dict, updates: dict) -> dict:
+    """Remove and return the updates that apply() cannot reconcile on its own."""
+    held = {}
+    if "is_sensitive" in updates:
+        held["is_sensitive"] = updates.pop("is_sensitive")
+    if "category" in updates and RECEIPT_CATEGORY in (photo["category"], updates["category"]):
+        held["category"] = updates.pop("category")
+    return held
+
+
+def load_checkpoint(path: str, stages: list[str], user_id: int | None) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("stages") != stages or checkpoint.get("user_id") != user_id:
+        raise SystemExit(f"{path} belongs to a run with stages={checkpoint.get('stages')} "
+                         f"user_id={checkpoint.get('user_id')}; pass --restart to discard it")
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+
+def process(photo: dict, stages: list[str], force: bool) -> dict:
+    """Compute one photo's new values (blocking; runs on the worker pool). Writes nothing to the DB."""
+    from backend.ai_services.groq_client import GroqClient
+    from backend.ai_services import image_embeddings
+
+    result = {"id": photo["id"], "updates": {}, "clip_image": None}
+    ingested = load_stored(photo["path"], photo["filename"])
+
+    if "exif" in stages:
+        metadata = extract_media_metadata(ingested.stream(), photo["filename"])
+        metadata["mime_type"] = ingested.mime_type or metadata["mime_type"]
+        for field, value in metadata.items():
+            if value is not None and value != photo[field]:
+                result["updates"][field] = value
+
+    if "classify" in stages:
+        try:
+            image = ingested.image.jpeg(CLASSIFY_MAX_SIDE)
+        except Exception:
+            image = ingested.data
+        classification = GroqClient.analyze_image(image, photo["filename"])
+        if classification:
+            for field in CLASSIFY_FIELDS:
+                value = classification.get(field)
+                if value is not None and value != photo[field]:
+                    result["updates"][field] = value
+        else:
+            result["unclassified"] = True
+
+    if "thumbnails" in stages and (force or not photo["thumbnail_path"] or not storage.exists(photo["thumbnail_path"])):
+        key, _ = ingested.image.store_thumbnail(overwrite=force)
+        if key != photo["thumbnail_path"]:
+            result["updates"]["thumbnail_path"] = key
+
+    if "embed" in stages:
+        result["clip_image"] = ingested.image.pil(image_embeddings.MAX_SIDE)
+    return result
+
+
+def apply(db, photo: dict, updates: dict):
+    """Stage one photo's updates plus the counter and timeline moves they imply. Does not commit."""
+    db.query(Photo).filter(Photo.id == photo["id"]).update(updates, synchronize_session=False)
+    uid = photo["user_id"]
+    old_size = photo["size_bytes"] or 0
+    new_size = updates.get("size_bytes", old_size) or 0
+    category = updates.get("category", photo["category"])
+    if category != photo["category"]:
+        record_photo_moved(db, uid, photo["category"], category, old_size)
+    if new_size != old_size:
+        apply_stats_delta(db, uid, photo_bytes=new_size - old_size,
+                          **{category_bytes_column(category): new_size - old_size})
+    if "taken_at" in updates:
+        record_timeline_removed(db, uid, photo["taken_at"])
+        record_timeline_added(db, uid, updates["taken_at"])
+
+
+def _eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def run(stages: list[str], user_id: int = None, batch_size: int = 50, workers: int = 4,
+        rate: float = 0, pause: float = 0, force: bool = False,
+        checkpoint_path: str = "backfill_checkpoint.json", restart: bool = False,
+        retry_failed: bool = False) -> int:
+    if "embed" in stages:
+        from backend.ai_services.image_embeddings import ImageEmbedder, index_photo_files
+        if not ImageEmbedder.available():
+            print("Image embeddings are unavailable: set IMAGE_EMBEDDINGS=1 and install sentence-transformers")
+            return 1
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = load_checkpoint(checkpoint_path, stages, user_id) or {
+        "stages": stages, "user_id": user_id, "last_id": 0, "processed": 0, "updated": 0,
+    }
+    checkpoint.setdefault("failed_ids", [])
+    checkpoint.setdefault("review", {})  # photo id -> held-back classification
+    if retry_failed:
+        if not checkpoint["failed_ids"]:
+            print("No failed photos to retry")
+            return 0
+        # Cursor into failed_ids, so an interrupted retry resumes too
+        checkpoint.setdefault("retry_after", 0)
+    elif checkpoint.get("complete"):
+        print(f"This run already completed; pass --retry-failed to retry its "
+              f"{len(checkpoint['failed_ids'])} failed photo(s) or --restart to begin again")
+        return 1
+    elif checkpoint["last_id"]:
+        print(f"Resuming after photo {checkpoint['last_id']} ({checkpoint['processed']} already processed)")
+
+    columns = [Photo.id, Photo.user_id, Photo.path, Photo.filename, Photo.thumbnail_path,
+               *(getattr(Photo, f) for f in [*METADATA_FIELDS, *CLASSIFY_FIELDS])]
+    db = SessionLocal()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill")
+    try:
+        if retry_failed:
+            total = sum(1 for i in checkpoint["failed_ids"] if i > checkpoint["retry_after"])
+        else:
+            remaining = db.query(Photo.id).filter(Photo.id > checkpoint["last_id"])
+            if user_id is not None:
+                remaining = remaining.filter(Photo.user_id == user_id)
+            total = remaining.count()
+        print(f"{'Retrying' if retry_failed else 'Backfilling'} {', '.join(stages)} for {total} photo(s) "
+              f"with {workers} worker(s)\n")
+
+        started = time.perf_counter()
+        done = 0
+        while True:
+            if retry_failed:
+                chunk = [i for i in checkpoint["failed_ids"] if i > checkpoint["retry_after"]][:batch_size]
+                if not chunk:
+                    break
+                query = db.query(*columns).filter(Photo.id.in_(chunk)).order_by(Photo.id)
+            else:
+                # Keyset pagination: stable under concurrent uploads and O(batch) per step
+                query = db.query(*columns).filter(Photo.id > checkpoint["last_id"])
+                if user_id is not None:
+                    query = query.filter(Photo.user_id == user_id)
+                query = query.order_by(Photo.id).limit(batch_size)
+            batch = [row._asdict() for row in query]
+            db.rollback()  # end the read transaction; workers take a while
+            if not batch and not retry_failed:
+                break
+
+            futures = [pool.submit(process, photo, stages, force) for photo in batch]
+            results, failed = [], []
+            for photo, future in zip(batch, futures):
+                try:
+                    results.append((photo, future.result()))
+                except Exception as e:
+                    failed.append(photo["id"])
+                    print(f"  ! photo {photo['id']}: {e}")
+
+            updated = []
+            for photo, result in results:
+                held = hold_for_review(photo, result["updates"])
+                if held:
+                    checkpoint["review"][str(photo["id"])] = {
+                        field: [photo[field], value] for field, value in held.items()
+                    }
+                if result["updates"]:
+                    apply(db, photo, result["updates"])
+                    updated.append(photo["id"])
+                if result.get("unclassified"):
+                    failed.append(photo["id"])
+                key = result["updates"].get("thumbnail_path")
+                if key and not storage.exists(key):
+                    # Shared thumbnail deleted with another row's content since process() saw it
+                    load_stored(photo["path"], photo["filename"]).image.store_thumbnail(overwrite=True)
+            db.commit()
+            index_documents(db, "photo", updated)
+            if "embed" in stages:
+                by_user = {}
+                for photo, result in results:
+                    if result["clip_image"] is not None:
+                        by_user.setdefault(photo["user_id"], []).append((photo["id"], result["clip_image"]))
+                for uid, photos in by_user.items():
+                    index_photo_files(uid, photos)
+
+            if retry_failed:
+                # Photos deleted since they failed drop out of the list along with those that succeeded
+                checkpoint["retry_after"] = chunk[-1]
+                checkpoint["failed_ids"] = sorted(set(checkpoint["failed_ids"]) - set(chunk) | set(failed))
+            else:
+                checkpoint["last_id"] = batch[-1]["id"]
+                checkpoint["processed"] += len(batch)
+                checkpoint["failed_ids"] = sorted(set(checkpoint["failed_ids"]) | set(failed))
+            checkpoint["updated"] += len(updated)
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            done += len(chunk) if retry_failed else len(batch)
+            elapsed = time.perf_counter() - started
+            throughput = done / elapsed if elapsed else 0
+            eta = (total - done) / throughput if throughput else 0
+            position = checkpoint["retry_after"] if retry_failed else checkpoint["last_id"]
+            print(f"  up to photo {position}: {done}/{total}, {len(updated)} updated, "
+                  f"{throughput:.1f} photos/s, ETA {_eta(max(eta, 0))}")
+
+            # Throttle: hold the average under --rate, then the fixed --pause
+            if rate:
+                time.sleep(max(0.0, done / rate - (time.perf_counter() - started)))
+            if pause:
+                time.sleep(pause)
+
+        elapsed = time.perf_counter() - started
+        failed_ids = checkpoint["failed_ids"]
+        print(f"\nProcessed {done} photo(s) in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.1f} photos/s): "
+              f"{checkpoint['updated']} updated, {len(failed_ids)} failed")
+        if checkpoint["review"]:
+            print(f"  {len(checkpoint['review'])} photo(s) were reclassified but left unchanged, "
+                  f"since the new class needs the vault or a receipt row; review them:")
+            for photo_id, held in sorted(checkpoint["review"].items(), key=lambda item: int(item[0])):
+                changes = ", ".join(f"{field} {old} -> {new}" for field, (old, new) in held.items())
+                print(f"    photo {photo_id}: {changes}")
+        if failed_ids:
+            checkpoint["complete"] = checkpoint.get("complete") or not retry_failed
+            checkpoint.pop("retry_after", None)
+            save_checkpoint(checkpoint_path, checkpoint)
+            print(f"  Failed photo(s) are kept in {checkpoint_path}; rerun with --retry-failed to retry them.")
+            return 1
+        if retry_failed and not checkpoint.get("complete"):
+            # Retried the failures of an interrupted run; its main pass still has to resume
+            checkpoint.pop("retry_after", None)
+            save_checkpoint(checkpoint_path, checkpoint)
+            return 0
+        os.remove(checkpoint_path)
+        return 0
+    finally:
+        pool.shutdown(cancel_futures=True)
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", required=True,
+                        help=f"Comma-separated, any of: {', '.join(STAGES)}")
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4, help="Threads loading and processing photos")
+    parser.add_argument("--rate", type=float, default=0, help="Max photos per second (0: unlimited)")
+    parser.add_argument("--pause", type=float, default=0, help="Seconds to sleep between batches")
+    parser.add_argument("--force", action="store_true", help="Regenerate thumbnails that already exist")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first photo")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Re-run only the photos the checkpoint lists as failed")
+    args = parser.parse_args()
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown or not stages:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}" if unknown else "no stages given")
+    stages = [s for s in STAGES if s in stages]
+    sys.exit(run(stages, user_id=args.user_id, batch_size=args.batch_size, workers=args.workers,
+                 rate=args.rate, pause=args.pause, force=args.force,
+                 checkpoint_path=args.checkpoint, restart=args.restart, retry_failed=args.retry_failed))
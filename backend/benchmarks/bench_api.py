@@ -0,0 +1,316 @@
+"""
+Offline API benchmark: the FastAPI app in-process on SQLite, with the AI
+backends replaced by deterministic fakes (benchmarks/fake_backends.py).
+
+    python backend/benchmarks/bench_api.py                                 # all scenarios
+    python backend/benchmarks/bench_api.py --scenarios upload,chat --vision-latency-ms 0
+    python backend/benchmarks/bench_api.py --sizes 1000,10000 --save head.json --compare base.json
+
+Scenarios:
+  upload   photos/s and MB/s through POST /photos/upload (classification,
+           faces, receipts, vault and storage all run; only the models are fake)
+  listing  GET /photos/, /photos/range, /photos/timeline and /photos/search for a
+           user with each of --sizes photos (rows are bulk-seeded)
+  chat     POST /chat/ round trips, plain replies and search_library tool calls
+  stats    GET /stats/ and /receipts/analytics for the largest seeded user
+
+Everything runs in a temporary directory (database, storage, indexes), so
+runs do not touch local data and are repeatable. --save writes the results
+as JSON; --compare prints the change against a saved run, and fails the run
+when a median latency or a throughput gets worse by more than
+--max-regression percent.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("upload", "listing", "chat", "stats")
+
+
+def configure(workdir: str):
+    """Point every data location at workdir; must run before backend is imported."""
+    os.environ.update(
+        DB_PROFILE="sqlite", SQLITE_PATH=os.path.join(workdir, "bench.db"), AUTO_CREATE_SCHEMA="1",
+        STORAGE_BACKEND="local", STORAGE_ROOT=os.path.join(workdir, "uploads"),
+        INGEST_TMP_DIR=os.path.join(workdir, "ingest_tmp"),
+        SEARCH_INDEX_PATH=os.path.join(workdir, "search_index.db"),
+        VECTOR_INDEX_DIR=os.path.join(workdir, "vector_index"),
+        IMAGE_EMBEDDINGS="0", AI_WARMUP="0", LOG_LEVEL="WARNING", REQUEST_LOG_SAMPLE="0",
+        VAULT_MASTER_KEY="bench-only-vault-master-key",
+    )
+    os.environ.pop("DATABASE_URL", None)
+    os.environ.pop("GROQ_API_KEY", None)
+
+
+def summarize(samples: list[float]) -> dict:
+    """Latency summary in milliseconds."""
+    ms = sorted(s * 1000 for s in samples)
+    pick = lambda q: ms[min(len(ms) - 1, int(q * len(ms)))]
+    return {"n": len(ms), "mean_ms": round(statistics.fmean(ms), 2), "p50_ms": round(pick(0.5), 2),
+            "p95_ms": round(pick(0.95), 2), "max_ms": round(ms[-1], 2)}
+
+
+def timed(call, repeat: int) -> dict:
+    call()  # warm caches and the connection pool
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = call()
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise SystemExit(f"{response.request.method} {response.request.url} -> {response.status_code}: "
+                             f"{response.text[:300]}")
+    return summarize(samples)
+
+
+def make_jpeg(seed: int, side: int) -> bytes:
+    """A photo-like JPEG (smooth colour fields plus grain), unique per seed."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    small = Image.fromarray(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)).resize((side, side * 3 // 4), Image.BICUBIC)
+    grain = rng.integers(-12, 13, (side * 3 // 4, side, 3))
+    pixels = np.clip(np.asarray(small, dtype=np.int16) + grain, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=88)
+    return buffer.getvalue()
+
+
+def register(client, email: str) -> tuple[int, dict]:
+    from backend.database import SessionLocal
+    from backend.models.user import User
+
+    token = client.post("/auth/register", json={"email": email, "password": "bench-password",
+                                                "dob": "1990-01-01"}).json()["access_token"]
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.email == email).scalar()
+    finally:
+        db.close()
+    return user_id, {"Authorization": f"Bearer {token}"}
+
+
+def seed_photos(user_id: int, count: int, seed: int):
+    """Bulk-insert `count` photo rows (no files) and rebuild the user's counters and indexes."""
+    from sqlalchemy import insert
+    from backend.database import SessionLocal
+    from backend.models.photo import Photo
+    from backend.stats_utils import rebuild_user_stats
+    from backend.timeline_utils import rebuild_timeline
+    from backend.search_index import rebuild_search_index
+    from backend.benchmarks.fake_backends import FakeGroq
+
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    db = SessionLocal()
+    try:
+        for offset in range(0, count, 5000):
+            rows = []
+            for i in range(offset, min(count, offset + 5000)):
+                label = FakeGroq.classification(rng.getrandbits(32))
+                sha = f"{rng.getrandbits(256):064x}"
+                rows.append({
+                    "user_id": user_id, "path": f"photos/{sha[:2]}/{sha[2:4]}/{sha}.jpg", "filename": f"IMG_{i:06d}.jpg",
+                    "category": label["category"], "is_sensitive": False, "doc_type": label["doc_type"],
+                    "description": label["description"], "size_bytes": rng.randint(200_000, 4_000_000),
+                    "width": 4032, "height": 3024, "mime_type": "image/jpeg",
+                    "taken_at": start + timedelta(seconds=rng.randint(0, 10 * 365 * 86400)),
+                })
+            db.execute(insert(Photo), rows)
+            db.commit()
+        rebuild_user_stats(db, user_id)
+        rebuild_timeline(db, user_id)
+        db.commit()
+        rebuild_search_index(db, user_id)
+    finally:
+        db.close()
+
+
+def bench_upload(client, args) -> dict:
+    user_id, _ = register(client, "upload@bench.example.com")
+    files = [make_jpeg(args.seed + i, args.image_size) for i in range(args.uploads)]
+    requests = [files[i:i + args.files_per_request] for i in range(0, len(files), args.files_per_request)]
+
+    def post(batch_no: int, batch: list[bytes]):
+        started = time.perf_counter()
+        response = client.post("/photos/upload", data={"user_id": user_id}, files=[
+            ("files", (f"bench_{batch_no}_{i}.jpg", data, "image/jpeg")) for i, data in enumerate(batch)
+        ])
+        if response.status_code != 200:
+            raise SystemExit(f"upload -> {response.status_code}: {response.text[:300]}")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        samples = list(pool.map(post, range(len(requests)), requests))
+    elapsed = time.perf_counter() - started
+    total_bytes = sum(len(f) for f in files)
+    return {
+        "files": len(files), "mb": round(total_bytes / 2 ** 20, 2), "seconds": round(elapsed, 3),
+        "photos_per_s": round(len(files) / elapsed, 2), "mb_per_s": round(total_bytes / 2 ** 20 / elapsed, 2),
+        "request": summarize(samples),
+    }
+
+
+def bench_listing(client, args, users: dict) -> dict:
+    results = {}
+    for size, (user_id, headers) in users.items():
+        repeat = max(3, args.repeat // max(1, size // 10_000))  # full listings get slow; keep runs bounded
+        results[str(size)] = {
+            "photos_all": timed(lambda: client.get("/photos/", params={"user_id": user_id}), repeat),
+            "photos_range_page": timed(lambda: client.get("/photos/range", params={"limit": 100}, headers=headers), args.repeat),
+            "timeline_month": timed(lambda: client.get("/photos/timeline", headers=headers), args.repeat),
+            "search_keyword": timed(lambda: client.get("/photos/search", params={"q": "person"}, headers=headers), args.repeat),
+        }
+    return results
+
+
+def bench_chat(client, args, user_id: int) -> dict:
+    plain = timed(lambda: client.post("/chat/", params={"user_id": user_id},
+                                      json={"message": "how many photos do I have?"}), args.repeat)
+    tool = timed(lambda: client.post("/chat/", params={"user_id": user_id},
+                                     json={"message": "find person photos"}), args.repeat)
+    return {"plain": plain, "tool_call": tool,
+            "plain_overhead_ms": round(plain["p50_ms"] - args.llm_latency_ms, 2)}
+
+
+def bench_stats(client, args, headers: dict) -> dict:
+    return {
+        "stats": timed(lambda: client.get("/stats/", headers=headers), args.repeat),
+        "receipt_analytics": timed(lambda: client.get("/receipts/analytics", headers=headers), args.repeat),
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(baseline: dict, current: dict, max_regression: float) -> int:
+    """Print metric changes; returns how many medians / throughputs regressed beyond max_regression percent."""
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    print(f"\nCompared with {baseline['meta'].get('commit', '?')[:10]}:")
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        if not key.endswith(("_ms", "_per_s")) or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        worse = change > 0 if key.endswith("_ms") else change < 0
+        flag = ""
+        if worse and abs(change) > max_regression and key.endswith(("p50_ms", "_per_s")):
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"  {key:<48} {old[key]:>10.2f} -> {new[key]:>10.2f}  ({change:+.1f}%){flag}")
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="bench_api_")
+    configure(workdir)
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    try:
+        with quiet:
+            from fastapi.testclient import TestClient
+            from backend.main import app
+            from backend.benchmarks import fake_backends
+            fake_backends.install(args.llm_latency_ms, args.vision_latency_ms, args.face_latency_ms, args.jitter)
+
+        results = {}
+        with TestClient(app) as client:
+            users = {}
+            if {"listing", "chat", "stats"} & set(args.scenarios):
+                for size in args.sizes:
+                    started = time.perf_counter()
+                    with quiet:
+                        users[size] = register(client, f"user{size}@bench.example.com")
+                        seed_photos(users[size][0], size, args.seed + size)
+                    print(f"Seeded {size} photos in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+            for scenario in args.scenarios:
+                print(f"Running {scenario}...", file=sys.stderr)
+                with quiet:
+                    if scenario == "upload":
+                        results["upload"] = bench_upload(client, args)
+                    elif scenario == "listing":
+                        results["listing"] = bench_listing(client, args, users)
+                    elif scenario == "chat":
+                        results["chat"] = bench_chat(client, args, users[max(users)][0])
+                    elif scenario == "stats":
+                        results["stats"] = bench_stats(client, args, users[max(users)][1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("save", "compare", "verbose")},
+        },
+        "results": results,
+    }
+    for key, value in flatten(results).items():
+        print(f"  {key:<48} {value:>12}")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(json.load(f), report, args.max_regression):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Library sizes (photos) for listing")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed requests per endpoint")
+    parser.add_argument("--uploads", type=int, default=100, help="Photos uploaded in the upload scenario")
+    parser.add_argument("--files-per-request", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4, help="Upload requests in flight")
+    parser.add_argument("--image-size", type=int, default=2048, help="Width of generated photos (px)")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--vision-latency-ms", type=float, default=500)
+    parser.add_argument("--face-latency-ms", type=float, default=80)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Fake latency varies by +/- this fraction")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="A previous --save file to compare against")
+    parser.add_argument("--max-regression", type=float, default=10, help="Percent slower that fails --compare")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    args.sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    sys.exit(run(args))
@@ -0,0 +1,277 @@
+"""
+Face embedding, matching and clustering micro-benchmarks.
+
+    python backend/benchmarks/bench_faces.py                              # everything
+    python backend/benchmarks/bench_faces.py --sections search --sizes 1000,100000,1000000 --dim 128
+    python backend/benchmarks/bench_faces.py --sections embed --fake      # without DeepFace installed
+    python backend/benchmarks/bench_faces.py --save faces.json --compare base.json
+
+Sections:
+  embed    FaceRecognitionService.generate_embedding on decoded BGR arrays
+           (as at upload) per --image-sizes: embeddings/s on this CPU,
+           one image per call vs one DeepFace.represent call for a batch
+  decode   faces.encoding as JSON text, as parsed JSON lists, and as
+           float32/float16 bytes: decode time per 10k faces and bytes per face
+  search   backend/face_matching.py: brute force (float32, float16) vs IVF
+           at several nprobe, per --sizes: build time, query latency,
+           queries/s, memory, recall@1 / recall@10 against exact search and
+           match recall (exact top-10 neighbours above MATCH_THRESHOLD found)
+  cluster  cluster_faces(): time and pairwise precision/recall against the
+           true identities
+
+Search and cluster data is synthetic but face-like: identities are random
+unit vectors, each face a noisy copy of one (same-person similarity ~0.85,
+strangers ~0). Fixed --seed, so runs are comparable. --save / --compare
+work as in bench_api.py.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+from backend import face_matching
+from backend.face_matching import BruteForceIndex, IVFIndex, cluster_faces, decode_embeddings, encode_embedding
+from backend.benchmarks.bench_api import summarize, flatten, compare, git_commit
+
+SECTIONS = ("embed", "decode", "search", "cluster")
+FACES_PER_IDENTITY = 10
+
+
+def synthetic_faces(n: int, dim: int, seed: int, noise: float = 0.6) -> tuple[np.ndarray, np.ndarray]:
+    """(vectors, identity labels): n normalised faces around n / FACES_PER_IDENTITY identities."""
+    rng = np.random.default_rng(seed)
+    identities = face_matching.normalize(rng.standard_normal((max(1, n // FACES_PER_IDENTITY), dim), dtype=np.float32))
+    labels = rng.integers(0, len(identities), n)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):  # bounded temporaries at 1M faces
+        end = min(n, start + 100_000)
+        jitter = rng.standard_normal((end - start, dim), dtype=np.float32) * (noise / np.sqrt(dim))
+        vectors[start:end] = face_matching.normalize(identities[labels[start:end]] + jitter)
+    return vectors, labels
+
+
+def time_per_call(fn, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+# ─── Embedding ────────────────────────────────────────────────────────────────
+def bench_embed(args) -> dict:
+    from backend.ai_services import face_recognition
+    from backend.ai_services.face_recognition import FaceRecognitionService
+
+    if args.fake:
+        from backend.benchmarks.fake_backends import FakeDeepFace
+        face_recognition._deepface = FakeDeepFace(args.fake_latency_ms, jitter=0)
+        backend = "fake"
+    else:
+        try:
+            face_recognition._load_deepface()
+        except ImportError:
+            print("  DeepFace is not installed; skipping embed (use --fake to time the wrapper)", file=sys.stderr)
+            return {"skipped": "deepface not installed"}
+        FaceRecognitionService.warmup()
+        backend = "deepface"
+
+    rng = np.random.default_rng(args.seed)
+    results = {"backend": backend}
+    for side in args.image_sizes:
+        images = [rng.integers(0, 256, (side * 3 // 4, side, 3), dtype=np.uint8) for _ in range(args.batch)]
+        FaceRecognitionService.generate_embedding(images[0])  # first call builds detector state
+        single = time_per_call(lambda: [FaceRecognitionService.generate_embedding(img) for img in images], args.repeat)
+        entry = {
+            "single": {**summarize([s / len(images) for s in single]),
+                       "embeddings_per_s": round(len(images) / statistics.median(single), 2)},
+        }
+        if args.fake:
+            entry["batch"] = {"skipped": "fake backend"}
+            results[f"{side}px"] = entry
+            continue
+        try:
+            deepface = face_recognition._load_deepface()
+            batched = time_per_call(lambda: deepface.represent(img_path=images, model_name=face_recognition.MODEL_NAME,
+                                                               enforce_detection=False), args.repeat)
+            entry["batch"] = {**summarize([s / len(images) for s in batched]),
+                              "embeddings_per_s": round(len(images) / statistics.median(batched), 2)}
+        except Exception as e:  # older DeepFace: represent() takes one image
+            entry["batch"] = {"skipped": f"batch represent unsupported: {type(e).__name__}"}
+        results[f"{side}px"] = entry
+    return results
+
+
+# ─── Stored-encoding decode ───────────────────────────────────────────────────
+def bench_decode(args) -> dict:
+    n = args.decode_rows
+    vectors, _ = synthetic_faces(n, face_matching.DIM, args.seed)
+    as_lists = [row.tolist() for row in vectors]
+    forms = {
+        "json_text": [json.dumps(row) for row in as_lists],  # MySQL driver returning the JSON column as text
+        "json_list": as_lists,                               # already parsed by the JSON column type
+        "float32_bytes": [encode_embedding(row) for row in vectors],
+    }
+    results = {}
+    for name, values in forms.items():
+        samples = time_per_call(lambda: decode_embeddings(values), args.repeat)
+        size = len(values[0]) if isinstance(values[0], (str, bytes)) else len(json.dumps(values[0]))
+        results[name] = {"ms_per_10k": round(statistics.median(samples) / n * 10_000 * 1000, 2), "bytes_per_face": size}
+    half = [row.astype("<f2").tobytes() for row in vectors]
+    samples = time_per_call(lambda: face_matching.normalize(np.frombuffer(b"".join(half), dtype="<f2").reshape(n, -1)),
+                            args.repeat)
+    results["float16_bytes"] = {"ms_per_10k": round(statistics.median(samples) / n * 10_000 * 1000, 2),
+                                "bytes_per_face": len(half[0])}
+    return results
+
+
+# ─── Nearest-neighbour search ─────────────────────────────────────────────────
+def recall_at(found: list[list[int]], exact: list[list[int]], k: int) -> float:
+    hits = sum(len(set(f[:k]) & set(e[:k])) for f, e in zip(found, exact))
+    return round(hits / sum(min(k, len(e)) for e in exact), 4)
+
+
+def match_recall(found: list[list[int]], matches: list[set[int]]) -> float:
+    """Share of the true matches (exact neighbours above MATCH_THRESHOLD) that were found."""
+    total = sum(len(m) for m in matches)
+    return round(sum(len(set(f) & m) for f, m in zip(found, matches)) / total, 4) if total else 1.0
+
+
+def bench_search(args) -> dict:
+    results = {}
+    for n in args.sizes:
+        vectors, labels = synthetic_faces(n, args.dim, args.seed)
+        ids = np.arange(n)
+        rng = np.random.default_rng(args.seed + 1)
+        picks = rng.choice(n, min(args.queries, n), replace=False)
+        queries = face_matching.normalize(vectors[picks] + rng.standard_normal((len(picks), args.dim),
+                                                                                 dtype=np.float32) * (0.6 / np.sqrt(args.dim)))
+        variants = {
+            "brute_f32": lambda: BruteForceIndex(args.dim, np.float32),
+            "brute_f16": lambda: BruteForceIndex(args.dim, np.float16),
+            **{f"ivf_nprobe{p}": (lambda p=p: IVFIndex(args.dim, nprobe=p, seed=args.seed)) for p in args.nprobe},
+        }
+        exact, matched, entry = None, [], {}
+        trained = None
+        for name, make in variants.items():
+            index = make()
+            started = time.perf_counter()
+            if isinstance(index, IVFIndex) and trained is not None:
+                # every nprobe shares one trained, filled index; only the probe count differs
+                index.centroids, index.nlist, index.ids, index.vectors, index.offsets = trained
+            else:
+                index.add(ids, vectors)
+                if isinstance(index, IVFIndex):
+                    trained = (index.centroids, index.nlist, index.ids, index.vectors, index.offsets)
+            build = time.perf_counter() - started
+            found, samples = [], []
+            for query in queries:
+                t = time.perf_counter()
+                hits = index.search(query, 10)
+                samples.append(time.perf_counter() - t)
+                found.append([i for i, _ in hits])
+                if exact is None:
+                    matched.append({i for i, score in hits if score >= face_matching.MATCH_THRESHOLD})
+            if exact is None:
+                exact = found  # brute_f32 runs first: the ground truth
+            entry[name] = {
+                "build_s": round(build, 3), "query": summarize(samples),
+                "queries_per_s": round(len(samples) / sum(samples), 1),
+                "memory_mb": round(index.vectors.nbytes / 2 ** 20, 1),
+                "recall_at_1": recall_at(found, exact, 1), "recall_at_10": recall_at(found, exact, 10),
+                "match_recall": match_recall(found, matched),
+            }
+            print(f"  search n={n} {name}: p50 {entry[name]['query']['p50_ms']} ms, "
+                  f"recall@10 {entry[name]['recall_at_10']}, match recall {entry[name]['match_recall']}", file=sys.stderr)
+        results[str(n)] = entry
+    return results
+
+
+# ─── Clustering ───────────────────────────────────────────────────────────────
+def pairwise_scores(labels: np.ndarray, truth: np.ndarray) -> tuple[float, float]:
+    """Pairwise precision / recall of predicted clusters against true identities."""
+    def same_pairs(groups: np.ndarray) -> int:
+        counts = np.bincount(np.unique(groups, return_inverse=True)[1])
+        return int((counts * (counts - 1) // 2).sum())
+
+    joint = labels.astype(np.int64) * (int(truth.max()) + 1) + truth
+    true_positive = same_pairs(joint)
+    predicted, actual = same_pairs(labels), same_pairs(truth)
+    return (round(true_positive / predicted, 4) if predicted else 1.0,
+            round(true_positive / actual, 4) if actual else 1.0)
+
+
+def bench_cluster(args) -> dict:
+    results = {}
+    for n in args.cluster_sizes:
+        vectors, truth = synthetic_faces(n, face_matching.DIM, args.seed)
+        started = time.perf_counter()
+        labels = cluster_faces(vectors)
+        elapsed = time.perf_counter() - started
+        precision, recall = pairwise_scores(labels, truth)
+        results[str(n)] = {"seconds": round(elapsed, 3), "clusters": int(len(np.unique(labels))),
+                           "identities": int(len(np.unique(truth))), "pair_precision": precision, "pair_recall": recall}
+    return results
+
+
+def run(args) -> int:
+    results = {}
+    for section in args.sections:
+        print(f"Running {section}...", file=sys.stderr)
+        results[section] = {"embed": bench_embed, "decode": bench_decode,
+                            "search": bench_search, "cluster": bench_cluster}[section](args)
+
+    report = {
+        "meta": {
+            "commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+        },
+        "results": results,
+    }
+    for key, value in flatten(results).items():
+        print(f"  {key:<56} {value:>12}")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(json.load(f), report, args.max_regression):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    ints = lambda text: [int(v) for v in text.split(",") if v.strip()]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", default=",".join(SECTIONS), help=f"Comma-separated: {', '.join(SECTIONS)}")
+    parser.add_argument("--image-sizes", type=ints, default=[640, 1280, 1920], help="Image widths for embed (px)")
+    parser.add_argument("--batch", type=int, default=8, help="Images per embed measurement")
+    parser.add_argument("--fake", action="store_true", help="Embed with the fake DeepFace (wrapper overhead only)")
+    parser.add_argument("--fake-latency-ms", type=float, default=0)
+    parser.add_argument("--decode-rows", type=int, default=10_000)
+    parser.add_argument("--sizes", type=ints, default=[1_000, 10_000, 100_000], help="Stored faces for search")
+    parser.add_argument("--dim", type=int, default=face_matching.DIM, help="Embedding size for search (512: Facenet512)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=ints, default=[4, 16], help="IVF cells scanned per query")
+    parser.add_argument("--cluster-sizes", type=ints, default=[1_000, 5_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="A previous --save file to compare against")
+    parser.add_argument("--max-regression", type=float, default=10, help="Percent slower that fails --compare")
+    args = parser.parse_args()
+    args.sections = [s.strip() for s in args.sections.split(",") if s.strip()]
+    unknown = set(args.sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown section(s): {', '.join(sorted(unknown))}")
+    sys.exit(run(args))
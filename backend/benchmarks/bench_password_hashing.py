@@ -0,0 +1,112 @@
+"""
+Password hashing cost and login-storm throughput.
+
+    python backend/benchmarks/bench_password_hashing.py                   # storm with the configured policy
+    python backend/benchmarks/bench_password_hashing.py --calibrate 250   # suggest costs for ~250 ms per hash
+    python backend/benchmarks/bench_password_hashing.py --logins 400 --concurrency 64
+
+The storm fires concurrent logins (a mix of correct passwords, wrong
+passwords and unknown emails) at `verify_and_update_async`, the same path
+/auth/login takes, and reports logins/s overall and per core. It also times
+the previous login path for comparison: pbkdf2_sha256 at passlib defaults,
+checked synchronously, twice on every failure.
+"""
+import sys
+import os
+import time
+import asyncio
+import argparse
+import statistics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from passlib.context import CryptContext
+from backend import auth_utils
+
+def time_hash(context: CryptContext, runs: int = 3) -> float:
+    """Median seconds to verify one hash under `context`."""
+    digest = context.hash("correct horse battery staple")
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        context.verify("correct horse battery staple", digest)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def calibrate(target_ms: float):
+    """Smallest cost per scheme whose verify time reaches target_ms on this machine."""
+    target = target_ms / 1000
+    print(f"Calibrating for ~{target_ms:.0f} ms per hash on this CPU\n")
+
+    memory = 19456  # KiB; argon2 is tuned through time_cost at a fixed memory cost
+    for time_cost in range(1, 21):
+        took = time_hash(CryptContext(schemes=["argon2"], argon2__memory_cost=memory, argon2__time_cost=time_cost))
+        if took >= target or time_cost == 20:
+            print(f"  argon2id      ARGON2_MEMORY_COST={memory} ARGON2_TIME_COST={time_cost}   ({took * 1000:.0f} ms)")
+            break
+
+    try:
+        for rounds in range(10, 17):
+            took = time_hash(CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds))
+            if took >= target or rounds == 16:
+                print(f"  bcrypt        BCRYPT_ROUNDS={rounds}   ({took * 1000:.0f} ms)")
+                break
+    except Exception as e:
+        print(f"  bcrypt        unavailable: {e}")
+
+    # pbkdf2 cost is linear in rounds: measure once, then scale
+    base = 100_000
+    took = time_hash(CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__rounds=base))
+    rounds = max(base, int(base * target / took) // 1000 * 1000)
+    print(f"  pbkdf2_sha256 PBKDF2_ROUNDS={rounds}   (~{target_ms:.0f} ms, {took * 1000:.0f} ms at {base})")
+
+async def storm(logins: int, concurrency: int, stored_hash: str) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def attempt(i: int):
+        async with semaphore:
+            if i % 3 == 0:
+                await auth_utils.verify_and_update_async("correct horse battery staple", stored_hash)
+            elif i % 3 == 1:
+                await auth_utils.verify_and_update_async("wrong password", stored_hash)
+            else:
+                await auth_utils.verify_and_update_async("anything", None)  # unknown email
+
+    started = time.perf_counter()
+    await asyncio.gather(*(attempt(i) for i in range(logins)))
+    return time.perf_counter() - started
+
+def legacy_storm(logins: int) -> float:
+    context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+    stored_hash = context.hash("correct horse battery staple")
+    started = time.perf_counter()
+    for i in range(logins):
+        password = "correct horse battery staple" if i % 3 == 0 else "wrong password"
+        if not context.verify(password, stored_hash):
+            context.verify(password, stored_hash)
+    return time.perf_counter() - started
+
+def run(logins: int, concurrency: int):
+    cores = os.cpu_count() or 1
+    print(f"Policy: schemes={auth_utils.PASSWORD_SCHEMES} workers={auth_utils.HASH_WORKERS} cores={cores}")
+    per_hash = time_hash(auth_utils.pwd_context)
+    print(f"  single verify: {per_hash * 1000:.1f} ms")
+
+    stored_hash = auth_utils.get_password_hash("correct horse battery staple")
+    took = asyncio.run(storm(logins, concurrency, stored_hash))
+    print(f"  storm: {logins} logins x{concurrency} concurrent in {took:.2f}s "
+          f"-> {logins / took:.1f} logins/s ({logins / took / cores:.1f} per core)")
+
+    legacy_logins = max(logins // 4, 10)
+    took = legacy_storm(legacy_logins)
+    print(f"  previous path (sync pbkdf2, double verify on failure): {legacy_logins / took:.1f} logins/s on one thread")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calibrate", type=float, metavar="MS", help="Suggest cost settings for this latency per hash")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    if args.calibrate:
+        calibrate(args.calibrate)
+    else:
+        run(args.logins, args.concurrency)
@@ -0,0 +1,101 @@
+"""
+API cold-start profile.
+
+    python backend/benchmarks/bench_startup.py                 # import profile + time to first response
+    python backend/benchmarks/bench_startup.py --top 40
+    python backend/benchmarks/bench_startup.py --save startup.json --budget 1.0
+
+Runs `python -X importtime -c "import backend.main"` in a fresh interpreter
+and lists the slowest imports (cumulative), then starts uvicorn and times
+process launch to the first 200 from `/`. --budget makes the run fail when
+that exceeds the given number of seconds; --save writes the numbers as JSON
+so runs can be compared over time.
+"""
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import subprocess
+import urllib.request
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def import_profile() -> list[tuple[str, int, int]]:
+    """[(module, self_us, cumulative_us)] for `import backend.main`, in import order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import backend.main failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def time_to_first_response(timeout: float = 60) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise SystemExit("uvicorn exited during startup")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise SystemExit(f"No response from / within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def run(top: int, save: str = None, budget: float = None) -> int:
+    rows = import_profile()
+    total = next((cumulative for name, _, cumulative in rows if name.strip() == "backend.main"), 0)
+    print(f"import backend.main: {total / 1000:.0f} ms\n")
+    print(f"  {'cumulative':>10}  {'self':>8}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"  {cumulative_us / 1000:>8.1f}ms  {self_us / 1000:>6.1f}ms  {name}")
+
+    first_response = time_to_first_response()
+    print(f"\nProcess start to first / response: {first_response:.2f}s")
+
+    if save:
+        with open(save, "w") as f:
+            json.dump({
+                "import_ms": round(total / 1000, 1),
+                "first_response_s": round(first_response, 3),
+                "slowest_imports": [
+                    {"module": name.strip(), "cumulative_ms": round(c / 1000, 1)}
+                    for name, _, c in sorted(rows, key=lambda r: -r[2])[:top]
+                ],
+            }, f, indent=2)
+        print(f"Saved to {save}")
+
+    if budget is not None and first_response > budget:
+        print(f"Over budget: {first_response:.2f}s > {budget:.2f}s")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25, help="How many of the slowest imports to list")
+    parser.add_argument("--save", help="Write results as JSON to this file")
+    parser.add_argument("--budget", type=float, help="Fail if the first response takes longer (seconds)")
+    args = parser.parse_args()
+    sys.exit(run(args.top, args.save, args.budget))
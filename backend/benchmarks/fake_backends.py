@@ -0,0 +1,128 @@
+"""
+Deterministic stand-ins for the AI backends, for offline benchmarks.
+
+install() swaps in a fake Groq client (chat, vision classification and
+receipt parsing) and a fake DeepFace module. GroqClient, ReceiptAnalyzer
+and FaceRecognitionService run unchanged on top of them, so base64
+encoding, JSON parsing and metrics are still measured. Each call sleeps for
+its configured latency, scaled by a jitter drawn from the request content,
+and answers are derived from the content too: the same input always gets
+the same answer and the same delay.
+"""
+import re
+import json
+import time
+import zlib
+import random
+from types import SimpleNamespace
+import numpy as np
+
+# Share of uploads per vision category (Document uploads are sensitive and go to the vault)
+CATEGORY_MIX = [("General", 50), ("Person", 30), ("Receipt", 10), ("Note", 5), ("Document", 5)]
+MERCHANTS = ["FreshMart", "City Fuel", "Cafe Aroma", "MediPlus", "Book Nook"]
+ITEMS = ["milk", "bread", "eggs", "coffee", "rice", "apples", "soap", "tea"]
+
+
+def _key(data) -> int:
+    if isinstance(data, str):
+        data = data.encode()
+    return zlib.crc32(data)
+
+
+class _Latency:
+    def __init__(self, ms: float, jitter: float):
+        self.seconds = ms / 1000
+        self.jitter = jitter
+
+    def wait(self, key: int):
+        if self.seconds > 0:
+            time.sleep(self.seconds * random.Random(key).uniform(1 - self.jitter, 1 + self.jitter))
+
+
+def _response(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeGroq:
+    """Answers client.chat.completions.create(...) the way groq.Groq would."""
+
+    def __init__(self, llm_latency_ms: float = 300, vision_latency_ms: float = 500, jitter: float = 0.2):
+        self.llm = _Latency(llm_latency_ms, jitter)
+        self.vision = _Latency(vision_latency_ms, jitter)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages: list, model: str = None, **kwargs):
+        content = messages[-1]["content"]
+        if isinstance(content, list):  # vision request: [image_url, text prompt]
+            url = next(part["image_url"]["url"] for part in content if part["type"] == "image_url")
+            prompt = next(part["text"] for part in content if part["type"] == "text")
+            key = _key(url[-4096:])
+            self.vision.wait(key)
+            answer = self.receipt(key) if "receipt parser" in prompt else self.classification(key)
+            return _response(json.dumps(answer))
+
+        key = _key(content)
+        self.llm.wait(key)
+        if content.lower().startswith("find "):
+            system = messages[0]["content"]
+            user_id = int(re.search(r"user_id: (\d+)", system).group(1))
+            return _response(json.dumps({"tool": "search_library",
+                                         "args": {"user_id": user_id, "query": content[5:], "limit": 10}}))
+        return _response(f"You asked about '{content[:40]}'. Here is a short answer.")
+
+    @staticmethod
+    def classification(key: int) -> dict:
+        roll = key % sum(weight for _, weight in CATEGORY_MIX)
+        for category, weight in CATEGORY_MIX:
+            if roll < weight:
+                break
+            roll -= weight
+        return {
+            "category": category,
+            "is_sensitive": category == "Document",
+            "doc_type": {"Person": "selfie", "Receipt": "receipt", "Note": "note",
+                         "Document": "passport"}.get(category, "general"),
+            "description": f"a {category.lower()} photo number {key % 1000}",
+        }
+
+    @staticmethod
+    def receipt(key: int) -> dict:
+        rng = random.Random(key)
+        items = [{"name": rng.choice(ITEMS), "price": round(rng.uniform(1, 20), 2)} for _ in range(rng.randint(1, 6))]
+        total = round(sum(i["price"] for i in items), 2)
+        return {
+            "Merchant Name": rng.choice(MERCHANTS),
+            "Date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "Total Amount": total,
+            "Tax Amount": round(total * 0.05, 2),
+            "Category": "Food",
+            "Items": items,
+        }
+
+
+class FakeDeepFace:
+    """DeepFace.represent / build_model with 0-2 stable 512-d 'faces' per image."""
+
+    def __init__(self, latency_ms: float = 80, jitter: float = 0.2):
+        self.latency = _Latency(latency_ms, jitter)
+
+    def build_model(self, model_name: str = None):
+        return None
+
+    def represent(self, img_path, model_name: str = None, enforce_detection: bool = True, **kwargs):
+        array = np.asarray(img_path)
+        step = max(1, max(array.shape[:2]) // 32)
+        key = _key(np.ascontiguousarray(array[::step, ::step]).tobytes())
+        self.latency.wait(key)
+        rng = np.random.default_rng(key)
+        return [{"embedding": rng.standard_normal(512).tolist()} for _ in range(key % 3)]
+
+
+def install(llm_latency_ms: float = 300, vision_latency_ms: float = 500, face_latency_ms: float = 80,
+            jitter: float = 0.2):
+    """Route GroqClient and FaceRecognitionService to the fakes (call after importing backend.main)."""
+    from backend.ai_services import face_recognition
+    from backend.ai_services.groq_client import GroqClient
+
+    GroqClient.client = FakeGroq(llm_latency_ms, vision_latency_ms, jitter)
+    face_recognition._deepface = FakeDeepFace(face_latency_ms, jitter)
@@ -0,0 +1,81 @@
+"""
+Backfill the semantic search vector index (backend/vector_index.py) with
+CLIP embeddings of photos uploaded before IMAGE_EMBEDDINGS was enabled.
+Photos already in the index are skipped, so an interrupted run resumes.
+
+    IMAGE_EMBEDDINGS=1 python backend/build_image_index.py              # every user
+    IMAGE_EMBEDDINGS=1 python backend/build_image_index.py --user-id 4  # a single user
+    IMAGE_EMBEDDINGS=1 python backend/build_image_index.py --rebuild    # after changing IMAGE_EMBEDDING_MODEL
+                                                                       # or upgrading the index format
+"""
+import sys
+import os
+import shutil
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import SessionLocal
+from backend.models.photo import Photo
+from backend.storage import storage
+from backend import vector_index
+from backend.ai_services.image_embeddings import ImageEmbedder, index_photo_files, MODEL_NAME
+
+def run(user_id: int = None, rebuild: bool = False, batch_size: int = 64):
+    if not ImageEmbedder.available():
+        print("Image embeddings are unavailable: set IMAGE_EMBEDDINGS=1 and install sentence-transformers")
+        return 1
+    if rebuild:
+        if user_id is None:
+            shutil.rmtree(vector_index.INDEX_DIR, ignore_errors=True)
+        else:
+            vector_index.drop(user_id)
+    meta = vector_index.read_meta()
+    if meta is not None and meta.get("model") != MODEL_NAME:
+        print(f"Index was built with {meta.get('model')}; run with --rebuild to switch to {MODEL_NAME}")
+        return 1
+    if meta is not None and meta.get("format") != vector_index.FORMAT:
+        print("Index uses an older file format; run with --rebuild to convert it")
+        return 1
+
+    db = SessionLocal()
+    try:
+        skip = {}
+        indexed = 0
+        last_id = 0
+        while True:
+            # Keyset pagination: stable under concurrent uploads and O(batch) per step
+            query = db.query(Photo.id, Photo.user_id, Photo.path).filter(Photo.id > last_id)
+            if user_id is not None:
+                query = query.filter(Photo.user_id == user_id)
+            batch = query.order_by(Photo.id).limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            by_user = {}
+            for pid, uid, path in batch:
+                if uid not in skip:
+                    skip[uid] = vector_index.indexed_ids(uid)
+                if pid not in skip[uid] and storage.exists(path):
+                    by_user.setdefault(uid, []).append((pid, storage.open(path)))
+            for uid, photos in by_user.items():
+                try:
+                    index_photo_files(uid, photos)
+                finally:
+                    for _, f in photos:
+                        f.close()
+                indexed += len(photos)
+            print(f"  up to photo {last_id}: {indexed} embedded")
+
+        print(f"\nEmbedded {indexed} photo(s) for {len(skip)} user(s)")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true", help="Discard existing vectors and re-embed")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    sys.exit(run(user_id=args.user_id, rebuild=args.rebuild, batch_size=args.batch_size))
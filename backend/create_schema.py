@@ -0,0 +1,40 @@
+"""
+Create any missing tables for the current models.
+
+The API no longer does this on import (set AUTO_CREATE_SCHEMA=1 to restore
+that for local development); run it once after pulling new models, before
+the column-level migrations:
+
+    python backend/init_db.py        # create the database itself, if needed
+    python backend/create_schema.py
+    python backend/audit_schema.py   # add columns missing from existing tables
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import engine, Base
+from sqlalchemy import inspect
+
+# Import all models so Base.metadata is populated
+from backend.models.user import User
+from backend.models.photo import Photo
+from backend.models.vault import VaultFile
+from backend.models.receipt import Receipt
+from backend.models.person import Person
+from backend.models.face import Face
+from backend.models.user_stats import UserStats
+from backend.models.photo_timeline import PhotoTimelineBucket
+from backend.models.receipt_monthly import ReceiptMonthly
+from backend.models.receipt_item import ReceiptItem
+
+def create_schema():
+    existing = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+    created = [t for t in Base.metadata.tables if t not in existing]
+    for table in created:
+        print(f"  Created {table}")
+    print(f"Schema up to date ({len(created)} table(s) created)")
+
+if __name__ == "__main__":
+    create_schema()
@@ -1,7 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.pool import QueuePool, StaticPool
+from .metrics import instrument_engine, POOL_CHECKOUT_WAIT, Gauge
 import os
+import time
 from dotenv import load_dotenv
 
 from pathlib import Path
@@ -22,15 +26,99 @@ DB_NAME = os.getenv("DB_NAME", "personalens")
 # URL encode the password to handle special characters like '@'
 encoded_password = urllib.parse.quote_plus(DB_PASSWORD)
 
+# DB_PROFILE=sqlite runs the whole API on a local file (DB_PROFILE=memory: in-process,
+# schema created at startup) — for development and benchmarks without MySQL
+DB_PROFILE = os.getenv("DB_PROFILE", "mysql").lower()
+_PROFILE_URLS = {
+    "sqlite": f"sqlite:///{os.getenv('SQLITE_PATH', 'personalens.db')}",
+    "memory": "sqlite://",
+}
+
 SQLALCHEMY_DATABASE_URL = os.getenv(
-    "DATABASE_URL", 
-    f"mysql+pymysql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    "DATABASE_URL",
+    _PROFILE_URLS.get(DB_PROFILE, f"mysql+pymysql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
 )
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+IN_MEMORY = IS_SQLITE and SQLALCHEMY_DATABASE_URL.split("///")[-1] in ("", ":memory:", "sqlite://")
+
+# Pool profile. Checked-out connections are capped at DB_POOL_SIZE + DB_MAX_OVERFLOW;
+# sync endpoints run on a 40-thread pool, so the defaults leave headroom without
+# letting a burst open unbounded MySQL connections.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # below MySQL's wait_timeout
+# always: ping on every checkout (an extra round-trip per request)
+# idle:   ping only connections idle longer than DB_PING_IDLE_SECONDS
+# never:  rely on DB_POOL_RECYCLE and reconnect-on-error
+PRE_PING = os.getenv("DB_PRE_PING", "idle").lower()
+PING_IDLE_SECONDS = float(os.getenv("DB_PING_IDLE_SECONDS", 60))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited (including any new connect)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, pool="main")
+
+
+def _engine_options() -> dict:
+    if IN_MEMORY:
+        # One shared connection, or every checkout would see a fresh empty database
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    if IS_SQLITE:
+        return {
+            "poolclass": TimedQueuePool, "pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW,
+            "pool_timeout": POOL_TIMEOUT, "connect_args": {"check_same_thread": False, "timeout": 30},
+        }
+    return {
+        "poolclass": TimedQueuePool, "pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT, "pool_recycle": POOL_RECYCLE, "pool_pre_ping": PRE_PING == "always",
+    }
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options())
+instrument_engine(engine)
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not IN_MEMORY:
+            cursor.execute("PRAGMA journal_mode=WAL")  # readers do not block the writer
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+if PRE_PING == "idle" and not IS_SQLITE:
+    @event.listens_for(engine, "checkin")
+    def _mark_idle(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < PING_IDLE_SECONDS:
+            return
+        try:
+            cursor = dbapi_connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+        except Exception:
+            # The pool discards this connection and retries the checkout with a new one
+            raise exc.DisconnectionError()
+
+if isinstance(engine.pool, QueuePool):
+    Gauge("db_pool_connections", "Pooled connections by state.", lambda: {
+        "checked_out": engine.pool.checkedout(),
+        "idle": engine.pool.checkedin(),
+        "overflow": max(engine.pool.overflow(), 0),
+    }, label="state")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -41,3 +129,79 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ─── Async endpoints ──────────────────────────────────────────────────────────
+# `async def` endpoints must not run queries on the event loop. They take an
+# AsyncDB from get_async_db and run their ORM work through `await db.run(fn)`:
+#   ASYNC_DB=1  -> an AsyncSession on an async driver (aiomysql / aiosqlite);
+#                  fn runs via run_sync, so its queries are non-blocking I/O
+#   otherwise   -> a regular Session; fn runs on the threadpool
+# Either way the existing sync helpers (save_receipt, record_photo_added, ...)
+# are reused unchanged, and the async engine has its own pool.
+# run_sync still executes fn itself on the event loop, so fn must do nothing
+# but ORM work there. Functions that also touch storage or the search index
+# (often inside their transaction, where the work cannot be moved out) go
+# through `await db.run_in_thread(fn)`, which always uses a sync Session on
+# the threadpool.
+ASYNC_DB = os.getenv("ASYNC_DB", "0").lower() in ("1", "true", "yes")
+_ASYNC_DRIVERS = {"mysql+pymysql": f"mysql+{os.getenv('ASYNC_DB_DRIVER', 'aiomysql')}", "sqlite": "sqlite+aiosqlite"}
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or next(
+    (SQLALCHEMY_DATABASE_URL.replace(sync, driver, 1) for sync, driver in _ASYNC_DRIVERS.items()
+     if SQLALCHEMY_DATABASE_URL.startswith(sync + ":")),
+    SQLALCHEMY_DATABASE_URL,
+)
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    if IN_MEMORY:
+        raise RuntimeError("ASYNC_DB needs a database both engines can reach; DB_PROFILE=memory is per-engine")
+    _async_options = {"connect_args": {"check_same_thread": False}} if IS_SQLITE else {
+        "pool_size": int(os.getenv("ASYNC_DB_POOL_SIZE", POOL_SIZE)), "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT, "pool_recycle": POOL_RECYCLE, "pool_pre_ping": PRE_PING != "never",
+    }
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_async_options)
+    instrument_engine(async_engine.sync_engine)
+    # Objects stay readable after commit; endpoints touch them only inside db.run()
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+class AsyncDB:
+    """Session handle for async endpoints; see get_async_db."""
+
+    def __init__(self, session):
+        self.session = session
+        self.is_async = AsyncSessionLocal is not None and not isinstance(session, Session)
+
+    async def run(self, fn, *args, **kwargs):
+        """Call fn(session, *args, **kwargs) without blocking the event loop. fn must only do DB work."""
+        if self.is_async:
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+    async def run_in_thread(self, fn, *args, **kwargs):
+        """Call fn(session, *args, **kwargs) on the threadpool with a sync Session, for fn that also blocks on files."""
+        if not self.is_async:
+            return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+        def call():
+            with SessionLocal() as session:
+                return fn(session, *args, **kwargs)
+        return await run_in_threadpool(call)
+
+    async def close(self):
+        if self.is_async:
+            await self.session.close()
+        else:
+            await run_in_threadpool(self.session.close)
+
+
+async def get_async_db():
+    db = AsyncDB(AsyncSessionLocal() if AsyncSessionLocal is not None else SessionLocal())
+    try:
+        yield db
+    finally:
+        await db.close()
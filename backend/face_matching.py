@@ -0,0 +1,167 @@
+"""
+Matching and clustering for face embeddings (faces.encoding, Facenet512).
+
+Embeddings are compared as L2-normalised float32 rows, so cosine similarity
+is a dot product. Two searchers share one interface, add(ids, vectors) and
+search(query, k):
+
+- BruteForceIndex: one matrix-vector product over every row. Exact; a few
+  milliseconds per query up to ~100k faces. float16 storage halves the
+  memory; rows are scored in float32 blocks, as NumPy's float16 matmul is
+  an order of magnitude slower.
+- IVFIndex: an inverted file. Spherical k-means splits the rows into `nlist`
+  cells stored contiguously; a query scores the centroids and scans only the
+  `nprobe` closest cells. Approximate: nprobe trades recall for speed.
+
+cluster_faces() groups faces whose similarity clears a threshold, for
+grouping untagged faces. backend/benchmarks/bench_faces.py measures all of
+these (query latency, recall@k against brute force, clustering quality), so
+changes here are judged on numbers.
+"""
+import json
+import numpy as np
+
+DIM = 512
+# DeepFace's cosine-distance threshold for Facenet512 is 0.30
+MATCH_THRESHOLD = 0.70
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def encode_embedding(vector) -> bytes:
+    """Binary form of one embedding: little-endian float32."""
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def decode_embeddings(values: list, dim: int = DIM) -> np.ndarray:
+    """
+    (n, dim) normalised float32 matrix from stored encodings: JSON text, lists
+    already parsed from a JSON column, or encode_embedding() bytes. Empty or
+    malformed encodings (tag placeholders) become zero rows, which match nothing.
+    """
+    matrix = np.zeros((len(values), dim), dtype=np.float32)
+    for i, value in enumerate(values):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            row = np.frombuffer(value, dtype="<f4")
+        elif isinstance(value, str):
+            row = np.asarray(json.loads(value), dtype=np.float32)
+        else:
+            row = np.asarray(value or [], dtype=np.float32)
+        if row.shape == (dim,):
+            matrix[i] = row
+    return normalize(matrix)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class BruteForceIndex:
+    def __init__(self, dim: int = DIM, dtype=np.float32):
+        self.dim = dim
+        self.dtype = dtype
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, dim), dtype=dtype)
+
+    def add(self, ids, vectors: np.ndarray):
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.vectors = np.concatenate([self.vectors, normalize(vectors).astype(self.dtype)])
+
+    def search(self, query: np.ndarray, k: int = 10, block: int = 16384) -> list[tuple[int, float]]:
+        """[(id, cosine similarity)] best first."""
+        query = np.asarray(query, dtype=np.float32)
+        if self.vectors.dtype == np.float32:
+            scores = self.vectors @ query
+        else:
+            scores = np.concatenate([
+                self.vectors[i:i + block].astype(np.float32) @ query for i in range(0, len(self.vectors), block)
+            ]) if len(self.vectors) else np.zeros(0, dtype=np.float32)
+        return [(int(self.ids[i]), float(scores[i])) for i in _top_k(scores, k)]
+
+
+class IVFIndex:
+    def __init__(self, dim: int = DIM, nlist: int = None, nprobe: int = 8, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = None
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.offsets = None  # vectors of cell c are rows offsets[c]:offsets[c + 1]
+
+    def train(self, vectors: np.ndarray, iterations: int = 10):
+        """Spherical k-means on (a sample of) the vectors. nlist defaults to ~4*sqrt(n)."""
+        vectors = normalize(vectors)
+        nlist = self.nlist or max(1, min(len(vectors), int(4 * np.sqrt(len(vectors)))))
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), nlist * 32), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            assign = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            sums[empty] = centroids[empty]  # keep the old centroid for empty cells
+            centroids = normalize(sums)
+        self.nlist, self.centroids = nlist, centroids
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 65536) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[i:i + block] @ centroids.T, axis=1) for i in range(0, len(vectors), block)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+    def add(self, ids, vectors: np.ndarray):
+        """Add rows (trains on them first if untrained); cells are re-sorted, so add in bulk."""
+        vectors = normalize(vectors)
+        if self.centroids is None:
+            self.train(vectors)
+        all_ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        all_vectors = np.concatenate([self.vectors, vectors])
+        assign = self._assign(all_vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        self.ids, self.vectors = all_ids[order], all_vectors[order]
+        self.offsets = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: int = None) -> list[tuple[int, float]]:
+        if self.centroids is None:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        cells = _top_k(self.centroids @ query, nprobe or self.nprobe)
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in cells])
+        scores = self.vectors[rows] @ query
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in _top_k(scores, k)]
+
+
+def cluster_faces(vectors: np.ndarray, threshold: float = MATCH_THRESHOLD, block: int = 2048) -> np.ndarray:
+    """
+    Cluster label per row: faces are joined (transitively, via union-find)
+    when their similarity is at least `threshold`. Blocked brute force, so
+    memory stays at block * n scores; O(n^2) time.
+    """
+    vectors = normalize(vectors)
+    parent = np.arange(len(vectors))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for start in range(0, len(vectors), block):
+        scores = vectors[start:start + block] @ vectors[start:].T
+        rows, cols = np.nonzero(np.triu(scores >= threshold, k=1))
+        for a, b in zip(rows + start, cols + start):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+    return np.array([find(i) for i in range(len(vectors))])
@@ -0,0 +1,269 @@
+"""
+Streaming upload ingestion.
+
+An upload is read from Starlette's spool once, INGEST_CHUNK_KB at a time.
+That one pass writes a staging file, computes the SHA-256, counts the bytes
+against the per-file (MAX_UPLOAD_MB) and per-request (MAX_UPLOAD_REQUEST_MB)
+limits, and sniffs the real MIME type from the magic number. The result is
+an IngestedFile whose bytes stay in memory (bounded by the per-file limit).
+Metadata, vision classification, receipt analysis and face embedding all
+read from it, so nothing re-opens the file on disk. The staging file is then
+handed to storage under its content-addressed key (or discarded, for vault
+uploads, which are encrypted from memory).
+
+Stages that need pixels share one decode through IngestedFile.image, an
+IngestContext: see its docstring.
+"""
+import io
+import os
+import uuid
+import hashlib
+import threading
+from dataclasses import dataclass, replace
+from functools import cached_property
+import numpy as np
+from PIL import Image, ImageOps
+from .storage import storage, content_key
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", 50)) * 1024 * 1024)
+MAX_REQUEST_BYTES = int(float(os.getenv("MAX_UPLOAD_REQUEST_MB", 500)) * 1024 * 1024)
+INGEST_CHUNK_BYTES = int(os.getenv("INGEST_CHUNK_KB", 1024)) * 1024
+# Outside the storage root, which is served publicly, and ideally on the same
+# filesystem so storing a file is a rename
+INGEST_TMP_DIR = os.getenv("INGEST_TMP_DIR", "ingest_tmp")
+os.makedirs(INGEST_TMP_DIR, exist_ok=True)
+
+# One decoded image holds at most INGEST_MAX_PIXELS * 3 bytes (default 16 MP, 48 MB);
+# bigger images are decoded at reduced scale
+MAX_DECODE_PIXELS = int(os.getenv("INGEST_MAX_PIXELS", 16_000_000))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", 320))
+
+_MAGIC = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+    (b"%PDF-", "application/pdf"),
+]
+_FTYP_BRANDS = {b"heic": "image/heic", b"heix": "image/heic", b"mif1": "image/heif", b"avif": "image/avif"}
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit: int, what: str = "File"):
+        super().__init__(f"{what} exceeds the {limit / (1024 * 1024):g} MB upload limit")
+        self.limit = limit
+
+
+def sniff_mime(head: bytes) -> str | None:
+    """MIME type from the first 16 bytes of a file, or None if unrecognised."""
+    for magic, mime in _MAGIC:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(head[8:12])
+    return None
+
+
+class RequestBudget:
+    """Bytes left for one request's files; shared by files ingested concurrently."""
+
+    def __init__(self, limit: int = MAX_REQUEST_BYTES):
+        self.limit = limit
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def charge(self, size: int):
+        with self.lock:
+            self.used += size
+            if self.used > self.limit:
+                raise UploadTooLarge(self.limit, "Upload")
+
+
+class IngestContext:
+    """
+    A single decode of an ingested image, shared by every stage that needs
+    pixels (vision classification, face embedding, CLIP, thumbnails).
+
+    The image is decoded on first use, with EXIF orientation applied, into a
+    read-only RGB array of at most `max_pixels` pixels. JPEGs over the budget
+    are DCT-scaled while decoding, so the full-size bitmap is never built.
+    Stages ask for a view no larger than they need; each size is resized
+    once from that array and cached.
+    """
+
+    def __init__(self, ingested: "IngestedFile", max_pixels: int = MAX_DECODE_PIXELS):
+        self.ingested = ingested
+        self.max_pixels = max_pixels
+        self._array = None
+        self._views = {}
+        self.lock = threading.Lock()
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._array is None:
+            with self.lock:
+                if self._array is None:
+                    self._array = self._decode()
+        return self._array
+
+    def _decode(self) -> np.ndarray:
+        with Image.open(self.ingested.stream()) as img:
+            width, height = img.size
+            if width * height > self.max_pixels:
+                scale = (self.max_pixels / (width * height)) ** 0.5
+                img.draft("RGB", (int(width * scale), int(height * scale)))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+        if img.width * img.height > self.max_pixels:
+            scale = (self.max_pixels / (img.width * img.height)) ** 0.5
+            img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.Resampling.BILINEAR)
+        array = np.asarray(img)
+        array.setflags(write=False)
+        return array
+
+    def view(self, max_side: int) -> np.ndarray:
+        """RGB array with its longer side at most max_side (the shared array itself if it fits)."""
+        array = self.array
+        if max(array.shape[:2]) <= max_side:
+            return array
+        with self.lock:
+            view = self._views.get(max_side)
+            if view is None:
+                img = Image.fromarray(array)
+                img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+                view = self._views[max_side] = np.asarray(img)
+                view.setflags(write=False)
+        return view
+
+    def bgr(self, max_side: int) -> np.ndarray:
+        """Contiguous BGR copy of a view, the layout OpenCV / DeepFace expect."""
+        return np.ascontiguousarray(self.view(max_side)[:, :, ::-1])
+
+    def pil(self, max_side: int) -> Image.Image:
+        return Image.fromarray(self.view(max_side))
+
+    def jpeg(self, max_side: int, quality: int = 85) -> bytes:
+        buffer = io.BytesIO()
+        self.pil(max_side).save(buffer, "JPEG", quality=quality)
+        return buffer.getvalue()
+
+    def store_thumbnail(self, size: int = THUMBNAIL_SIZE, overwrite: bool = False) -> tuple[str, bool]:
+        """Store the JPEG thumbnail under its content key; returns (key, created)."""
+        key = content_key("thumbnails", self.ingested.sha256, "jpg")
+        if not overwrite and storage.exists(key):
+            return key, False
+        storage.put_bytes(key, self.jpeg(size, quality=80))
+        return key, True
+
+
+@dataclass
+class IngestedFile:
+    filename: str
+    path: str | None     # staging file until store() / discard(); None for stored files
+    data: bytes
+    size_bytes: int
+    sha256: str
+    mime_type: str | None
+    key: str | None = None  # storage key once stored
+
+    def stream(self) -> io.BytesIO:
+        return io.BytesIO(self.data)
+
+    @cached_property
+    def image(self) -> IngestContext:
+        return IngestContext(self)
+
+    def store(self, kind: str) -> bool:
+        """
+        Store the file under its content key ("photos", "receipts", ...) and
+        set `key`. Returns False if identical content was already stored,
+        in which case the staged copy is simply dropped; keep detached() and
+        call restore() once the row is inserted.
+        """
+        ext = self.filename.rsplit(".", 1)[-1] if "." in self.filename else ""
+        self.key = content_key(kind, self.sha256, ext)
+        if storage.exists(self.key):
+            os.remove(self.path)
+            return False
+        storage.put_file(self.key, self.path)
+        return True
+
+    def detached(self) -> "IngestedFile":
+        """A copy without the cached decode, to keep for restore() until the row is written."""
+        return replace(self, path=None)
+
+    def restore(self, thumbnail_key: str = None):
+        """
+        Put the stored file (and thumbnail) back if a concurrent delete of
+        the same content removed them after store() found them present. Call
+        inside the transaction that inserts the row, after the insert (see
+        storage.release_photo_files()).
+        """
+        if not storage.exists(self.key):
+            storage.put_bytes(self.key, self.data)
+        if thumbnail_key and not storage.exists(thumbnail_key):
+            self.image.store_thumbnail(overwrite=True)
+
+    def discard(self):
+        """Remove the staging file, if it was not stored."""
+        if self.key is None and self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def load_stored(key: str, filename: str) -> IngestedFile:
+    """An already stored file, read into memory the same way (for backfills; blocking)."""
+    with storage.open(key) as f:
+        data = f.read()
+    return IngestedFile(
+        filename=filename,
+        path=None,
+        data=data,
+        size_bytes=len(data),
+        sha256=hashlib.sha256(data).hexdigest(),
+        mime_type=sniff_mime(data[:16]),
+        key=key,
+    )
+
+
+def ingest_upload(src, filename: str, budget: RequestBudget = None, size: int = None,
+                  max_bytes: int = MAX_UPLOAD_BYTES) -> IngestedFile:
+    """
+    Copy the binary stream `src` into a staging file in one chunked pass
+    (blocking; run in a thread). `size` is the declared size, if known
+    (UploadFile.size, a ZIP member's file_size), checked before anything is
+    copied. Raises UploadTooLarge as soon as a limit is crossed; the staging
+    file is removed on any error.
+    """
+    if size is not None and size > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    staging_path = os.path.join(INGEST_TMP_DIR, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    try:
+        with open(staging_path, "wb") as out:
+            while chunk := src.read(INGEST_CHUNK_BYTES):
+                if len(buffer) + len(chunk) > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                if budget is not None:
+                    budget.charge(len(chunk))
+                digest.update(chunk)
+                buffer += chunk
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+
+    return IngestedFile(
+        filename=filename,
+        path=staging_path,
+        data=bytes(buffer),
+        size_bytes=len(buffer),
+        sha256=digest.hexdigest(),
+        mime_type=sniff_mime(bytes(buffer[:16])),
+    )
@@ -0,0 +1,19 @@
+"""
+Sampled logging for per-request and per-upload lines.
+
+At LOG_LEVEL=DEBUG every line is logged; at INFO only a REQUEST_LOG_SAMPLE
+fraction of them is, so routine traffic does not flood the log. Errors and
+slow paths should use logger.warning / logger.exception directly instead.
+"""
+import os
+import random
+import logging
+
+LOG_SAMPLE = float(os.getenv("REQUEST_LOG_SAMPLE", 0.01))
+
+
+def log_sampled(logger: logging.Logger, message: str, *args):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, *args)
+    elif logger.isEnabledFor(logging.INFO) and random.random() < LOG_SAMPLE:
+        logger.info(message, *args)
@@ -1,15 +1,69 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
-from .routers import auth, photos, receipts, chat, vault, stats, people, auth_google
+from .database import engine, Base, IN_MEMORY
+from .routers import auth, photos, receipts, chat, vault, stats, people, auth_google, search
+from .ai_services.face_recognition import FaceRecognitionService
+from .ai_services.image_embeddings import ImageEmbedder
+from . import metrics
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, JSONResponse, RedirectResponse
+from .ingest_utils import MAX_REQUEST_BYTES
+from .storage import storage, IS_LOCAL, STORAGE_ROOT, STATIC_PREFIX
+from .vault_crypto import master_key_problem
+from .log_utils import log_sampled
+from contextlib import asynccontextmanager
+import logging
+import threading
+import time
 import uvicorn
 import os
 
-# Create tables on startup
-Base.metadata.create_all(bind=engine)
+# LOG_LEVEL=DEBUG logs every request; at INFO only a REQUEST_LOG_SAMPLE fraction
+# of ordinary requests is logged, plus every slow or failed one
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger("personalens.requests")
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_MS", 1000)) / 1000
+
+# Schema changes are an explicit step (python backend/create_schema.py); creating
+# tables here costs a round-trip per table on every start and reload. An in-memory
+# database (DB_PROFILE=memory) starts empty, so it always gets its tables here.
+if IN_MEMORY or os.getenv("AUTO_CREATE_SCHEMA", "0").lower() in ("1", "true", "yes"):
+    Base.metadata.create_all(bind=engine)
+
+# AI backends (DeepFace/TensorFlow, CLIP) load on first use. With AI_WARMUP=1 they
+# load in a background thread right after startup instead, so the server answers
+# immediately and the first upload does not wait for the models.
+AI_WARMUP = os.getenv("AI_WARMUP", "0").lower() in ("1", "true", "yes")
+
+def warmup_ai_backends():
+    FaceRecognitionService.warmup()
+    ImageEmbedder.get_model()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    vault_problem = master_key_problem()
+    if vault_problem:
+        logging.getLogger(__name__).error("%s: vault uploads, downloads and auto-vaulting are disabled", vault_problem)
+    if AI_WARMUP:
+        threading.Thread(target=warmup_ai_backends, name="ai-warmup", daemon=True).start()
+    yield
 
-app = FastAPI(title="PersonaLens API")
+app = FastAPI(title="PersonaLens API", lifespan=lifespan)
+
+# Registered before CORSMiddleware so the 413 still carries CORS headers. Requests
+# over MAX_UPLOAD_REQUEST_MB are refused from the Content-Length header, before
+# Starlette spools the body; chunked uploads are counted during ingest instead.
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    length = request.headers.get("content-length", "")
+    if request.method in ("POST", "PUT") and length.isdigit() and int(length) > MAX_REQUEST_BYTES:
+        return JSONResponse(status_code=413, content={
+            "detail": f"Upload exceeds the {MAX_REQUEST_BYTES / (1024 * 1024):g} MB request limit"
+        })
+    return await call_next(request)
 
 # CORS setup
 # CORS setup - Explicitly allowing frontend origins
@@ -27,11 +81,28 @@ app.add_middleware(
 )
 
 @app.middleware("http")
-async def log_requests(request, call_next):
-    print(f"DEBUG: Incoming request: {request.method} {request.url}")
-    print(f"DEBUG: Origin header: {request.headers.get('origin')}")
-    response = await call_next(request)
-    return response
+async def instrument_requests(request, call_next):
+    stats = metrics.begin_request()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        # Label by route template, not raw path, so /photos/1 and /photos/2 share a series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_LATENCY.observe(elapsed, method=request.method, route=route, status=status_code)
+        metrics.HTTP_DB_QUERIES.observe(stats.db_queries, route=route)
+        metrics.HTTP_DB_SECONDS.observe(stats.db_seconds, route=route)
+
+        message = "%s %s -> %s in %.1f ms (%d queries, %.1f ms db)"
+        args = (request.method, request.url.path, status_code, elapsed * 1000, stats.db_queries, stats.db_seconds * 1000)
+        if status_code >= 500 or elapsed >= SLOW_REQUEST_SECONDS:
+            logger.warning(message, *args)
+        else:
+            log_sampled(logger, message, *args)
 
 from fastapi import HTTPException as FastAPIHTTPException
 from fastapi.responses import JSONResponse
@@ -52,9 +123,7 @@ async def global_exception_handler(request, exc):
     """Catch unexpected errors only (not HTTPException)."""
     if isinstance(exc, FastAPIHTTPException):
         return await custom_http_exception_handler(request, exc)
-    print(f"CRITICAL ERROR: {exc}")
-    import traceback
-    traceback.print_exc()
+    logger.error("Unhandled error on %s %s", request.method, request.url.path, exc_info=exc)
     origin = request.headers.get("origin", "")
     response = JSONResponse(
         status_code=500,
@@ -73,10 +142,21 @@ app.include_router(vault.router)
 app.include_router(people.router)
 app.include_router(stats.router)
 app.include_router(auth_google.router)
+app.include_router(search.router)
 
-# Mount uploads directory to serve images
+# Serve stored files. Local storage is mounted directly; with remote storage the
+# same URLs redirect to the bucket (public or presigned link)
 # WARNING: In production, use Nginx/S3/CDN and ensure sensitive files are NOT public
-app.mount("/static/uploads", StaticFiles(directory="uploads"), name="static_uploads")
+if IS_LOCAL:
+    app.mount(STATIC_PREFIX, StaticFiles(directory=STORAGE_ROOT), name="static_uploads")
+else:
+    @app.get(STATIC_PREFIX + "/{key:path}", include_in_schema=False)
+    def read_stored_file(key: str):
+        return RedirectResponse(storage.url(key))
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,94 @@
+"""
+Header-only media metadata extraction.
+
+`Image.open` only parses the file header (and, for JPEG, the APP1/EXIF
+segment) — pixel data is never decoded here, so this is cheap enough to run
+on every upload and in bulk backfills.
+"""
+import os
+import mimetypes
+from datetime import datetime
+from PIL import Image, UnidentifiedImageError
+
+# EXIF tag ids
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+IFD_EXIF = 0x8769
+IFD_GPS = 0x8825
+
+METADATA_FIELDS = [
+    "size_bytes", "width", "height", "mime_type",
+    "taken_at", "camera_make", "camera_model", "gps_lat", "gps_lon",
+]
+
+
+def _parse_exif_datetime(value) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def _gps_to_degrees(dms, ref) -> float | None:
+    try:
+        degrees = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        return None
+    if ref in ("S", "W"):
+        degrees = -degrees
+    return round(degrees, 6)
+
+
+def _clean(value, max_len: int = 100) -> str | None:
+    if not value:
+        return None
+    return str(value).strip("\x00 ")[:max_len] or None
+
+
+def extract_media_metadata(source, filename: str = None) -> dict:
+    """
+    Return byte size, dimensions, MIME type and EXIF capture time / camera / GPS
+    for `source` (a path or a seekable binary file object). Missing values are None.
+    """
+    meta = dict.fromkeys(METADATA_FIELDS)
+
+    if isinstance(source, (str, os.PathLike)):
+        meta["size_bytes"] = os.path.getsize(source)
+        filename = filename or os.fspath(source)
+    else:
+        pos = source.tell()
+        source.seek(0, os.SEEK_END)
+        meta["size_bytes"] = source.tell()
+        source.seek(pos)
+
+    try:
+        with Image.open(source) as img:
+            meta["width"], meta["height"] = img.size
+            meta["mime_type"] = Image.MIME.get(img.format)
+
+            exif = img.getexif()
+            if exif:
+                exif_ifd = exif.get_ifd(IFD_EXIF)
+                meta["taken_at"] = (_parse_exif_datetime(exif_ifd.get(TAG_DATETIME_ORIGINAL))
+                                    or _parse_exif_datetime(exif.get(TAG_DATETIME)))
+                meta["camera_make"] = _clean(exif.get(TAG_MAKE))
+                meta["camera_model"] = _clean(exif.get(TAG_MODEL))
+
+                gps = exif.get_ifd(IFD_GPS)
+                if gps and 2 in gps and 4 in gps:
+                    meta["gps_lat"] = _gps_to_degrees(gps[2], gps.get(1))
+                    meta["gps_lon"] = _gps_to_degrees(gps[4], gps.get(3))
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        # Not an image (PDF, etc.) or a truncated header — keep what we have
+        pass
+    finally:
+        if not isinstance(source, (str, os.PathLike)):
+            source.seek(0)
+
+    if not meta["mime_type"] and filename:
+        meta["mime_type"] = mimetypes.guess_type(filename)[0]
+    return meta
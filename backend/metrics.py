@@ -0,0 +1,200 @@
+"""
+In-process request, database and external-call metrics, served in the
+Prometheus text format at /metrics.
+
+- http_request_duration_seconds{method,route,status}: per-route latency
+  (route is the path template, e.g. /photos/{photo_id}).
+- http_request_db_queries / http_request_db_seconds{route}: how many
+  statements one request ran and how long they took in total. The counts are
+  collected by SQLAlchemy cursor events into a per-request RequestStats
+  held in a context variable (FastAPI's threadpool copies the context, so
+  sync endpoints and dependencies report into the same object).
+- db_query_duration_seconds{operation}: every statement, by SQL verb.
+- external_call_duration_seconds{service,operation,outcome}: Groq, DeepFace
+  and CLIP calls, via track_external().
+- upload_stage_duration_seconds{stage}: the upload pipeline, via
+  upload_stage().
+- db_pool_checkout_wait_seconds and db_pool_connections{state}: time spent
+  waiting for a pooled connection, and pool occupancy at scrape time.
+
+Metrics are per process; with several workers, scrape each one (or put
+them behind a single-worker sidecar).
+"""
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a fixed tuple of label names."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {k: list(v) for k, v in self.series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = _format_labels(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Value read at scrape time from `read()`, which returns a number or {label value: number}."""
+
+    def __init__(self, name: str, documentation: str, read, label: str = None):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.label = label
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.read()
+        except Exception:
+            return lines
+        if not isinstance(values, dict):
+            values = {None: values}
+        for key, value in sorted(values.items(), key=lambda kv: str(kv[0])):
+            labels = _format_labels((self.label,), (key,)) if self.label else ""
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"))
+HTTP_DB_QUERIES = Histogram("http_request_db_queries", "SQL statements executed per request.", ("route",), COUNT_BUCKETS)
+HTTP_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in SQL per request.", ("route",))
+DB_QUERY = Histogram("db_query_duration_seconds", "SQL statement latency by verb.", ("operation",))
+EXTERNAL_CALL = Histogram("external_call_duration_seconds", "Latency of calls to AI backends.",
+                          ("service", "operation", "outcome"))
+UPLOAD_STAGE = Histogram("upload_stage_duration_seconds", "Time per stage of the photo upload pipeline.", ("stage",))
+POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time to obtain a connection from the pool.",
+                               ("pool",), (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ─── Per-request accounting ───────────────────────────────────────────────────
+class RequestStats:
+    __slots__ = ("db_queries", "db_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def begin_request() -> RequestStats:
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def current_request() -> RequestStats | None:
+    return _request_stats.get()
+
+
+# ─── SQLAlchemy hooks ─────────────────────────────────────────────────────────
+_SQL_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH"}
+
+
+def instrument_engine(engine):
+    """Time every statement on `engine` and charge it to the current request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        elapsed = time.perf_counter() - started
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        DB_QUERY.observe(elapsed, operation=verb if verb in _SQL_VERBS else "OTHER")
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # after_cursor_execute does not fire for failed statements
+        stack = context.connection.info.get("query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+# ─── Timers ───────────────────────────────────────────────────────────────────
+@contextmanager
+def track_external(service: str, operation: str):
+    """Time a call to an external/AI backend; outcome is "error" if the block raises."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        EXTERNAL_CALL.observe(time.perf_counter() - started, service=service, operation=operation, outcome=outcome)
+
+
+@contextmanager
+def upload_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        UPLOAD_STAGE.observe(time.perf_counter() - started, stage=stage)
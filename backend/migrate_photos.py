@@ -2,14 +2,33 @@
 Migration: Add missing columns to photos table
 - category VARCHAR(50) DEFAULT 'General'
 - is_sensitive BOOLEAN DEFAULT FALSE
+- media metadata (size, dimensions, MIME, EXIF capture time/camera/GPS),
+  backfilled from the file headers of existing photos
 """
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.database import engine
+from backend.database import engine, SessionLocal
 from sqlalchemy import text
 
+MEDIA_COLUMNS = [
+    ("photos", "size_bytes", "BIGINT NULL"),
+    ("photos", "width", "INT NULL"),
+    ("photos", "height", "INT NULL"),
+    ("photos", "mime_type", "VARCHAR(100) NULL"),
+    ("photos", "taken_at", "DATETIME NULL"),
+    ("photos", "camera_make", "VARCHAR(100) NULL"),
+    ("photos", "camera_model", "VARCHAR(100) NULL"),
+    ("photos", "gps_lat", "DOUBLE NULL"),
+    ("photos", "gps_lon", "DOUBLE NULL"),
+    ("photos", "description", "TEXT NULL"),
+    ("photos", "doc_type", "VARCHAR(50) NULL"),
+    ("photos", "thumbnail_path", "VARCHAR(512) NULL"),
+    ("vault", "size_bytes", "BIGINT NULL"),
+    ("vault", "mime_type", "VARCHAR(100) NULL"),
+]
+
 def column_exists(conn, table, column):
     result = conn.execute(text(
         f"SELECT COUNT(*) FROM information_schema.columns "
@@ -17,6 +36,13 @@ def column_exists(conn, table, column):
     ), {"table": table, "column": column})
     return result.scalar() > 0
 
+def index_exists(conn, table, index):
+    result = conn.execute(text(
+        f"SELECT COUNT(*) FROM information_schema.statistics "
+        f"WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index"
+    ), {"table": table, "index": index})
+    return result.scalar() > 0
+
 def run_migration():
     with engine.connect() as conn:
         # Add 'category' column if missing
@@ -52,7 +78,71 @@ def run_migration():
         else:
             print("  ✓ 'vector_embedding' column already exists, skipping.")
 
+        for table, column, ddl in MEDIA_COLUMNS:
+            if not column_exists(conn, table, column):
+                print(f"Adding '{column}' column to {table} table...")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                conn.commit()
+                print(f"  ✓ '{column}' column added.")
+            else:
+                print(f"  ✓ '{column}' column already exists, skipping.")
+
+        if not index_exists(conn, "photos", "ix_photos_user_taken_at"):
+            print("Adding (user_id, taken_at) index to photos table...")
+            conn.execute(text("CREATE INDEX ix_photos_user_taken_at ON photos (user_id, taken_at)"))
+            conn.commit()
+            print("  ✓ index added.")
+
+        # Content-addressed storage: deletes check whether another row still uses a file
+        if not index_exists(conn, "photos", "ix_photos_path"):
+            print("Adding path index to photos table...")
+            conn.execute(text("CREATE INDEX ix_photos_path ON photos (path)"))
+            conn.commit()
+            print("  ✓ index added.")
+        # Thumbnails are shared by every extension of the same content
+        if not index_exists(conn, "photos", "ix_photos_thumbnail_path"):
+            print("Adding thumbnail path index to photos table...")
+            conn.execute(text("CREATE INDEX ix_photos_thumbnail_path ON photos (thumbnail_path)"))
+            conn.commit()
+            print("  ✓ index added.")
+
+    backfill_media_metadata()
     print("\nMigration complete!")
 
+def backfill_media_metadata():
+    """Fill media metadata for rows ingested before it was recorded (header reads only)."""
+    from backend.models.photo import Photo
+    from backend.models.vault import VaultFile
+    from backend.media_utils import extract_media_metadata
+    from backend.storage import storage
+
+    db = SessionLocal()
+    try:
+        photos = db.query(Photo).filter(Photo.size_bytes.is_(None)).all()
+        for photo in photos:
+            if not storage.exists(photo.path):
+                continue
+            with storage.open(photo.path) as f:
+                for field, value in extract_media_metadata(f, photo.filename).items():
+                    setattr(photo, field, value)
+
+        # Photos without EXIF sit on the timeline at their upload time
+        db.query(Photo).filter(Photo.taken_at.is_(None)).update(
+            {Photo.taken_at: Photo.created_at}, synchronize_session=False
+        )
+
+        vault_files = db.query(VaultFile).filter(VaultFile.size_bytes.is_(None)).all()
+        for vf in vault_files:
+            if storage.exists(vf.encrypted_path):
+                with storage.open(vf.encrypted_path) as f:
+                    meta = extract_media_metadata(f, vf.original_filename)
+                vf.size_bytes, vf.mime_type = meta["size_bytes"], meta["mime_type"]
+
+        db.commit()
+        print(f"  ✓ Backfilled metadata for {len(photos)} photo(s) and {len(vault_files)} vault file(s).")
+        print("  Run backend/rebuild_stats.py to rebuild counters and timeline buckets.")
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     run_migration()
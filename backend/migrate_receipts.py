@@ -0,0 +1,99 @@
+"""
+Migration: receipt analytics
+- adds receipts.user_id / receipts.created_at, backfilled from the owning photo
+- adds the (user_id, ...) analytics indexes
+- creates and fills the receipt_monthly rollup table
+- adds receipts.merchant_normalized (canonical merchant key, see normalize_utils)
+  and the receipt_items table
+  (receipts saved before this migration have no stored line items)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import engine, SessionLocal, Base
+from backend.migrate_photos import column_exists, index_exists
+from sqlalchemy import text
+
+RECEIPT_INDEXES = {
+    "ix_receipts_user_date": "user_id, date",
+    "ix_receipts_user_category": "user_id, category",
+    "ix_receipts_user_merchant": "user_id, merchant",
+    "ix_receipts_user_created_at": "user_id, created_at",
+    "ix_receipts_user_merchant_normalized": "user_id, merchant_normalized",
+}
+
+def run_migration():
+    from backend.models.receipt_monthly import ReceiptMonthly
+    from backend.models.receipt_item import ReceiptItem
+
+    with engine.connect() as conn:
+        if not column_exists(conn, "receipts", "user_id"):
+            print("Adding 'user_id' column to receipts table...")
+            conn.execute(text("ALTER TABLE receipts ADD COLUMN user_id INT NULL"))
+            conn.commit()
+        if not column_exists(conn, "receipts", "created_at"):
+            print("Adding 'created_at' column to receipts table...")
+            conn.execute(text("ALTER TABLE receipts ADD COLUMN created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP"))
+            conn.commit()
+        if not column_exists(conn, "receipts", "merchant_normalized"):
+            print("Adding 'merchant_normalized' column to receipts table...")
+            conn.execute(text("ALTER TABLE receipts ADD COLUMN merchant_normalized VARCHAR(255) NULL"))
+            conn.commit()
+
+        result = conn.execute(text(
+            "UPDATE receipts r JOIN photos p ON r.photo_id = p.id "
+            "SET r.user_id = p.user_id, r.created_at = p.created_at "
+            "WHERE r.user_id IS NULL"
+        ))
+        conn.commit()
+        print(f"  ✓ Backfilled owner/upload time for {result.rowcount} receipt(s).")
+
+        for name, columns in RECEIPT_INDEXES.items():
+            if not index_exists(conn, "receipts", name):
+                print(f"Adding index {name}...")
+                conn.execute(text(f"CREATE INDEX {name} ON receipts ({columns})"))
+                conn.commit()
+        print("  ✓ Analytics indexes present.")
+
+    Base.metadata.create_all(bind=engine, tables=[ReceiptMonthly.__table__, ReceiptItem.__table__])
+    backfill_merchant_names()
+    rebuild_rollups()
+    print("\nMigration complete!")
+
+def backfill_merchant_names():
+    """Assign canonical merchant keys, oldest receipt first, so the first spelling seen becomes canonical."""
+    from backend.models.receipt import Receipt
+    from backend.models.user import User
+    from backend.normalize_utils import MerchantIndex
+
+    db = SessionLocal()
+    try:
+        updated = 0
+        for (uid,) in db.query(User.id):
+            index = MerchantIndex()
+            for r in db.query(Receipt).filter(Receipt.user_id == uid).order_by(Receipt.id):
+                key, _ = index.resolve(r.merchant or "Unknown", r.category)
+                if r.merchant_normalized != key:
+                    r.merchant_normalized = key
+                    updated += 1
+            db.commit()
+        print(f"  ✓ Canonicalized merchant names for {updated} receipt(s).")
+    finally:
+        db.close()
+
+def rebuild_rollups():
+    from backend.models.user import User
+    from backend.receipt_utils import rebuild_receipt_rollups
+
+    db = SessionLocal()
+    try:
+        user_ids = [uid for (uid,) in db.query(User.id)]
+        for uid in user_ids:
+            rebuild_receipt_rollups(db, uid)
+        print(f"  ✓ Rebuilt monthly receipt rollups for {len(user_ids)} user(s).")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    run_migration()
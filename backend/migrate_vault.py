@@ -0,0 +1,128 @@
+"""
+Migration: real vault encryption
+- adds vault.wrapped_key
+- rewraps file keys that were wrapped under the old JWT SECRET_KEY fallback
+  (or VAULT_LEGACY_MASTER_KEY) with VAULT_MASTER_KEY, which is now required
+- encrypts legacy plaintext vault files (encryption_iv 'mock_iv' / 'auto_vault')
+  with the chunked AES-GCM format from backend/vault_crypto.py (rewritten
+  under a new vault key, the plaintext is then deleted)
+- removes the plaintext photo-side copies that auto-vaulting used to leave in
+  uploads/photos (only where the vaulted copy exists)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import engine, SessionLocal
+from backend.models import user, person, face, photo, receipt, vault  # register every mapper
+from backend.migrate_photos import column_exists
+from sqlalchemy import text
+
+def run_migration():
+    from backend.vault_crypto import master_key_problem
+    problem = master_key_problem()
+    if problem:
+        print(f"  ! {problem}; set a separate random VAULT_MASTER_KEY and run this again.")
+        return
+
+    with engine.connect() as conn:
+        if not column_exists(conn, "vault", "wrapped_key"):
+            print("Adding 'wrapped_key' column to vault table...")
+            conn.execute(text("ALTER TABLE vault ADD COLUMN wrapped_key VARCHAR(255) NULL"))
+            conn.commit()
+            print("  ✓ 'wrapped_key' column added.")
+        else:
+            print("  ✓ 'wrapped_key' column already exists, skipping.")
+
+    rewrap_legacy_keys()
+    encrypt_legacy_files()
+    purge_sensitive_photo_copies()
+    print("\nMigration complete!")
+
+def rewrap_legacy_keys():
+    from backend.models.vault import VaultFile
+    from backend.auth_utils import SECRET_KEY
+    from backend.vault_crypto import unwrap_key, wrap_key, VaultDecryptionError
+
+    legacy_master = (os.getenv("VAULT_LEGACY_MASTER_KEY") or SECRET_KEY).encode("utf-8")
+    db = SessionLocal()
+    try:
+        rewrapped = 0
+        for vf in db.query(VaultFile).filter(VaultFile.wrapped_key.isnot(None)).all():
+            try:
+                unwrap_key(vf.wrapped_key, vf.user_id)
+                continue  # already under VAULT_MASTER_KEY
+            except VaultDecryptionError:
+                pass
+            try:
+                file_key = unwrap_key(vf.wrapped_key, vf.user_id, legacy_master)
+            except VaultDecryptionError:
+                print(f"  ! Vault #{vf.id} opens with neither VAULT_MASTER_KEY nor the legacy key, leaving it")
+                continue
+            vf.wrapped_key = wrap_key(file_key, vf.user_id)
+            rewrapped += 1
+        db.commit()
+        print(f"  ✓ Rewrapped {rewrapped} vault file key(s) under VAULT_MASTER_KEY.")
+    finally:
+        db.close()
+
+def encrypt_legacy_files():
+    from backend.models.vault import VaultFile
+    from backend.vault_crypto import encrypt_stream
+    from backend.storage import storage, vault_key
+
+    db = SessionLocal()
+    try:
+        legacy = db.query(VaultFile).filter(VaultFile.wrapped_key.is_(None)).all()
+        done = 0
+        for vf in legacy:
+            if not storage.exists(vf.encrypted_path):
+                print(f"  ! Missing file for vault #{vf.id}: {vf.encrypted_path}")
+                continue
+            plaintext_key, key = vf.encrypted_path, vault_key()
+            with storage.open(plaintext_key) as src, storage.writer(key) as dst:
+                info = encrypt_stream(src, dst, vf.user_id)
+            vf.encrypted_path = key
+            vf.encryption_iv = info["nonce_prefix"]
+            vf.wrapped_key = info["wrapped_key"]
+            vf.size_bytes = info["size_bytes"]
+            db.commit()
+            storage.delete(plaintext_key)
+            done += 1
+        print(f"  ✓ Encrypted {done} legacy vault file(s).")
+    finally:
+        db.close()
+
+def purge_sensitive_photo_copies():
+    from backend.models.photo import Photo
+    from backend.models.vault import VaultFile
+    from backend.stats_utils import record_photo_removed
+    from backend.timeline_utils import record_timeline_removed
+    from backend.storage import release_photo_files
+
+    db = SessionLocal()
+    try:
+        purged = 0
+        for photo in db.query(Photo).filter(Photo.is_sensitive == True).all():
+            vaulted = db.query(VaultFile.id).filter(
+                VaultFile.user_id == photo.user_id,
+                VaultFile.original_filename == photo.filename,
+                VaultFile.wrapped_key.isnot(None)
+            ).first()
+            if not vaulted:
+                print(f"  ! Sensitive photo #{photo.id} has no vaulted copy, leaving it in place")
+                continue
+            files = [(photo.path, photo.thumbnail_path)]
+            record_photo_removed(db, photo.user_id, photo.category, photo.size_bytes or 0,
+                                 was_tagged=any(f.person_id for f in photo.faces))
+            record_timeline_removed(db, photo.user_id, photo.taken_at)
+            db.delete(photo)
+            release_photo_files(db, files)
+            db.commit()
+            purged += 1
+        print(f"  ✓ Removed {purged} plaintext copy(ies) of vaulted documents.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    run_migration()
@@ -1,18 +1,38 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Boolean, Text, JSON, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..database import Base
 
 class Photo(Base):
     __tablename__ = "photos"
+    __table_args__ = (
+        Index("ix_photos_user_taken_at", "user_id", "taken_at"),
+        Index("ix_photos_path", "path"),
+        Index("ix_photos_thumbnail_path", "thumbnail_path"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     path = Column(String(512), nullable=False)
+    thumbnail_path = Column(String(512), nullable=True) # storage key of the JPEG made at ingest
     filename = Column(String(255), nullable=False)
     vector_embedding = Column(JSON, nullable=True) # For face recognition/semantic search
     category = Column(String(50), default="General") # e.g. Receipt, Person, Nature, Note
     is_sensitive = Column(Boolean, default=False)
+    description = Column(Text, nullable=True) # One-line vision-model description (search)
+    doc_type = Column(String(50), nullable=True) # e.g. selfie, receipt, invoice, note
+
+    # Extracted from the file header at ingest (backend/media_utils.py)
+    size_bytes = Column(BigInteger, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    mime_type = Column(String(100), nullable=True)
+    taken_at = Column(DateTime, nullable=True) # EXIF DateTimeOriginal, or upload time if the file has none
+    camera_make = Column(String(100), nullable=True)
+    camera_model = Column(String(100), nullable=True)
+    gps_lat = Column(Float, nullable=True)
+    gps_lon = Column(Float, nullable=True)
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User")
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from ..database import Base
+
+class PhotoTimelineBucket(Base):
+    """Per-day photo counts by capture time, maintained on ingest/delete (backend/timeline_utils.py)."""
+    __tablename__ = "photo_timeline"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    month = Column(Integer, primary_key=True, autoincrement=False)
+    day = Column(Integer, primary_key=True, autoincrement=False)
+    photo_count = Column(Integer, nullable=False, default=0)
@@ -1,16 +1,28 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Date, Index
+from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..database import Base
 
 class Receipt(Base):
     __tablename__ = "receipts"
+    __table_args__ = (
+        # Analytics filter by owner first, then group/range on one of these
+        Index("ix_receipts_user_date", "user_id", "date"),
+        Index("ix_receipts_user_category", "user_id", "category"),
+        Index("ix_receipts_user_merchant", "user_id", "merchant"),
+        Index("ix_receipts_user_merchant_normalized", "user_id", "merchant_normalized"),
+        Index("ix_receipts_user_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     photo_id = Column(Integer, ForeignKey("photos.id"), unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True) # Denormalized from photos.user_id
     merchant = Column(String(255), nullable=True)
+    merchant_normalized = Column(String(255), nullable=True)
     date = Column(Date, nullable=True)
     amount = Column(Float, nullable=True)
     tax = Column(Float, nullable=True)
     category = Column(String(100), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     photo = relationship("Photo", back_populates="receipt")
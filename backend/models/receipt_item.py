@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Index
+from ..database import Base
+
+class ReceiptItem(Base):
+    __tablename__ = "receipt_items"
+    __table_args__ = (
+        Index("ix_receipt_items_user_name_date", "user_id", "normalized_name", "purchased_on"),
+        Index("ix_receipt_items_user_date", "user_id", "purchased_on"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    receipt_id = Column(Integer, ForeignKey("receipts.id"), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String(255), nullable=False) # As printed on the receipt
+    normalized_name = Column(String(255), nullable=False) # Lowercased, punctuation-free key for grouping
+    price = Column(Float, nullable=False, default=0.0)
+    purchased_on = Column(Date, nullable=True) # Receipt date, else upload date
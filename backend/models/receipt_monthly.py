@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from ..database import Base
+
+class ReceiptMonthly(Base):
+    """Materialized monthly spend per category, maintained on receipt insert/delete (backend/receipt_utils.py)."""
+    __tablename__ = "receipt_monthly"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    month = Column(Integer, primary_key=True, autoincrement=False)
+    category = Column(String(100), primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    tax = Column(Float, nullable=False, default=0.0)
+    receipt_count = Column(Integer, nullable=False, default=0)
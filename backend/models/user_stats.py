@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, BigInteger, Float, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from ..database import Base
+
+class UserStats(Base):
+    """
+    Per-user dashboard counters, maintained incrementally by the upload,
+    delete, vault, receipt and people paths (see backend/stats_utils.py).
+    Rebuild with `python backend/rebuild_stats.py` if they ever drift.
+    """
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+
+    photo_count = Column(Integer, nullable=False, default=0)
+    vault_count = Column(Integer, nullable=False, default=0)
+    receipt_count = Column(Integer, nullable=False, default=0)
+    people_count = Column(Integer, nullable=False, default=0)
+    tagged_photo_count = Column(Integer, nullable=False, default=0)
+
+    # Bytes on disk
+    photo_bytes = Column(BigInteger, nullable=False, default=0)
+    vault_bytes = Column(BigInteger, nullable=False, default=0)
+    person_bytes = Column(BigInteger, nullable=False, default=0)
+    receipt_bytes = Column(BigInteger, nullable=False, default=0)
+    document_bytes = Column(BigInteger, nullable=False, default=0)
+    note_bytes = Column(BigInteger, nullable=False, default=0)
+    general_bytes = Column(BigInteger, nullable=False, default=0)
+
+    # Receipt totals
+    receipt_total = Column(Float, nullable=False, default=0.0)
+    receipt_tax_total = Column(Float, nullable=False, default=0.0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, LargeBinary, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, LargeBinary, DateTime, func
 from ..database import Base
 
 class VaultFile(Base):
@@ -8,8 +8,11 @@ class VaultFile(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     original_filename = Column(String(255), nullable=False)
     encrypted_path = Column(String(512), nullable=False)
-    encryption_iv = Column(String(255), nullable=False) # Hex string or similar
+    encryption_iv = Column(String(255), nullable=False) # Hex nonce prefix (see backend/vault_crypto.py)
+    wrapped_key = Column(String(255), nullable=True) # Per-file key wrapped by the user key; NULL = legacy plaintext
+    size_bytes = Column(BigInteger, nullable=True) # Original (plaintext) size
+    mime_type = Column(String(100), nullable=True)
     created_at = Column(DateTime, server_default=func.now())
     
     # We might store a hint or check-hash to verify password correctness without storing the password
-    # For now, relying on successful decryption as proof
+    # For now, relying on successful decryption (GCM authentication) as proof
@@ -0,0 +1,276 @@
+"""
+Normalization of vision-extracted receipt fields before they are stored.
+
+- Amounts: currency symbols/codes stripped; "1,234.50", "1.234,50",
+  "1,23,456" and "(12.00)" all parse.
+- Dates: ISO first, then numeric dates in RECEIPT_DATE_ORDER (DMY by default,
+  falling back to MDY when the day-first reading is impossible), then
+  month-name formats.
+- Categories: mapped onto the fixed RECEIPT_PROMPT set via synonyms.
+- Merchants: "DMart", "D-Mart" and "DMART Ltd" resolve to one canonical key
+  (stored in receipts.merchant_normalized) through a per-user index of known
+  merchants matched by character-trigram / token similarity. Indexes are
+  built lazily from `receipts` and cached in memory (LRU over users), so
+  canonicalization is a dictionary lookup on the write path and GROUP BY
+  merchant needs no cleanup pass.
+"""
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, Counter
+from datetime import date, datetime
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .models.receipt import Receipt
+
+CATEGORIES = ("Food", "Transport", "Shopping", "Utilities", "Health", "Entertainment", "General")
+
+CATEGORY_SYNONYMS = {
+    "food": "Food", "grocery": "Food", "groceries": "Food", "restaurant": "Food", "dining": "Food",
+    "cafe": "Food", "supermarket": "Food", "bakery": "Food",
+    "transport": "Transport", "transportation": "Transport", "travel": "Transport", "fuel": "Transport",
+    "petrol": "Transport", "gas": "Transport", "taxi": "Transport", "parking": "Transport",
+    "shopping": "Shopping", "retail": "Shopping", "clothing": "Shopping", "apparel": "Shopping",
+    "electronics": "Shopping",
+    "utilities": "Utilities", "utility": "Utilities", "electricity": "Utilities", "water": "Utilities",
+    "internet": "Utilities", "phone": "Utilities", "mobile": "Utilities", "bills": "Utilities",
+    "health": "Health", "medical": "Health", "pharmacy": "Health", "hospital": "Health", "healthcare": "Health",
+    "entertainment": "Entertainment", "movies": "Entertainment", "movie": "Entertainment",
+    "cinema": "Entertainment", "games": "Entertainment",
+    "general": "General", "other": "General", "misc": "General", "miscellaneous": "General",
+}
+
+# Legal-form words that never distinguish two merchants
+MERCHANT_STOPWORDS = {"ltd", "limited", "pvt", "private", "inc", "llc", "llp", "co", "corp", "corporation",
+                      "company", "the", "and"}
+
+DATE_ORDER = os.getenv("RECEIPT_DATE_ORDER", "DMY").upper()
+MERCHANT_MATCH_THRESHOLD = float(os.getenv("MERCHANT_MATCH_THRESHOLD", 0.6))
+MERCHANT_CACHE_USERS = int(os.getenv("MERCHANT_CACHE_USERS", 256))
+
+_CURRENCY = re.compile(r"(?i)\b(rs|inr|usd|eur|gbp)\b\.?|[₹$€£¥]")
+
+
+# ─── Names ────────────────────────────────────────────────────────────────────
+def normalize_name(text: str) -> str:
+    """Grouping key for item/merchant names: 'Amul  Milk-500ml.' -> 'amul milk 500ml'."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()[:255]
+
+
+def normalize_category(value) -> str:
+    key = normalize_name(value)
+    if key in CATEGORY_SYNONYMS:
+        return CATEGORY_SYNONYMS[key]
+    for word in key.split():
+        if word in CATEGORY_SYNONYMS:
+            return CATEGORY_SYNONYMS[word]
+    return "General"
+
+
+# ─── Amounts ──────────────────────────────────────────────────────────────────
+def parse_amount(value) -> float:
+    """'₹1,23,456.50', 'Rs. 1.234,50', '(12.00)', 12 -> float; unparseable -> 0.0."""
+    if isinstance(value, bool) or value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = _CURRENCY.sub("", str(value)).strip()
+    negative = text.startswith("-") or (text.startswith("(") and text.endswith(")"))
+    text = re.sub(r"[^0-9.,]", "", text)
+    if not text:
+        return 0.0
+
+    if "," in text and "." in text:
+        # Whichever separator comes last is the decimal point
+        decimal = "," if text.rfind(",") > text.rfind(".") else "."
+        thousands = "." if decimal == "," else ","
+        text = text.replace(thousands, "").replace(decimal, ".")
+    elif "," in text:
+        # "12,50" is a decimal comma; "1,234" and "1,23,456" are grouping
+        head, _, tail = text.rpartition(",")
+        text = f"{head}.{tail}" if text.count(",") == 1 and len(tail) != 3 else text.replace(",", "")
+    elif text.count(".") > 1:
+        text = text.replace(".", "")
+
+    try:
+        amount = float(text)
+    except ValueError:
+        return 0.0
+    return -amount if negative else amount
+
+
+# ─── Dates ────────────────────────────────────────────────────────────────────
+_NUMERIC_DATE = re.compile(r"^(\d{1,4})[./-](\d{1,2})[./-](\d{1,4})$")
+_TEXT_DATE_FORMATS = ("%d %b %Y", "%d %B %Y", "%b %d %Y", "%B %d %Y", "%d %b %y", "%b %d %y")
+
+
+def _plausible(d: date) -> bool:
+    return 1990 <= d.year <= date.today().year + 1
+
+
+def parse_receipt_date(value) -> date | None:
+    """Parse a receipt date in any of the common printed formats; None if unknown."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+
+    try:
+        parsed = datetime.fromisoformat(text[:19]).date()
+        return parsed if _plausible(parsed) else None
+    except ValueError:
+        pass
+
+    match = _NUMERIC_DATE.match(text.split()[0] if text else "")
+    if match:
+        a, b, c = (int(g) for g in match.groups())
+        if len(match.group(1)) == 4:  # YYYY/MM/DD
+            candidates = [(a, b, c)]
+        else:
+            year = c + 2000 if c < 100 else c
+            day_first, month_first = (year, b, a), (year, a, b)
+            candidates = [month_first, day_first] if DATE_ORDER == "MDY" else [day_first, month_first]
+        for y, m, d in candidates:
+            try:
+                parsed = date(y, m, d)
+            except ValueError:
+                continue
+            if _plausible(parsed):
+                return parsed
+        return None
+
+    cleaned = re.sub(r"[,.]", " ", text)
+    cleaned = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", cleaned)
+    cleaned = " ".join(cleaned.split())
+    for fmt in _TEXT_DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(cleaned, fmt).date()
+        except ValueError:
+            continue
+        if _plausible(parsed):
+            return parsed
+    return None
+
+
+# ─── Merchants ────────────────────────────────────────────────────────────────
+def merchant_tokens(name: str) -> list[str]:
+    return [t for t in normalize_name(name).split() if t not in MERCHANT_STOPWORDS]
+
+
+def _trigrams(compact: str) -> set[str]:
+    padded = f"  {compact} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class MerchantIndex:
+    """Known merchants of one user, with a trigram inverted index for fuzzy lookup."""
+
+    def __init__(self):
+        self.by_compact = {}   # "dmart" -> canonical key
+        self.tokens = {}       # canonical key -> token set
+        self.grams = {}        # canonical key -> trigram set
+        self.postings = {}     # trigram -> {canonical keys}
+        self.categories = {}   # canonical key -> most common category
+        self.lock = threading.Lock()
+
+    def add(self, key: str, category: str = None):
+        tokens = key.split()
+        compact = "".join(tokens)
+        self.by_compact.setdefault(compact, key)
+        self.tokens[key] = set(tokens)
+        self.grams[key] = _trigrams(compact)
+        for gram in self.grams[key]:
+            self.postings.setdefault(gram, set()).add(key)
+        if category and category != "General":
+            self.categories.setdefault(key, category)
+
+    def match(self, tokens: list[str]) -> str | None:
+        compact = "".join(tokens)
+        if compact in self.by_compact:
+            return self.by_compact[compact]
+        grams, token_set = _trigrams(compact), set(tokens)
+        candidates = set().union(*(self.postings.get(g, ()) for g in grams))
+        best, best_score = None, 0.0
+        for key in candidates:
+            score = max(_jaccard(grams, self.grams[key]), _jaccard(token_set, self.tokens[key]))
+            if score > best_score:
+                best, best_score = key, score
+        return best if best_score >= MERCHANT_MATCH_THRESHOLD else None
+
+    def resolve(self, raw: str, category: str = None) -> tuple[str, str | None]:
+        """Canonical key for `raw` (registering it if new) and the merchant's known category."""
+        tokens = merchant_tokens(raw) or ["unknown"]
+        with self.lock:
+            key = self.match(tokens)
+            if key is None:
+                key = " ".join(tokens)[:255]
+                self.add(key, category)
+            elif category and category != "General":
+                self.categories.setdefault(key, category)
+            return key, self.categories.get(key)
+
+
+_indexes: "OrderedDict[int, MerchantIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _load_index(db: Session, user_id: int) -> MerchantIndex:
+    index = MerchantIndex()
+    counts = {}
+    for key, category, n in (
+        db.query(Receipt.merchant_normalized, Receipt.category, func.count(Receipt.id))
+        .filter(Receipt.user_id == user_id, Receipt.merchant_normalized.isnot(None))
+        .group_by(Receipt.merchant_normalized, Receipt.category)
+    ):
+        counts.setdefault(key, Counter())[category] += n
+    for key, by_category in counts.items():
+        specific = [c for c, _ in by_category.most_common() if c and c != "General"]
+        index.add(key, specific[0] if specific else None)
+    return index
+
+
+def merchant_index(db: Session, user_id: int) -> MerchantIndex:
+    """The user's cached merchant index, loaded from `receipts` on first use."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+            return index
+    index = _load_index(db, user_id)
+    with _indexes_lock:
+        index = _indexes.setdefault(user_id, index)
+        while len(_indexes) > MERCHANT_CACHE_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def forget_merchants(user_id: int = None):
+    """Drop cached indexes (one user, or all) so they are rebuilt from the DB."""
+    with _indexes_lock:
+        if user_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(user_id, None)
+
+
+def canonicalize_receipt(db: Session, user_id: int, fields: dict) -> dict:
+    """
+    Resolve the merchant of parsed receipt `fields` to its canonical key and,
+    when the model only said "General", reuse the category this merchant is
+    already filed under. Returns `fields` with "merchant_normalized" set.
+    """
+    key, known_category = merchant_index(db, user_id).resolve(fields["merchant"], fields["category"])
+    fields["merchant_normalized"] = key
+    if fields["category"] == "General" and known_category:
+        fields["category"] = known_category
+    return fields
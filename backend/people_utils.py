@@ -0,0 +1,95 @@
+"""
+Face-tagging helpers shared by the people router and the chat tools.
+"""
+from collections import defaultdict
+from sqlalchemy import insert, or_, select
+from sqlalchemy.orm import Session
+from .models.face import Face
+from .models.person import Person
+from .models.photo import Photo
+from .stats_utils import record_photos_tagged
+
+MAX_BULK_TAGS = 5000  # photo + face assignments per request
+
+
+def _by_target(pairs, kind: str) -> dict[int, int]:
+    assigned = {}
+    for target_id, person_id in pairs:
+        if assigned.setdefault(target_id, person_id) != person_id:
+            raise ValueError(f"{kind} {target_id} is assigned to more than one person")
+    return assigned
+
+
+def tag_people(db: Session, user_id: int, photo_tags=(), face_tags=()) -> dict:
+    """
+    Stage many (photo_id, person_id) and (face_id, person_id) assignments.
+    A photo assignment tags every face in the photo (or adds a placeholder
+    face when none was detected); a face assignment tags that face only and
+    wins over its photo's. Ownership of every photo, face and person is
+    checked with one query per table, faces are updated with one
+    UPDATE ... WHERE id IN per person, placeholders with one INSERT, and the
+    tagged-photo counter moves by the photos that had no tagged face before.
+    Does not commit; index result["photo_ids"] after committing.
+
+    Raises ValueError for conflicting or oversized requests and LookupError
+    naming the ids the user does not own.
+    """
+    by_photo = _by_target(photo_tags, "Photo")
+    by_face = _by_target(face_tags, "Face")
+    if len(by_photo) + len(by_face) > MAX_BULK_TAGS:
+        raise ValueError(f"At most {MAX_BULK_TAGS} photos and faces can be tagged per request")
+    if not by_photo and not by_face:
+        return {"photo_ids": [], "faces": 0, "newly_tagged": 0, "people": {}}
+
+    people = dict(
+        db.query(Person.id, Person.name)
+        .filter(Person.id.in_(set(by_photo.values()) | set(by_face.values())), Person.user_id == user_id)
+    )
+    # Every face of every photo involved, so the before/after tagged state is known
+    faces_of = defaultdict(dict)  # photo id -> {face id: current person id}
+    for photo_id, face_id, person_id in (
+        db.query(Photo.id, Face.id, Face.person_id)
+        .outerjoin(Face, Face.photo_id == Photo.id)
+        .filter(Photo.user_id == user_id,
+                or_(Photo.id.in_(by_photo), Photo.id.in_(select(Face.photo_id).where(Face.id.in_(by_face)))))
+    ):
+        faces = faces_of[photo_id]
+        if face_id is not None:
+            faces[face_id] = person_id
+    photo_of = {face_id: photo_id for photo_id, faces in faces_of.items() for face_id in faces}
+
+    missing = ([f"Photo {i}" for i in by_photo if i not in faces_of]
+               + [f"Face {i}" for i in by_face if i not in photo_of]
+               + [f"Person {i}" for i in sorted(set(by_photo.values()) | set(by_face.values())) if i not in people])
+    if missing:
+        more = f" and {len(missing) - 20} more" if len(missing) > 20 else ""
+        raise LookupError(f"{', '.join(missing[:20])}{more} not found")
+
+    new_person = {}
+    placeholders = []
+    for photo_id, person_id in by_photo.items():
+        if faces_of[photo_id]:
+            new_person.update(dict.fromkeys(faces_of[photo_id], person_id))
+        else:
+            placeholders.append({"photo_id": photo_id, "person_id": person_id, "encoding": []})
+    new_person.update(by_face)
+
+    changed = defaultdict(list)  # person id -> face ids
+    for face_id, person_id in new_person.items():
+        if faces_of[photo_of[face_id]][face_id] != person_id:
+            changed[person_id].append(face_id)
+    for person_id, face_ids in changed.items():
+        db.query(Face).filter(Face.id.in_(face_ids)).update({Face.person_id: person_id}, synchronize_session=False)
+    if placeholders:
+        db.execute(insert(Face), placeholders)
+
+    photo_ids = set(by_photo) | {photo_of[face_id] for face_id in by_face}
+    newly_tagged = sum(1 for photo_id in photo_ids if not any(faces_of[photo_id].values()))
+    if newly_tagged:
+        record_photos_tagged(db, user_id, newly_tagged)
+    return {
+        "photo_ids": sorted(photo_ids),
+        "faces": sum(len(ids) for ids in changed.values()) + len(placeholders),
+        "newly_tagged": newly_tagged,
+        "people": people,
+    }
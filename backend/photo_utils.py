@@ -0,0 +1,30 @@
+"""
+Bulk photo-row helpers shared by the upload and receipt-import paths.
+"""
+from collections import defaultdict, deque
+from sqlalchemy import insert, func
+from sqlalchemy.orm import Session
+from .models.photo import Photo
+
+
+def insert_photos(db: Session, rows: list[dict]) -> list[int]:
+    """
+    Stage photo rows with one multi-row INSERT and return their ids in row
+    order. Content-addressed paths are shared by identical uploads, so ids
+    are matched by (user, path) among rows above the pre-insert high-water
+    mark, in insertion order. Does not commit.
+    """
+    if not rows:
+        return []
+    high_water = db.query(func.max(Photo.id)).scalar() or 0
+    db.execute(insert(Photo), rows)
+    new_ids = defaultdict(deque)
+    for pid, uid, path in (
+        db.query(Photo.id, Photo.user_id, Photo.path)
+        .filter(Photo.id > high_water,
+                Photo.user_id.in_({r["user_id"] for r in rows}),
+                Photo.path.in_({r["path"] for r in rows}))
+        .order_by(Photo.id)
+    ):
+        new_ids[(uid, path)].append(pid)
+    return [new_ids[(r["user_id"], r["path"])].popleft() for r in rows]
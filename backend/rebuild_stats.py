@@ -0,0 +1,87 @@
+"""
+Rebuild or verify the incrementally maintained `user_stats` counters,
+`photo_timeline` buckets, `receipt_monthly` rollups and the search index.
+
+    python backend/rebuild_stats.py              # rebuild every user
+    python backend/rebuild_stats.py --verify     # report drift, change nothing
+    python backend/rebuild_stats.py --user-id 4  # a single user
+"""
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import SessionLocal, engine, Base
+from backend.models.user import User
+from backend.models.user_stats import UserStats
+from backend.models.photo_timeline import PhotoTimelineBucket
+from backend.stats_utils import rebuild_user_stats, verify_user_stats
+from backend.models.receipt_monthly import ReceiptMonthly
+from backend.timeline_utils import rebuild_timeline, verify_timeline
+from backend.receipt_utils import rebuild_receipt_rollups, verify_receipt_rollups
+from backend.search_index import rebuild_search_index, verify_search_index
+
+def run(verify_only: bool = False, user_id: int = None):
+    Base.metadata.create_all(bind=engine, tables=[
+        UserStats.__table__, PhotoTimelineBucket.__table__, ReceiptMonthly.__table__,
+    ])
+    db = SessionLocal()
+    try:
+        query = db.query(User.id).order_by(User.id)
+        if user_id is not None:
+            query = query.filter(User.id == user_id)
+        user_ids = [uid for (uid,) in query]
+
+        drifted = 0
+        for uid in user_ids:
+            user_drifted = False
+            drift = verify_user_stats(db, uid)
+            if drift:
+                user_drifted = True
+                print(f"  user {uid}: drift in {len(drift)} field(s)")
+                for field, (stored, actual) in drift.items():
+                    print(f"    {field}: stored={stored} actual={actual}")
+                if not verify_only:
+                    rebuild_user_stats(db, uid)
+                    print(f"    ✓ rebuilt")
+
+            timeline_drift = verify_timeline(db, uid)
+            if timeline_drift:
+                user_drifted = True
+                print(f"  user {uid}: {len(timeline_drift)} timeline bucket(s) drifted")
+                if not verify_only:
+                    rebuild_timeline(db, uid)
+                    print(f"    ✓ timeline rebuilt")
+
+            rollup_drift = verify_receipt_rollups(db, uid)
+            if rollup_drift:
+                user_drifted = True
+                print(f"  user {uid}: {len(rollup_drift)} monthly receipt rollup(s) drifted")
+                if not verify_only:
+                    rebuild_receipt_rollups(db, uid)
+                    print(f"    ✓ receipt rollups rebuilt")
+
+            search_drift = verify_search_index(db, uid)
+            if search_drift:
+                user_drifted = True
+                for kind, (indexed, actual) in search_drift.items():
+                    print(f"  user {uid}: search index has {indexed} {kind} document(s), expected {actual}")
+                if not verify_only:
+                    rebuild_search_index(db, uid)
+                    print(f"    ✓ search index rebuilt")
+
+            drifted += user_drifted
+
+        print(f"\nChecked {len(user_ids)} user(s), {drifted} with drift"
+              + ("" if verify_only else " (rebuilt)"))
+        return drifted
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verify", action="store_true", help="Only report drift, do not rewrite counters")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+    drifted = run(verify_only=args.verify, user_id=args.user_id)
+    sys.exit(1 if (args.verify and drifted) else 0)
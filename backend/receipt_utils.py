@@ -0,0 +1,403 @@
+"""
+Receipt ingest, bookkeeping and SQL-side spend analytics.
+
+All totals and breakdowns are computed by the database (`SUM ... GROUP BY`)
+over the (user_id, ...) indexes on `receipts`; nothing loads a user's whole
+receipt history into Python. Monthly per-category spend is additionally
+materialized in `receipt_monthly` and kept current on every receipt
+insert/delete, so month-level dashboards are a handful of row reads.
+"""
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, extract, insert, and_, or_, cast, Integer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models.receipt import Receipt
+from .models.receipt_item import ReceiptItem
+from .models.receipt_monthly import ReceiptMonthly
+from .models.photo import Photo
+from .stats_utils import record_photo_added, record_receipt_added, record_receipt_removed
+from .timeline_utils import record_timeline_added_many
+from .photo_utils import insert_photos
+from .normalize_utils import (
+    normalize_name, normalize_category, parse_amount, parse_receipt_date, canonicalize_receipt,
+)
+
+GROUPINGS = ("category", "merchant", "month", "week")
+
+
+# ─── Parsing ──────────────────────────────────────────────────────────────────
+def parse_receipt_data(data: dict | None) -> dict:
+    """Map the vision model's JSON (RECEIPT_PROMPT) onto receipt fields."""
+    data = data or {}
+    items = []
+    for item in data.get("Items") or data.get("items") or []:
+        if not isinstance(item, dict):
+            continue
+        name = str(item.get("name") or "").strip()
+        if name and normalize_name(name):
+            items.append({"name": name[:255], "price": parse_amount(item.get("price"))})
+    return {
+        "merchant": (str(data.get("Merchant Name") or data.get("merchant") or "").strip() or "Unknown")[:255],
+        "amount": parse_amount(data.get("Total Amount") or data.get("amount") or data.get("total")),
+        "tax": parse_amount(data.get("Tax Amount") or data.get("tax")),
+        "category": normalize_category(data.get("Category") or data.get("category")),
+        "date": parse_receipt_date(data.get("Date") or data.get("date")),
+        "items": items,
+    }
+
+
+def save_receipt(db: Session, photo_id: int, user_id: int, data: dict | None) -> Receipt:
+    """
+    Stage a Receipt plus its line items (one bulk INSERT) and update counters
+    and rollups. Flushes to get the receipt id; the caller commits.
+    """
+    fields = canonicalize_receipt(db, user_id, parse_receipt_data(data))
+    receipt = Receipt(
+        photo_id=photo_id,
+        user_id=user_id,
+        merchant=fields["merchant"],
+        merchant_normalized=fields["merchant_normalized"],
+        amount=fields["amount"],
+        tax=fields["tax"],
+        date=fields["date"],
+        category=fields["category"],
+    )
+    db.add(receipt)
+    db.flush()
+
+    if fields["items"]:
+        purchased_on = _spend_day(receipt.date, receipt.created_at)
+        db.execute(insert(ReceiptItem), [
+            {"receipt_id": receipt.id, "user_id": user_id, "name": item["name"],
+             "normalized_name": normalize_name(item["name"]), "price": item["price"],
+             "purchased_on": purchased_on}
+            for item in fields["items"]
+        ])
+    record_receipt_saved(db, receipt)
+    return receipt
+
+
+def add_receipts_bulk(db: Session, user_id: int, photo_receipts: list[tuple[int, dict | None]]) -> list[tuple[int, dict]]:
+    """
+    Stage receipts for already-staged photos, given as (photo_id, vision JSON):
+    one multi-row INSERT each for receipts and line items, with counters and
+    rollups bumped once per group. Returns (receipt_id, parsed fields) in
+    input order; the caller commits.
+    """
+    if not photo_receipts:
+        return []
+    parsed = [canonicalize_receipt(db, user_id, parse_receipt_data(data)) for _, data in photo_receipts]
+    photo_ids = [pid for pid, _ in photo_receipts]
+
+    db.execute(insert(Receipt), [
+        {"photo_id": pid, "user_id": user_id, "merchant": f["merchant"],
+         "merchant_normalized": f["merchant_normalized"], "amount": f["amount"], "tax": f["tax"],
+         "date": f["date"], "category": f["category"]}
+        for pid, f in zip(photo_ids, parsed)
+    ])
+    inserted = {pid: (rid, created_at) for pid, rid, created_at in
+                db.query(Receipt.photo_id, Receipt.id, Receipt.created_at).filter(Receipt.photo_id.in_(photo_ids))}
+    ids = [inserted[pid][0] for pid in photo_ids]
+    days = [_spend_day(f["date"], inserted[pid][1]) for pid, f in zip(photo_ids, parsed)]
+
+    items = [
+        {"receipt_id": rid, "user_id": user_id, "name": item["name"],
+         "normalized_name": normalize_name(item["name"]), "price": item["price"],
+         "purchased_on": day}
+        for rid, day, f in zip(ids, days, parsed) for item in f["items"]
+    ]
+    if items:
+        db.execute(insert(ReceiptItem), items)
+
+    # Bookkeeping, aggregated per counter row / rollup key
+    record_receipt_added(db, user_id, sum(f["amount"] for f in parsed), sum(f["tax"] for f in parsed),
+                         count=len(parsed))
+    rollups = {}
+    for when, f in zip(days, parsed):
+        key = (when.year, when.month, f["category"] or "General")
+        total, tax, count = rollups.get(key, (0.0, 0.0, 0))
+        rollups[key] = (total + f["amount"], tax + f["tax"], count + 1)
+    for key, (total, tax, count) in rollups.items():
+        _bump_rollup(db, user_id, key, total, tax, count)
+    return list(zip(ids, parsed))
+
+
+def save_receipts_bulk(db: Session, user_id: int, entries: list[dict]) -> list[int]:
+    """
+    Stage a chunk of imported receipts: one multi-row INSERT each for photos,
+    receipts and line items, with counters, timeline buckets and rollups bumped
+    once per group instead of once per receipt. `entries` are dicts with
+    "path", "filename", "metadata" (extract_media_metadata output) and "data"
+    (vision JSON). Returns the new receipt ids in entry order; the caller commits.
+    """
+    if not entries:
+        return []
+    photo_ids = insert_photos(db, [
+        {"user_id": user_id, "path": e["path"], "filename": e["filename"],
+         "category": "Receipt", "is_sensitive": False, **e["metadata"]}
+        for e in entries
+    ])
+
+    record_photo_added(db, user_id, "Receipt", sum(e["metadata"].get("size_bytes") or 0 for e in entries),
+                       count=len(entries))
+    record_timeline_added_many(db, user_id, [e["metadata"].get("taken_at") for e in entries])
+    saved = add_receipts_bulk(db, user_id, [(pid, e["data"]) for pid, e in zip(photo_ids, entries)])
+    return [rid for rid, _ in saved]
+
+
+def delete_receipt(db: Session, receipt: Receipt, user_id: int = None):
+    """Stage deletion of a receipt, its line items and its share of the counters/rollups."""
+    record_receipt_deleted(db, receipt, user_id)
+    db.query(ReceiptItem).filter(ReceiptItem.receipt_id == receipt.id).delete(synchronize_session=False)
+    db.delete(receipt)
+
+
+# ─── Write-path helpers ───────────────────────────────────────────────────────
+def _spend_day(receipt_date: date | None, created_at: datetime | None) -> date:
+    """Python-side spend_date(): the printed date, else the upload date."""
+    return receipt_date or (created_at.date() if created_at else date.today())
+
+
+def _rollup_key(receipt: Receipt) -> tuple[int, int, str]:
+    when = _spend_day(receipt.date, receipt.created_at)
+    return when.year, when.month, receipt.category or "General"
+
+
+def _bump_rollup(db: Session, user_id: int, key: tuple, total: float, tax: float, count: int):
+    year, month, category = key
+    criteria = (
+        ReceiptMonthly.user_id == user_id, ReceiptMonthly.year == year,
+        ReceiptMonthly.month == month, ReceiptMonthly.category == category,
+    )
+    values = {
+        ReceiptMonthly.total: ReceiptMonthly.total + total,
+        ReceiptMonthly.tax: ReceiptMonthly.tax + tax,
+        ReceiptMonthly.receipt_count: ReceiptMonthly.receipt_count + count,
+    }
+    if db.query(ReceiptMonthly).filter(*criteria).update(values, synchronize_session=False) or count < 0:
+        return
+    try:
+        with db.begin_nested():
+            db.add(ReceiptMonthly(user_id=user_id, year=year, month=month, category=category,
+                                  total=total, tax=tax, receipt_count=count))
+    except IntegrityError:
+        db.query(ReceiptMonthly).filter(*criteria).update(values, synchronize_session=False)
+
+
+def record_receipt_saved(db: Session, receipt: Receipt):
+    """Update counters and monthly rollups for a newly staged receipt. Does not commit."""
+    amount, tax = receipt.amount or 0.0, receipt.tax or 0.0
+    record_receipt_added(db, receipt.user_id, amount, tax)
+    _bump_rollup(db, receipt.user_id, _rollup_key(receipt), amount, tax, 1)
+
+
+def record_receipt_deleted(db: Session, receipt: Receipt, user_id: int = None):
+    user_id = receipt.user_id or user_id
+    amount, tax = receipt.amount or 0.0, receipt.tax or 0.0
+    record_receipt_removed(db, user_id, amount, tax)
+    _bump_rollup(db, user_id, _rollup_key(receipt), -amount, -tax, -1)
+
+
+# ─── Queries ──────────────────────────────────────────────────────────────────
+def spend_date():
+    """The date a receipt counts towards: printed date, else upload date."""
+    return func.coalesce(Receipt.date, Receipt.created_at)
+
+
+def _week_key(db: Session, column):
+    """ISO 8601 week as year * 100 + week (e.g. 202411) on every backend."""
+    if db.bind.dialect.name == "mysql":
+        return func.yearweek(column, 3)
+    # The ISO week and its year are those of the week's Thursday
+    thursday = func.date(column, "-3 days", "weekday 4")
+    year = cast(func.strftime("%Y", thursday), Integer)
+    day_of_year = cast(func.strftime("%j", thursday), Integer)
+    return year * 100 + (day_of_year - 1) // 7 + 1
+
+
+def _date_filters(start: date = None, end: date = None) -> list:
+    """
+    spend_date() between start and end inclusive, written as one range per
+    column (date against the DATE column, datetimes against created_at) so
+    each branch can use its (user_id, ...) index and SQLite compares like
+    with like.
+    """
+    if start is None and end is None:
+        return []
+    dated, undated = [Receipt.date.isnot(None)], [Receipt.date.is_(None)]
+    if start is not None:
+        dated.append(Receipt.date >= start)
+        undated.append(Receipt.created_at >= datetime.combine(start, time.min))
+    if end is not None:
+        dated.append(Receipt.date <= end)
+        undated.append(Receipt.created_at < datetime.combine(end + timedelta(days=1), time.min))
+    return [or_(and_(*dated), and_(*undated))]
+
+
+def receipt_totals(db: Session, user_id: int, start: date = None, end: date = None) -> dict:
+    count, total, tax = (
+        db.query(func.count(Receipt.id), func.sum(Receipt.amount), func.sum(Receipt.tax))
+        .filter(Receipt.user_id == user_id, *_date_filters(start, end))
+        .one()
+    )
+    return {"count": count or 0, "total": round(total or 0.0, 2), "tax": round(tax or 0.0, 2)}
+
+
+def uploaded_since_total(db: Session, user_id: int, since: date) -> float:
+    total = (
+        db.query(func.sum(Receipt.amount))
+        .filter(Receipt.user_id == user_id, Receipt.created_at >= datetime.combine(since, time.min))
+        .scalar()
+    )
+    return round(total or 0.0, 2)
+
+
+def spend_breakdown(db: Session, user_id: int, group_by: str = "category",
+                    start: date = None, end: date = None, limit: int = 100) -> list[dict]:
+    """SUM/COUNT grouped by category, merchant, month or week, computed in SQL."""
+    group = None
+    if group_by == "category":
+        keys = [func.coalesce(Receipt.category, "General").label("category")]
+    elif group_by == "merchant":
+        # Group on the canonical key so spelling variants of one merchant add up
+        keys = [func.coalesce(func.min(Receipt.merchant), "Unknown").label("merchant")]
+        group = [Receipt.merchant_normalized]
+    elif group_by == "month":
+        keys = [extract("year", spend_date()).label("year"), extract("month", spend_date()).label("month")]
+    elif group_by == "week":
+        keys = [_week_key(db, spend_date()).label("week")]
+    else:
+        raise ValueError(f"group_by must be one of {GROUPINGS}")
+
+    total = func.sum(Receipt.amount)
+    query = (
+        db.query(*keys, total.label("total"), func.sum(Receipt.tax).label("tax"), func.count(Receipt.id).label("count"))
+        .filter(Receipt.user_id == user_id, *_date_filters(start, end))
+        .group_by(*(group or keys))
+    )
+    if group_by in ("month", "week"):
+        query = query.order_by(*[k.desc() for k in keys])
+    else:
+        query = query.order_by(total.desc())
+
+    return [
+        {
+            **{k.name: (int(v) if group_by == "month" else v) for k, v in zip(keys, row[:len(keys)])},
+            "total": round(row.total or 0.0, 2),
+            "tax": round(row.tax or 0.0, 2),
+            "count": row.count,
+        }
+        for row in query.limit(limit)
+    ]
+
+
+def monthly_rollup(db: Session, user_id: int, year: int = None, by_category: bool = False) -> list[dict]:
+    """Month (optionally month x category) spend read from the materialized rollup."""
+    keys = [ReceiptMonthly.year, ReceiptMonthly.month]
+    if by_category:
+        keys.append(ReceiptMonthly.category)
+    query = db.query(
+        *keys,
+        func.sum(ReceiptMonthly.total), func.sum(ReceiptMonthly.tax), func.sum(ReceiptMonthly.receipt_count),
+    ).filter(ReceiptMonthly.user_id == user_id, ReceiptMonthly.receipt_count > 0)
+    if year is not None:
+        query = query.filter(ReceiptMonthly.year == year)
+    rows = query.group_by(*keys).order_by(ReceiptMonthly.year.desc(), ReceiptMonthly.month.desc()).all()
+    names = [k.key for k in keys]
+    return [
+        {**dict(zip(names, row[:len(keys)])),
+         "total": round(row[-3] or 0.0, 2), "tax": round(row[-2] or 0.0, 2), "count": int(row[-1] or 0)}
+        for row in rows
+    ]
+
+
+def item_spend(db: Session, user_id: int, item: str, group_by: str = "month",
+               start: date = None, end: date = None) -> list[dict]:
+    """Spend on items whose normalized name starts with `item`, per month/week (one indexed query)."""
+    key = normalize_name(item)
+    if group_by == "month":
+        keys = [extract("year", ReceiptItem.purchased_on).label("year"),
+                extract("month", ReceiptItem.purchased_on).label("month")]
+    elif group_by == "week":
+        keys = [_week_key(db, ReceiptItem.purchased_on).label("week")]
+    else:
+        raise ValueError("group_by must be 'month' or 'week'")
+
+    query = db.query(*keys, func.sum(ReceiptItem.price), func.count(ReceiptItem.id)).filter(
+        ReceiptItem.user_id == user_id,
+        ReceiptItem.normalized_name.like(f"{key}%"),
+    )
+    if start is not None:
+        query = query.filter(ReceiptItem.purchased_on >= start)
+    if end is not None:
+        query = query.filter(ReceiptItem.purchased_on <= end)
+    rows = query.group_by(*keys).order_by(*[k.desc() for k in keys]).all()
+    return [
+        {**{k.name: (int(v) if group_by == "month" else v) for k, v in zip(keys, row[:len(keys)])},
+         "total": round(row[-2] or 0.0, 2), "count": row[-1]}
+        for row in rows
+    ]
+
+
+def top_items(db: Session, user_id: int, start: date = None, end: date = None,
+              order_by: str = "spend", limit: int = 10) -> list[dict]:
+    """Most-bought items by total spend or purchase count."""
+    total, count = func.sum(ReceiptItem.price), func.count(ReceiptItem.id)
+    query = db.query(ReceiptItem.normalized_name, func.min(ReceiptItem.name), total, count).filter(
+        ReceiptItem.user_id == user_id
+    )
+    if start is not None:
+        query = query.filter(ReceiptItem.purchased_on >= start)
+    if end is not None:
+        query = query.filter(ReceiptItem.purchased_on <= end)
+    query = query.group_by(ReceiptItem.normalized_name).order_by((count if order_by == "count" else total).desc())
+    return [
+        {"item": name, "example": example, "total": round(spent or 0.0, 2), "count": n}
+        for name, example, spent, n in query.limit(limit)
+    ]
+
+
+def list_receipts(db: Session, user_id: int, limit: int = 50, offset: int = 0,
+                  category: str = None, start: date = None, end: date = None):
+    query = (
+        db.query(Receipt, Photo.path)
+        .outerjoin(Photo, Receipt.photo_id == Photo.id)
+        .filter(Receipt.user_id == user_id, *_date_filters(start, end))
+    )
+    if category:
+        query = query.filter(Receipt.category == category)
+    return query.order_by(Receipt.id.desc()).offset(offset).limit(limit).all()
+
+
+# ─── Full recompute ───────────────────────────────────────────────────────────
+def compute_receipt_rollups(db: Session, user_id: int) -> dict:
+    rollups = {}
+    for receipt in db.query(Receipt).filter(Receipt.user_id == user_id).yield_per(1000):
+        key = _rollup_key(receipt)
+        total, tax, count = rollups.get(key, (0.0, 0.0, 0))
+        rollups[key] = (total + (receipt.amount or 0.0), tax + (receipt.tax or 0.0), count + 1)
+    return rollups
+
+
+def verify_receipt_rollups(db: Session, user_id: int) -> dict:
+    actual = compute_receipt_rollups(db, user_id)
+    stored = {
+        (r.year, r.month, r.category): (r.total, r.tax, r.receipt_count)
+        for r in db.query(ReceiptMonthly).filter(ReceiptMonthly.user_id == user_id)
+    }
+    drift = {}
+    for key in set(actual) | set(stored):
+        a, s = actual.get(key, (0.0, 0.0, 0)), stored.get(key, (0.0, 0.0, 0))
+        if a[2] != s[2] or abs(a[0] - s[0]) > 0.01 or abs(a[1] - s[1]) > 0.01:
+            drift[key] = (s, a)
+    return drift
+
+
+def rebuild_receipt_rollups(db: Session, user_id: int):
+    rollups = compute_receipt_rollups(db, user_id)
+    db.query(ReceiptMonthly).filter(ReceiptMonthly.user_id == user_id).delete(synchronize_session=False)
+    db.add_all(
+        ReceiptMonthly(user_id=user_id, year=y, month=m, category=c, total=t, tax=x, receipt_count=n)
+        for (y, m, c), (t, x, n) in rollups.items()
+    )
+    db.commit()
@@ -2,11 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models.user import User
-from ..auth_utils import get_password_hash, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user
+from ..auth_utils import get_password_hash, verify_and_update_async, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user, forget_user, UserSnapshot
 from pydantic import BaseModel, EmailStr
 from fastapi import Body
+from fastapi.concurrency import run_in_threadpool
 from datetime import timedelta, date
 from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/auth",
@@ -51,41 +55,48 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-def login(login_data: UserLogin, db: Session = Depends(get_db)):
-    print(f"DEBUG: Login attempt for {login_data.email}")
-    try:
-        user = db.query(User).filter(User.email == login_data.email).first()
-        print(f"DEBUG: User found: {user is not None}")
-        
-        if not user:
-            print("DEBUG: User not found")
-        elif not verify_password(login_data.password, user.password_hash):
-            print("DEBUG: Password mismatch")
-
-        if not user or not verify_password(login_data.password, user.password_hash):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user.email, "user_id": user.id}, expires_delta=access_token_expires
+async def login(login_data: UserLogin, db: Session = Depends(get_db)):
+    # Async so the password check runs on the hashing pool instead of holding a worker
+    # thread; the DB calls go through the regular threadpool.
+    user = await run_in_threadpool(lambda: db.query(User).filter(User.email == login_data.email).first())
+    valid, new_hash = await verify_and_update_async(login_data.password, user.password_hash if user else None)
+    if not user or not valid:
+        # No raw email in the log: the account id, when there is one, is enough to investigate
+        logger.info("Failed login for %s", f"user {user.id}" if user else "an unknown account")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        print("DEBUG: Access token generated")
-        return {"access_token": access_token, "token_type": "bearer"}
-    except Exception as e:
-        print(f"CRITICAL LOGIN ERROR: {e}")
-        import traceback
-        traceback.print_exc()
-        raise e
+    if new_hash:
+        # Stored hash predates the current policy; upgrade it while we have the plaintext
+        def rehash():
+            try:
+                user.password_hash = new_hash
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning("Could not upgrade password hash for user %s: %s", user.id, e)
+        await run_in_threadpool(rehash)
+
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.email, "user_id": user.id}, expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
 @router.put("/smtp-settings")
 def update_smtp_settings(
     settings: dict = Body(...),
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    current_user.smtp_email = settings.get("smtp_email")
-    current_user.smtp_password = settings.get("smtp_password")
+    # current_user is a cached snapshot; write through a row loaded in this session
+    user = db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.smtp_email = settings.get("smtp_email")
+    user.smtp_password = settings.get("smtp_password")
     db.commit()
+    forget_user(user.id)
     return {"message": "SMTP settings updated successfully"}
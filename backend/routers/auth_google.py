@@ -6,9 +6,13 @@ from ..auth_utils import create_access_token, get_password_hash
 from pydantic import BaseModel
 from google.oauth2 import id_token
 from google.auth.transport import requests
+from ..metrics import track_external
+import logging
 import os
 import secrets
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/auth/google",
     tags=["auth"],
@@ -24,12 +28,11 @@ def google_login(login_data: GoogleLogin, db: Session = Depends(get_db)):
          raise HTTPException(status_code=500, detail="Google Client ID not configured")
 
     try:
-        print(f"DEBUG: Verifying Google Token: {login_data.token[:20]}...")
         # Verify token
-        id_info = id_token.verify_oauth2_token(
-            login_data.token, requests.Request(), GOOGLE_CLIENT_ID
-        )
-        print(f"DEBUG: Token verified. Email: {id_info.get('email')}")
+        with track_external("google", "verify_token"):
+            id_info = id_token.verify_oauth2_token(
+                login_data.token, requests.Request(), GOOGLE_CLIENT_ID
+            )
 
         email = id_info['email']
         name = id_info.get('name', '')
@@ -51,20 +54,20 @@ def google_login(login_data: GoogleLogin, db: Session = Depends(get_db)):
             db.add(user)
             db.commit()
             db.refresh(user)
+            logger.info("Created user %s from a Google sign-in", user.id)
+        logger.debug("Google token verified for user %s", user.id)
             
         # Create access token
-        access_token = create_access_token(data={"sub": user.email})
+        access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
         return {"access_token": access_token, "token_type": "bearer", "user": {"id": user.id, "email": user.email, "full_name": user.full_name}}
 
     except ValueError as e:
-        print(f"DEBUG: ValueError in Google Login: {e}")
+        logger.info("Rejected Google token: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Google Token",
             headers={"WWW-Authenticate": "Bearer"},
         )
     except Exception as e:
-        print(f"DEBUG: Critical Error in Google Login: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Google login failed")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,11 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_async_db, AsyncDB
+from ..models.photo import Photo
+from ..models.user import User
 from ..ai_services.groq_client import GroqClient
 from pydantic import BaseModel
 from typing import List
 import json
+import asyncio
+import logging
 from ..ai_services.tools import TOOL_REGISTRY
+from ..stats_utils import get_user_stats
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/chat",
@@ -20,26 +27,27 @@ class ChatRequest(BaseModel):
     message: str
     history: List[ChatMessage] = []   # Full conversation history from frontend
 
+def _chat_context(db: Session, user_id: int) -> tuple:
+    """Live context for the system prompt (counters, not table scans)."""
+    stats = get_user_stats(db, user_id)
+    recent_photos = db.query(Photo).filter(Photo.user_id == user_id).order_by(Photo.created_at.desc()).limit(3).all()
+    recent_context = ", ".join([f"Photo {p.id} ({p.category}, path: {p.path})" for p in recent_photos]) or "None"
+    return stats.photo_count, stats.people_count, stats.receipt_total or 0, recent_context
+
+
+def _smtp_credentials(db: Session, user_id: int) -> tuple:
+    user = db.get(User, user_id)
+    return (user.smtp_email, user.smtp_password) if user else (None, None)
+
+
 @router.post("/")
 async def chat_with_agent(
     request: ChatRequest,
     user_id: int = 1,  # TODO: get from JWT when auth is wired
-    db: Session = Depends(get_db)
+    db: AsyncDB = Depends(get_async_db)
 ):
-    from ..models.photo import Photo
-    from ..models.person import Person
-    from ..models.user import User
-
-    # --- Build live context from DB ---
-    photo_count = db.query(Photo).filter(Photo.user_id == user_id).count()
-    person_count = db.query(Person).filter(Person.user_id == user_id).count()
-    recent_photos = db.query(Photo).filter(Photo.user_id == user_id).order_by(Photo.created_at.desc()).limit(3).all()
-    recent_context = ", ".join([f"Photo {p.id} ({p.category}, path: {p.path})" for p in recent_photos]) or "None"
-
-    # Include receipt summary in context
-    from ..models.receipt import Receipt
-    from sqlalchemy import func as sqlfunc
-    receipt_total = db.query(sqlfunc.sum(Receipt.amount)).join(Photo).filter(Photo.user_id == user_id).scalar() or 0
+    # DB reads, the LLM call and tool execution all run off the event loop
+    photo_count, person_count, receipt_total, recent_context = await db.run(_chat_context, user_id)
 
     system_prompt = f"""You are PersonaLens, a powerful AI assistant with FULL ACCESS to the user's photo library, people, receipts, vault, and messaging.
 Be helpful, concise, and action-oriented. Always confirm before deleting.
@@ -54,32 +62,39 @@ Be helpful, concise, and action-oriented. Always confirm before deleting.
 === AVAILABLE TOOLS ===
 You have FULL CONTROL. Use these tools when the user asks you to act:
 
+🔎 SEARCH:
+1. search_library(user_id, query=None, kind=None, category=None, start=None, end=None, limit=20) — find photos/receipts/vault files/people by words in filenames, image descriptions, merchants, receipt items and person names; kind: photo/receipt/vault/person (comma-separated); start/end as YYYY-MM-DD
+2. find_photos(user_id, query, limit=10) — photos that LOOK like a description ("beach at sunset", "birthday cake"); returns IDs and paths
+
 📷 PHOTOS:
-1. list_photos(user_id, category=None) — list all photos; category: Person/Receipt/Document/Note/General
-2. delete_photo(photo_id, user_id) — permanently delete a photo from disk and DB
-3. move_photo(photo_id, category, user_id) — move photo to a different category
+3. list_photos(user_id, category=None) — list all photos; category: Person/Receipt/Document/Note/General
+4. delete_photo(photo_id, user_id) — permanently delete a photo from disk and DB
+5. move_photo(photo_id, category, user_id) — move photo to a different category
 
 👥 PEOPLE:
-4. list_people(user_id) — list all named people
-5. create_person(name, user_id) — create a new person profile
-6. tag_person_in_photo(photo_id, person_id, user_id) — tag who is in a photo
+6. list_people(user_id) — list all named people
+7. create_person(name, user_id) — create a new person profile
+8. tag_person_in_photo(photo_id, person_id, user_id) — tag who is in a photo
+9. tag_person_in_photos(person_id, user_id, photo_ids=[], face_ids=[]) — tag one person in many photos (or faces) at once; prefer it over repeated tag_person_in_photo
 
 🧾 RECEIPTS:
-7. get_receipt_summary(user_id) — show spending totals and category breakdown
-8. delete_receipt(receipt_id, user_id) — delete a receipt record
+10. get_receipt_summary(user_id, group_by="category", start=None, end=None) — spending totals with a breakdown; group_by: category/merchant/month/week; start/end as YYYY-MM-DD
+11. get_item_spend(user_id, item, group_by="month", start=None, end=None) — spend on one item (e.g. "milk") per month/week, from receipt line items
+12. get_top_items(user_id, limit=10, order_by="spend", start=None, end=None) — most-bought items; order_by: spend/count
+13. delete_receipt(receipt_id, user_id) — delete a receipt record
 
 🔐 VAULT:
-9. list_vault(user_id) — list all files in the secure vault
+14. list_vault(user_id) — list all files in the secure vault
 
 📨 MESSAGING:
-10. send_email(to_email, subject, message) — send email via Gmail SMTP
-11. send_whatsapp(phone_number, message, image_path=None) — send WhatsApp text or image
-    - image_path MUST be the exact file path like "uploads/photos/uuid.jpg" (NOT the photo ID)
+15. send_email(to_email, subject, message) — send email via Gmail SMTP
+16. send_whatsapp(phone_number, message, image_path=None) — send WhatsApp text or image
+    - image_path MUST be the photo's exact 'path' like "photos/ab/cd/<hash>.jpg" (NOT the photo ID)
 
 === RULES ===
 - user_id is ALWAYS: {user_id}
-- When you need IDs or Paths, call list_photos first
-- For WhatsApp images: use the 'path' from list_photos/recent_context (e.g., 'photos/uuid.jpg') and prefix with 'uploads/'
+- When you need IDs or Paths, call search_library first (list_photos only to list a whole category)
+- For WhatsApp images: use the 'path' from search_library/list_photos/recent_context unchanged
 - Before deleting anything, tell the user what you're about to delete and confirm
 - To call a tool, respond with ONLY this JSON (nothing else):
 {{"tool": "tool_name", "args": {{"arg": "value"}}}}
@@ -94,7 +109,7 @@ You have FULL CONTROL. Use these tools when the user asks you to act:
     messages.append({"role": "user", "content": request.message})
 
     # --- Get LLM response with full history ---
-    response_content = GroqClient.get_completion_with_history(messages)
+    response_content = await asyncio.to_thread(GroqClient.get_completion_with_history, messages)
 
     if not response_content:
         raise HTTPException(status_code=500, detail="AI Service unavailable")
@@ -114,22 +129,23 @@ You have FULL CONTROL. Use these tools when the user asks you to act:
             tool_args = tool_call.get("args", {})
 
             if tool_name in TOOL_REGISTRY:
-                print(f"[TOOL] Executing: {tool_name} with args {tool_args}")
+                logger.info("Executing tool %s", tool_name)
+                logger.debug("Tool %s args: %s", tool_name, tool_args)
 
                 # Inject user SMTP credentials for emails
                 if tool_name == "send_email":
-                    current_user = db.query(User).filter(User.id == user_id).first()
-                    if current_user and current_user.smtp_email and current_user.smtp_password:
-                        tool_args["smtp_user"] = current_user.smtp_email
-                        tool_args["smtp_pass"] = current_user.smtp_password
+                    smtp_email, smtp_password = await db.run(_smtp_credentials, user_id)
+                    if smtp_email and smtp_password:
+                        tool_args["smtp_user"] = smtp_email
+                        tool_args["smtp_pass"] = smtp_password
 
-                result = TOOL_REGISTRY[tool_name](**tool_args)
+                result = await asyncio.to_thread(TOOL_REGISTRY[tool_name], **tool_args)
                 friendly_msg = result.get("message", "Done!")
                 return {
                     "response": f"✓ {friendly_msg}",
                     "tool_result": result
                 }
     except (json.JSONDecodeError, KeyError, Exception) as e:
-        print(f"[TOOL PARSE] Not a tool call, treating as text: {e}")
+        logger.debug("Not a tool call, treating as text: %s", e)
 
     return {"response": response_content}
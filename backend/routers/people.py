@@ -6,6 +6,10 @@ from ..models.face import Face
 from ..models.photo import Photo
 from ..auth_utils import get_current_user
 from ..ai_services.face_recognition import FaceRecognitionService
+from ..stats_utils import record_person_added, record_person_removed
+from ..people_utils import tag_people
+from ..search_index import index_documents, remove_documents
+from ..storage import storage, resolve_key
 from pydantic import BaseModel
 from typing import List, Optional
 import os
@@ -35,10 +39,7 @@ def get_people(db: Session = Depends(get_db), current_user=Depends(get_current_u
             first_face = p.faces[0]
             photo = db.query(Photo).filter(Photo.id == first_face.photo_id).first()
             if photo:
-                clean = photo.path.replace("\\", "/")
-                if not clean.startswith("photos/") and not clean.startswith("receipts/"):
-                    clean = clean.replace("uploads/", "")
-                cover = f"/static/uploads/{clean}"
+                cover = storage.url(photo.path)
         result.append(PersonResponse(id=p.id, name=p.name, photo_count=len(p.faces), cover_photo=cover))
     return result
 
@@ -47,8 +48,10 @@ def get_people(db: Session = Depends(get_db), current_user=Depends(get_current_u
 def create_person(name: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     new_person = Person(name=name, user_id=current_user.id)
     db.add(new_person)
+    record_person_added(db, current_user.id)
     db.commit()
     db.refresh(new_person)
+    index_documents(db, "person", [new_person.id])
     return {"id": new_person.id, "name": new_person.name, "photo_count": 0}
 
 
@@ -65,10 +68,6 @@ def get_photos_with_faces(db: Session = Depends(get_db), current_user=Depends(ge
 
     result = []
     for photo in photos:
-        clean = photo.path.replace("\\", "/")
-        if not clean.startswith("photos/") and not clean.startswith("receipts/"):
-            clean = clean.replace("uploads/", "")
-
         # Check if any face in this photo is tagged
         face = db.query(Face).filter(Face.photo_id == photo.id).first()
         tagged_person_id = face.person_id if face else None
@@ -80,7 +79,7 @@ def get_photos_with_faces(db: Session = Depends(get_db), current_user=Depends(ge
         result.append({
             "photo_id": photo.id,
             "filename": photo.filename,
-            "path": clean,
+            "path": resolve_key(photo.path),
             "tagged_person_id": tagged_person_id,
             "tagged_person_name": tagged_person_name,
         })
@@ -98,32 +97,65 @@ def tag_person_in_photo(
     Assign a person to all faces detected in a photo.
     If no Face records exist for the photo, create one as a placeholder.
     """
-    photo = db.query(Photo).filter(Photo.id == photo_id, Photo.user_id == current_user.id).first()
-    if not photo:
-        raise HTTPException(status_code=404, detail="Photo not found")
+    try:
+        result = tag_people(db, current_user.id, photo_tags=[(photo_id, person_id)])
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    db.commit()
+    index_documents(db, "photo", result["photo_ids"])
+    return {"message": f"Photo #{photo_id} tagged as '{result['people'][person_id]}'"}
 
-    person = db.query(Person).filter(Person.id == person_id, Person.user_id == current_user.id).first()
-    if not person:
-        raise HTTPException(status_code=404, detail="Person not found")
 
-    try:
-        faces = db.query(Face).filter(Face.photo_id == photo_id).all()
-        if not faces:
-            # No face record yet — create a placeholder so we can tag it
-            # Ensure JSON encoding is handled safely. Empty list is valid.
-            face = Face(photo_id=photo_id, person_id=person_id, encoding=[])
-            db.add(face)
+class TagItem(BaseModel):
+    person_id: int
+    photo_id: Optional[int] = None   # exactly one of photo_id / face_id
+    face_id: Optional[int] = None
+
+
+class TagGroup(BaseModel):
+    person_id: int
+    photo_ids: List[int] = []
+    face_ids: List[int] = []
+
+
+class BulkTagRequest(BaseModel):
+    tags: List[TagItem] = []
+    groups: List[TagGroup] = []      # one person for many photos/faces, e.g. a face cluster
+
+
+@router.post("/tag-bulk")
+def tag_people_bulk(request: BulkTagRequest, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """
+    Tag many photos and faces in one transaction. A photo tag covers every
+    face in the photo; a face tag covers that face only. All-or-nothing:
+    unknown ids give 404 and conflicting assignments 400, with nothing saved.
+    """
+    photo_tags, face_tags = [], []
+    for item in request.tags:
+        if (item.photo_id is None) == (item.face_id is None):
+            raise HTTPException(status_code=400, detail="Each tag needs exactly one of photo_id or face_id")
+        if item.photo_id is not None:
+            photo_tags.append((item.photo_id, item.person_id))
         else:
-            for face in faces:
-                face.person_id = person_id
+            face_tags.append((item.face_id, item.person_id))
+    for group in request.groups:
+        photo_tags += [(photo_id, group.person_id) for photo_id in group.photo_ids]
+        face_tags += [(face_id, group.person_id) for face_id in group.face_ids]
 
-        db.commit()
-        return {"message": f"Photo #{photo_id} tagged as '{person.name}'"}
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Tagging failed: {str(e)}")
+    try:
+        result = tag_people(db, current_user.id, photo_tags, face_tags)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    index_documents(db, "photo", result["photo_ids"])
+    return {
+        "message": f"Tagged {len(result['photo_ids'])} photo(s)",
+        "photos": len(result["photo_ids"]),
+        "faces": result["faces"],
+        "newly_tagged": result["newly_tagged"],
+    }
 
 
 @router.delete("/{person_id}")
@@ -131,6 +163,10 @@ def delete_person(person_id: int, db: Session = Depends(get_db), current_user=De
     person = db.query(Person).filter(Person.id == person_id, Person.user_id == current_user.id).first()
     if not person:
         raise HTTPException(status_code=404, detail="Person not found")
+    tagged_photo_ids = [pid for (pid,) in db.query(Face.photo_id).filter(Face.person_id == person_id).distinct()]
+    record_person_removed(db, current_user.id, person_id)
     db.delete(person)
     db.commit()
+    remove_documents("person", [person_id])
+    index_documents(db, "photo", tagged_photo_ids)
     return {"message": "Person deleted"}
@@ -1,17 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy import insert
+from ..database import get_db, get_async_db, AsyncDB, SessionLocal
 from ..models.photo import Photo
-from ..models.receipt import Receipt
+from .vault import encrypt_to_vault
 from ..models.vault import VaultFile
 from ..ai_services.groq_client import GroqClient
 from ..ai_services.face_recognition import FaceRecognitionService
 from ..ai_services.receipt_analyzer import ReceiptAnalyzer
-import shutil
+from ..ai_services import image_embeddings
+from ..ai_services.image_embeddings import index_photo_files
+from .. import vector_index
+from ..media_utils import extract_media_metadata
+from ..ingest_utils import ingest_upload, IngestedFile, RequestBudget, UploadTooLarge
+from ..metrics import upload_stage
+from ..timeline_utils import (
+    capture_time, record_timeline_added_many, record_timeline_removed, get_timeline, photos_in_range,
+    GRANULARITIES,
+)
+from ..stats_utils import record_photo_added, record_photo_removed, record_photo_moved, record_vault_added
+from ..receipt_utils import add_receipts_bulk, delete_receipt
+from ..search_index import index_documents, remove_documents, find_photos
+from ..storage import storage, resolve_key, release_photo_files
+from ..photo_utils import insert_photos
+from ..log_utils import log_sampled
+from ..auth_utils import get_current_user
 import os
-import uuid
+import asyncio
+import logging
 from typing import List
-from datetime import date as py_date
+from datetime import date as py_date, datetime
+
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter(
@@ -19,14 +39,16 @@ router = APIRouter(
     tags=["photos"],
 )
 
-UPLOAD_DIR = "uploads/photos"
-VAULT_DIR = "uploads/vault"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(VAULT_DIR, exist_ok=True)
+# Upload pipeline tuning
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 4))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 50))
+# Largest view of the shared decode each stage is given
+CLASSIFY_MAX_SIDE = 1024
+FACE_MAX_SIDE = 1920
 
 
-def auto_classify_image(file_path: str, filename: str) -> dict:
-    result = GroqClient.analyze_image(file_path)
+def auto_classify_image(image, filename: str) -> dict:
+    result = GroqClient.analyze_image(image, filename)
     if result:
         return result
     fname = filename.lower()
@@ -39,124 +61,247 @@ def auto_classify_image(file_path: str, filename: str) -> dict:
     return {"category": "General", "is_sensitive": False, "doc_type": "general"}
 
 
-def vault_file(original_path: str, original_filename: str, user_id: int, db: Session):
-    vault_filename = f"{uuid.uuid4()}_{original_filename}.enc"
-    vault_path = os.path.join(VAULT_DIR, vault_filename)
-    shutil.copy2(original_path, vault_path)
-    vault_entry = VaultFile(
-        user_id=user_id,
-        original_filename=original_filename,
-        encrypted_path=vault_path,
-        encryption_iv="auto_vault"
-    )
-    db.add(vault_entry)
+def _vision_image(ingested: IngestedFile):
+    """Downscaled JPEG of the shared decode for the vision model; the raw bytes if it is not a decodable image."""
+    try:
+        return ingested.image.jpeg(CLASSIFY_MAX_SIDE)
+    except Exception:
+        return ingested.data
+
+
+def _discard_staged(db: Session, entries: list[dict]):
+    """Delete the stored files of staged entries that were never written (content another row uses is kept)."""
+    release_photo_files(db, [(e["fields"]["path"], e["fields"]["thumbnail_path"]) for e in entries if e["kind"] == "photo"])
     db.commit()
-    print(f"[AUTO-VAULT] Sensitive document '{original_filename}' vaulted automatically.")
+    for e in entries:
+        if e["kind"] == "vault":
+            storage.delete(e["fields"]["encrypted_path"])
 
 
-@router.post("/upload")
-async def upload_photo(
-    files: List[UploadFile] = File(...),
-    user_id: int = Form(...),
-    db: Session = Depends(get_db)
-):
-    results = []
-    for file in files:
-        file_ext = file.filename.split(".")[-1].lower()
-        unique_filename = f"{uuid.uuid4()}.{file_ext}"
-        relative_path = f"photos/{unique_filename}"
-        absolute_path = os.path.join("uploads", relative_path)
+def _release_unwritten(files: list[tuple[str, str | None]]):
+    """_discard_staged for an upload that failed before it was staged (own session; blocking)."""
+    db = SessionLocal()
+    try:
+        release_photo_files(db, files)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _prepare_upload(file: UploadFile, user_id: int, budget: RequestBudget) -> dict:
+    """
+    Everything for one uploaded file except the DB write: ingest (one read of
+    the upload), metadata, AI classification, storing the file (photo store
+    or encrypted vault blob), thumbnail, face embeddings and receipt
+    extraction, all from the in-memory copy and a single decode of it.
+    Returns a staged entry for _save_upload_chunk.
+    """
+    with upload_stage("ingest"):
+        ingested = await asyncio.to_thread(ingest_upload, file.file, file.filename, budget, file.size)
+    try:
+        return await _classify_and_place(ingested, user_id)
+    finally:
+        ingested.discard()  # no-op once placed
+
+
+async def _classify_and_place(ingested: IngestedFile, user_id: int) -> dict:
+    filename = ingested.filename
+    # Classify from memory so sensitive documents never touch the photo store
+    # (served publicly via /static/uploads)
+    with upload_stage("metadata"):
+        metadata = await asyncio.to_thread(extract_media_metadata, ingested.stream(), filename)
+        metadata["mime_type"] = ingested.mime_type or metadata["mime_type"]
+        metadata["taken_at"] = capture_time(metadata["taken_at"])
 
-        with open(absolute_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    with upload_stage("decode"):
+        preview = await asyncio.to_thread(_vision_image, ingested)
+    try:
+        with upload_stage("classify"):
+            classification = await asyncio.to_thread(auto_classify_image, preview, filename)
+    except Exception as e:
+        logger.warning("Classification failed for %s: %s", filename, e)
+        classification = {"category": "General", "is_sensitive": False, "doc_type": "general"}
 
+    category = classification.get("category", "General")
+    is_sensitive = classification.get("is_sensitive", False)
+
+    # --- Auto-vault sensitive documents: one encrypted write, no photo copy ---
+    if is_sensitive:
+        with upload_stage("vault"):
+            fields = await asyncio.to_thread(encrypt_to_vault, ingested.stream(), filename, user_id, metadata["mime_type"])
+        return {"kind": "vault", "filename": filename, "category": category, "fields": fields}
+
+    with upload_stage("store"):
+        duplicate = not await asyncio.to_thread(ingested.store, "photos")
+
+    # Thumbnails are public like the photo itself, so never for vaulted documents
+    thumbnail_path = None
+    try:
         try:
-            classification = auto_classify_image(absolute_path, file.filename)
+            with upload_stage("thumbnail"):
+                thumbnail_path, made = await asyncio.to_thread(ingested.image.store_thumbnail)
+            duplicate = duplicate or not made
         except Exception as e:
-            print(f"[Classification error] {e}")
-            classification = {"category": "General", "is_sensitive": False, "doc_type": "general"}
+            logger.warning("Thumbnail failed for %s: %s", filename, e)
 
-        category = classification.get("category", "General")
-        is_sensitive = classification.get("is_sensitive", False)
+        clip_image = None
+        if image_embeddings.ENABLED:
+            try:
+                clip_image = await asyncio.to_thread(ingested.image.pil, image_embeddings.MAX_SIDE)
+            except Exception:
+                pass  # indexed from the stored file instead
 
         embeddings = []
         if category == "Person":
             try:
-                embeddings = FaceRecognitionService.generate_embedding(absolute_path)
+                with upload_stage("faces"):
+                    embeddings = await asyncio.to_thread(
+                        lambda: FaceRecognitionService.generate_embedding(ingested.image.bgr(FACE_MAX_SIDE))
+                    )
             except Exception as e:
-                print(f"[Embedding error] {e}")
+                logger.warning("Face embedding failed for %s: %s", filename, e)
 
-        new_photo = Photo(
+        # --- Auto-analyze receipt if classified as Receipt ---
+        receipt_data = None
+        if category == "Receipt":
+            try:
+                log_sampled(logger, "Analyzing receipt %s", ingested.key)
+                with upload_stage("receipt_analyze"):
+                    receipt_data = await asyncio.to_thread(ReceiptAnalyzer.analyze_receipt, ingested.data, filename)
+            except Exception as e:
+                logger.warning("Receipt analysis failed for %s: %s", filename, e)
+    except BaseException:
+        _release_unwritten([(ingested.key, thumbnail_path)])
+        raise
+
+    return {
+        "kind": "photo", "filename": filename, "category": category, "is_sensitive": is_sensitive,
+        "clip_image": clip_image, "receipt_data": receipt_data,
+        # Skipped writes are re-checked when the row is inserted (IngestedFile.restore)
+        "restore": ingested.detached() if duplicate else None,
+        "fields": dict(
             user_id=user_id,
-            path=relative_path,
-            filename=file.filename,
+            path=ingested.key,
+            thumbnail_path=thumbnail_path,
+            filename=filename,
             vector_embedding=embeddings if embeddings else None,
             category=category,
-            is_sensitive=is_sensitive
-        )
-        db.add(new_photo)
+            is_sensitive=is_sensitive,
+            description=classification.get("description"),
+            doc_type=classification.get("doc_type"),
+            **metadata
+        ),
+    }
+
+
+def _save_upload_chunk(db: Session, user_id: int, entries: list[dict]) -> list[dict]:
+    """
+    Write a chunk of staged uploads in one transaction: one multi-row INSERT
+    each for photos, vault files, receipts and receipt items, with counters
+    and timeline buckets bumped once per group. On failure the transaction is
+    rolled back and the chunk's files are deleted, so nothing is left in
+    storage without a row. Returns one result dict per entry, in order.
+    """
+    photos = [e for e in entries if e["kind"] == "photo"]
+    vaulted = [e for e in entries if e["kind"] == "vault"]
+    try:
+        photo_ids, vault_ids, receipts = [], {}, {}
+        if photos:
+            photo_ids = insert_photos(db, [e["fields"] for e in photos])
+            for e in photos:
+                if e["restore"]:
+                    e["restore"].restore(e["fields"]["thumbnail_path"])
+            by_category = {}
+            for e in photos:
+                count, size = by_category.get(e["category"], (0, 0))
+                by_category[e["category"]] = (count + 1, size + (e["fields"]["size_bytes"] or 0))
+            for category, (count, size) in by_category.items():
+                record_photo_added(db, user_id, category, size, count=count)
+            record_timeline_added_many(db, user_id, [e["fields"]["taken_at"] for e in photos])
+
+            with_receipts = [(pid, e["receipt_data"]) for pid, e in zip(photo_ids, photos) if e["receipt_data"]]
+            saved = add_receipts_bulk(db, user_id, with_receipts)
+            receipts = {pid: r for (pid, _), r in zip(with_receipts, saved)}
+        if vaulted:
+            db.execute(insert(VaultFile), [e["fields"] for e in vaulted])
+            enc_paths = [e["fields"]["encrypted_path"] for e in vaulted]
+            vault_ids = dict(db.query(VaultFile.encrypted_path, VaultFile.id).filter(
+                VaultFile.user_id == user_id, VaultFile.encrypted_path.in_(enc_paths)))
+            record_vault_added(db, user_id, sum(e["fields"]["size_bytes"] or 0 for e in vaulted), count=len(vaulted))
         db.commit()
-        db.refresh(new_photo)
-        results.append({
-            "id": new_photo.id,
-            "filename": file.filename,
-            "category": category,
-            "is_sensitive": is_sensitive
-        })
+    except Exception:
+        db.rollback()
+        _discard_staged(db, entries)
+        raise
 
-        # --- Auto-analyze receipt if classified as Receipt ---
-        if category == "Receipt":
-            try:
-                print(f"[Auto-Receipt] Analyzing receipt: {absolute_path}")
-                receipt_data = ReceiptAnalyzer.analyze_receipt(absolute_path)
-                if receipt_data:
-                    # Parse amounts
-                    def to_float(v):
-                        try:
-                            return float(str(v).replace("$", "").replace("₹", "").replace(",", "").strip())
-                        except Exception:
-                            return 0.0
-
-                    merchant    = receipt_data.get("Merchant Name") or "Unknown"
-                    raw_amount  = receipt_data.get("Total Amount") or receipt_data.get("amount") or 0
-                    raw_tax     = receipt_data.get("Tax Amount") or receipt_data.get("tax") or 0
-                    cat         = receipt_data.get("Category") or "General"
-                    raw_date    = receipt_data.get("Date")
-                    amount      = to_float(raw_amount)
-                    tax_val     = to_float(raw_tax)
-
-                    r_date = None
-                    if raw_date:
-                        try:
-                            r_date = py_date.fromisoformat(str(raw_date))
-                        except Exception:
-                            r_date = None
-
-                    new_receipt = Receipt(
-                        photo_id=new_photo.id,
-                        merchant=merchant,
-                        amount=amount,
-                        tax=tax_val,
-                        date=r_date,
-                        category=cat
-                    )
-                    db.add(new_receipt)
-                    db.commit()
-                    # Update result with extracted data
-                    results[-1]["receipt"] = {
-                        "merchant": merchant, "amount": amount, "tax": tax_val,
-                        "date": str(r_date) if r_date else None, "category": cat
-                    }
-                    print(f"[Auto-Receipt] Saved: {merchant} ₹{amount}")
-            except Exception as e:
-                print(f"[Auto-Receipt] Error: {e}")
+    index_documents(db, "photo", photo_ids)
+    index_documents(db, "receipt", [rid for rid, _ in receipts.values()])
+    index_documents(db, "vault", list(vault_ids.values()))
 
-        # --- Auto-vault sensitive documents ---
-        if is_sensitive:
-            try:
-                vault_file(absolute_path, file.filename, user_id, db)
-            except Exception as e:
-                print(f"[Auto-vault error] {e}")
+    results = []
+    photo_id = iter(photo_ids)
+    for e in entries:
+        if e["kind"] == "vault":
+            log_sampled(logger, "Sensitive upload from user %s vaulted automatically", user_id)
+            results.append({"filename": e["filename"], "category": e["category"], "is_sensitive": True,
+                            "vaulted": True, "vault_id": vault_ids[e["fields"]["encrypted_path"]]})
+            continue
+        pid = next(photo_id)
+        result = {"id": pid, "filename": e["filename"], "category": e["category"], "is_sensitive": e["is_sensitive"]}
+        if pid in receipts:
+            _, f = receipts[pid]
+            result["receipt"] = {"merchant": f["merchant"], "amount": f["amount"], "tax": f["tax"],
+                                 "date": str(f["date"]) if f["date"] else None, "category": f["category"]}
+        results.append(result)
+    return results
+
+
+@router.post("/upload")
+async def upload_photo(
+    files: List[UploadFile] = File(...),
+    user_id: int = Form(...),
+    db: AsyncDB = Depends(get_async_db)
+):
+    """
+    Files are prepared concurrently (UPLOAD_CONCURRENCY at a time, off the
+    event loop), then written UPLOAD_CHUNK_SIZE at a time, one transaction
+    per chunk. Files over MAX_UPLOAD_MB, or a request over
+    MAX_UPLOAD_REQUEST_MB in total, are rejected with 413.
+    """
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    budget = RequestBudget()
+
+    async def prepare(file: UploadFile):
+        async with semaphore:
+            return await _prepare_upload(file, user_id, budget)
+
+    staged = await asyncio.gather(*(prepare(f) for f in files), return_exceptions=True)
+    failed = [(f, e) for f, e in zip(files, staged) if isinstance(e, BaseException)]
+    if failed:
+        await db.run_in_thread(_discard_staged, [e for e in staged if isinstance(e, dict)])
+        # A size-limit rejection is the client's fault; report it ahead of other errors
+        file, error = next((f for f in failed if isinstance(f[1], UploadTooLarge)), failed[0])
+        if isinstance(error, UploadTooLarge):
+            logger.warning("Upload of %s rejected: %s", file.filename, error)
+            raise HTTPException(status_code=413, detail=f"'{file.filename}': {error}")
+        logger.error("Upload of %s failed", file.filename, exc_info=error)
+        raise HTTPException(status_code=500, detail=f"Could not store '{file.filename}'")
+
+    results = []
+    for start in range(0, len(staged), UPLOAD_CHUNK_SIZE):
+        chunk = staged[start:start + UPLOAD_CHUNK_SIZE]
+        try:
+            with upload_stage("db"):
+                results.extend(await db.run_in_thread(_save_upload_chunk, user_id, chunk))
+        except Exception:
+            # Earlier chunks are committed; drop the files of the ones never written
+            await db.run_in_thread(_discard_staged, staged[start + UPLOAD_CHUNK_SIZE:])
+            logger.exception("Upload chunk starting at file %d failed", start)
+            raise HTTPException(status_code=500, detail=f"Upload failed after {len(results)} file(s) were saved")
+        with upload_stage("index"):
+            await asyncio.to_thread(index_photo_files, user_id, [
+                (r["id"], e["clip_image"]) for r, e in zip(results[-len(chunk):], chunk) if e.get("clip_image")
+            ])
 
     return {"message": f"{len(results)} photo(s) uploaded successfully", "results": results}
 
@@ -171,7 +316,9 @@ def update_photo_category(photo_id: int, user_id: int, category: str, db: Sessio
         raise HTTPException(status_code=404, detail=f"Photo {photo_id} not found for user {user_id}")
     old_category = photo.category
     photo.category = category
+    record_photo_moved(db, user_id, old_category, category, photo.size_bytes or 0)
     db.commit()
+    index_documents(db, "photo", [photo_id])
     return {"message": f"Photo moved from '{old_category}' to '{category}'", "photo_id": photo_id}
 
 
@@ -181,36 +328,98 @@ def delete_photo(photo_id: int, user_id: int, db: Session = Depends(get_db)):
     photo = db.query(Photo).filter(Photo.id == photo_id, Photo.user_id == user_id).first()
     if not photo:
         raise HTTPException(status_code=404, detail=f"Photo {photo_id} not found")
-    # Delete file from disk
-    file_path = os.path.join("uploads", photo.path.replace("\\", "/"))
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    was_tagged = any(f.person_id for f in photo.faces)
+    receipt_id = photo.receipt.id if photo.receipt else None
+    if photo.receipt:
+        delete_receipt(db, photo.receipt, user_id)
+    record_photo_removed(db, user_id, photo.category, photo.size_bytes or 0, was_tagged=was_tagged)
+    record_timeline_removed(db, user_id, photo.taken_at)
     db.delete(photo)
+    # File and thumbnail go once no other photo row shares the content
+    release_photo_files(db, [(photo.path, photo.thumbnail_path)])
     db.commit()
+    remove_documents("photo", [photo_id])
+    remove_documents("receipt", [receipt_id])
+    vector_index.remove(user_id, [photo_id])
     return {"message": f"Photo #{photo_id} ('{photo.filename}') deleted successfully"}
 
 
+def serialize_photo(p: Photo) -> dict:
+    return {
+        "id": p.id,
+        "filename": p.filename,
+        "path": resolve_key(p.path),
+        "url": storage.url(p.path),
+        "thumbnail_path": p.thumbnail_path,
+        "thumbnail_url": storage.url(p.thumbnail_path) if p.thumbnail_path else None,
+        "category": p.category,
+        "is_sensitive": p.is_sensitive,
+        "size": p.size_bytes,
+        "width": p.width,
+        "height": p.height,
+        "mime_type": p.mime_type,
+        "taken_at": str(p.taken_at) if p.taken_at else None,
+        "created_at": str(p.created_at)
+    }
+
+
+@router.get("/timeline")
+def get_photo_timeline(
+    granularity: str = "month",
+    year: int = None,
+    month: int = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Photo counts per year/month/day of capture, read from the precomputed buckets."""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid granularity. Use one of: {', '.join(GRANULARITIES)}")
+    return {"granularity": granularity, "buckets": get_timeline(db, current_user.id, granularity, year, month)}
+
+
+@router.get("/range")
+def get_photos_in_range(
+    start: py_date = None,
+    end: py_date = None,
+    category: str = None,
+    before: datetime = None,
+    before_id: int = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Photos captured between `start` and `end` (inclusive), newest first.
+    Pass the last row's `taken_at`/`id` as `before`/`before_id` for the next page.
+    """
+    limit = max(1, min(limit, 500))
+    photos = photos_in_range(db, current_user.id, start, end, category, before, before_id, limit)
+    next_cursor = None
+    if len(photos) == limit:
+        last = photos[-1]
+        next_cursor = {"before": last.taken_at.isoformat(), "before_id": last.id}
+    return {"photos": [serialize_photo(p) for p in photos], "next": next_cursor}
+
+
+@router.get("/search")
+def search_photos(q: str, limit: int = 20, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """
+    Text-to-image search ("beach at sunset"). Ranked by CLIP similarity when
+    IMAGE_EMBEDDINGS is enabled, otherwise by the keyword index over
+    filenames, descriptions and tagged people.
+    """
+    mode, hits = find_photos(db, current_user.id, q, max(1, min(limit, 100)))
+    return {
+        "query": q,
+        "mode": mode,
+        "photos": [dict(serialize_photo(p), score=round(score, 4) if score is not None else None) for p, score in hits]
+    }
+
+
 @router.get("/")
 def get_photos(user_id: int, category: str = None, db: Session = Depends(get_db)):
     query = db.query(Photo).filter(Photo.user_id == user_id)
     if category:
         query = query.filter(Photo.category == category)
     photos = query.order_by(Photo.created_at.desc()).all()
-
-    def normalize_path(raw_path: str) -> str:
-        p = raw_path.replace("\\", "/")
-        if p.startswith("uploads/"):
-            p = p[len("uploads/"):]
-        return p
-
-    return [
-        {
-            "id": p.id,
-            "filename": p.filename,
-            "path": normalize_path(p.path),
-            "category": p.category,
-            "is_sensitive": p.is_sensitive,
-            "created_at": str(p.created_at)
-        }
-        for p in photos
-    ]
+    return [serialize_photo(p) for p in photos]
@@ -1,128 +1,301 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from ..database import get_db
+from ..database import get_db, get_async_db, AsyncDB, SessionLocal
 from ..models.receipt import Receipt
 from ..models.photo import Photo
 from ..auth_utils import get_current_user
 from ..ai_services.receipt_analyzer import ReceiptAnalyzer
-import shutil, os, uuid, json
+from ..media_utils import extract_media_metadata
+from ..ingest_utils import ingest_upload, IngestedFile, UploadTooLarge
+from ..storage import resolve_key, release_photo_files
+from ..timeline_utils import capture_time, record_timeline_added
+from ..stats_utils import record_photo_added, get_user_stats
+from ..search_index import index_documents, remove_documents
+from ..receipt_utils import (
+    save_receipt, save_receipts_bulk, delete_receipt as delete_receipt_rows, parse_receipt_data, list_receipts,
+    spend_breakdown, monthly_rollup, receipt_totals, uploaded_since_total, item_spend, top_items,
+    GROUPINGS,
+)
+from typing import List
+import os, json, asyncio, zipfile, contextlib, logging
 from datetime import date
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/receipts", tags=["receipts"])
-UPLOAD_DIR = "uploads/receipts"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Bulk import tuning
+IMPORT_CONCURRENCY = int(os.getenv("RECEIPT_IMPORT_CONCURRENCY", 4))
+IMPORT_CHUNK_SIZE = int(os.getenv("RECEIPT_IMPORT_CHUNK_SIZE", 25))
+IMPORT_MAX_FILE_BYTES = 20 * 1024 * 1024
+IMPORT_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif"}
+
+
+def _store_receipt_upload(src, size: int | None, filename: str) -> tuple[str, dict, dict, IngestedFile | None]:
+    """
+    Ingest the upload, analyze it and read its metadata from memory, then
+    store it (blocking; run in a thread). Returns (storage key, data,
+    metadata, the file to restore() on insert if its write was skipped as a
+    duplicate).
+    """
+    ingested = ingest_upload(src, filename, size=size)
+    try:
+        data = ReceiptAnalyzer.analyze_receipt(ingested.data, filename)
+        metadata = extract_media_metadata(ingested.stream(), filename)
+        duplicate = not ingested.store("receipts")
+    finally:
+        ingested.discard()
+    metadata["mime_type"] = ingested.mime_type or metadata["mime_type"]
+    metadata["taken_at"] = capture_time(metadata["taken_at"])
+    return ingested.key, data, metadata, ingested.detached() if duplicate else None
+
+
+def _save_analyzed_receipt(db: Session, user_id: int, relative_path: str, filename: str,
+                           metadata: dict, data: dict, restore: IngestedFile = None) -> dict:
+    """
+    Insert the receipt's photo row, receipt and line items in one transaction.
+    On failure the transaction is rolled back and the stored file released
+    (kept if another row uses the same content), as in _save_chunk.
+    """
+    try:
+        # Save Photo entry
+        new_photo = Photo(
+            user_id=user_id,
+            path=relative_path,
+            filename=filename,
+            category="Receipt",
+            is_sensitive=False,
+            **metadata
+        )
+        db.add(new_photo)
+        record_photo_added(db, user_id, "Receipt", new_photo.size_bytes)
+        record_timeline_added(db, user_id, new_photo.taken_at)
+        db.flush()
+        if restore:
+            restore.restore()
+
+        # Parse & save Receipt (+ line items)
+        new_receipt = save_receipt(db, new_photo.id, user_id, data)
+        db.commit()
+    except Exception:
+        db.rollback()
+        release_photo_files(db, [(relative_path, None)])
+        db.commit()
+        raise
+    index_documents(db, "photo", [new_photo.id])
+    index_documents(db, "receipt", [new_receipt.id])
+    return {
+        "id": new_receipt.id,
+        "merchant": new_receipt.merchant,
+        "amount": new_receipt.amount,
+        "tax": new_receipt.tax,
+        "date": str(new_receipt.date) if new_receipt.date else None,
+        "category": new_receipt.category,
+    }
 
 
 @router.post("/analyze")
 async def analyze_receipt(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncDB = Depends(get_async_db),
     current_user=Depends(get_current_user)
 ):
-    file_ext = file.filename.split(".")[-1].lower()
-    filename = f"{uuid.uuid4()}.{file_ext}"
-    relative_path = f"receipts/{filename}"
-    file_path = os.path.join("uploads", relative_path)
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # AI analysis
-    data = ReceiptAnalyzer.analyze_receipt(file_path)
-
-    # Save Photo entry
-    new_photo = Photo(
-        user_id=current_user.id,
-        path=relative_path,
-        filename=file.filename,
-        category="Receipt",
-        is_sensitive=False
-    )
-    db.add(new_photo)
-    db.commit()
-    db.refresh(new_photo)
-
-    # Parse & save Receipt
-    merchant = None
-    amount = None
-    tax = None
-    receipt_date = None
-    category = "General"
-
-    if data:
-        merchant = data.get("Merchant Name") or data.get("merchant") or "Unknown"
-        raw_amount = data.get("Total Amount") or data.get("amount") or data.get("total") or 0
-        raw_tax   = data.get("Tax Amount")   or data.get("tax")    or 0
-        category  = data.get("Category")     or data.get("category") or "General"
-        raw_date  = data.get("Date")         or data.get("date")
-
-        def to_float(v):
-            try:
-                return float(str(v).replace("$", "").replace("₹", "").replace(",", "").strip())
-            except:
-                return 0.0
-
-        amount = to_float(raw_amount)
-        tax    = to_float(raw_tax)
-
-        if raw_date:
-            try:
-                receipt_date = date.fromisoformat(str(raw_date))
-            except:
-                receipt_date = None
-
-    new_receipt = Receipt(
-        photo_id=new_photo.id,
-        merchant=merchant or "Unknown",
-        amount=amount or 0.0,
-        tax=tax or 0.0,
-        date=receipt_date,
-        category=category
-    )
-    db.add(new_receipt)
-    db.commit()
+    # AI analysis and DB writes run off the event loop
+    try:
+        relative_path, data, metadata, restore = await asyncio.to_thread(
+            _store_receipt_upload, file.file, file.size, file.filename)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    receipt = await db.run_in_thread(_save_analyzed_receipt, current_user.id, relative_path, file.filename,
+                                     metadata, data, restore)
 
     return {
         "message": "Receipt analyzed and saved",
         "receipt": {
-            "id": new_receipt.id,
-            "merchant": new_receipt.merchant,
-            "amount": new_receipt.amount,
-            "tax": new_receipt.tax,
-            "date": str(new_receipt.date) if new_receipt.date else None,
-            "category": new_receipt.category,
-            "photo_path": relative_path
+            **receipt,
+            "photo_path": relative_path,
+            "items": [{"name": i["name"], "price": i["price"]} for i in parse_receipt_data(data)["items"]]
         }
     }
 
 
+def _import_entries(files: List[UploadFile]) -> list[tuple]:
+    """
+    (name, size, opener) for every file in the upload (blocking; run in a
+    thread). ZIP archives are read member by member straight from the upload
+    spool, never extracted; only their directories are parsed here.
+    """
+    entries = []
+    for file in files:
+        if zipfile.is_zipfile(file.file):
+            file.file.seek(0)
+            archive = zipfile.ZipFile(file.file)
+            for info in archive.infolist():
+                base = os.path.basename(info.filename)
+                if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                entries.append((info.filename, info.file_size, lambda info=info, archive=archive: archive.open(info)))
+        else:
+            file.file.seek(0, os.SEEK_END)
+            size = file.file.tell()
+            file.file.seek(0)
+            entries.append((file.filename, size, lambda file=file: contextlib.nullcontext(file.file)))
+    return entries
+
+
+def _spool_entry(name: str, size: int, opener) -> IngestedFile:
+    """Ingest one import entry into a staging file; its bytes stay in memory for analysis."""
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    if ext not in IMPORT_EXTENSIONS:
+        raise ValueError("Unsupported file type")
+    with opener() as src:
+        ingested = ingest_upload(src, name, size=size, max_bytes=IMPORT_MAX_FILE_BYTES)
+    if not (ingested.mime_type or "").startswith("image/"):
+        ingested.discard()
+        raise ValueError("Not an image")
+    return ingested
+
+
+def _analyze_entry(name: str, ingested: IngestedFile) -> dict:
+    try:
+        data = ReceiptAnalyzer.analyze_receipt(ingested.data, name)
+        if not data:
+            raise ValueError("Receipt could not be analyzed")
+        metadata = extract_media_metadata(ingested.stream(), name)
+        duplicate = not ingested.store("receipts")
+    finally:
+        ingested.discard()
+    metadata["mime_type"] = ingested.mime_type or metadata["mime_type"]
+    metadata["taken_at"] = capture_time(metadata["taken_at"])
+    return {"name": name, "path": ingested.key, "filename": os.path.basename(name)[:255],
+            "metadata": metadata, "data": data, "restore": ingested.detached() if duplicate else None}
+
+
+def _save_chunk(db: Session, user_id: int, entries: list[dict]) -> list[int]:
+    try:
+        ids = save_receipts_bulk(db, user_id, entries)
+        for e in entries:
+            if e["restore"]:
+                e["restore"].restore()
+        db.commit()
+    except Exception:
+        db.rollback()
+        release_photo_files(db, [(e["path"], None) for e in entries])
+        db.commit()
+        raise
+    index_documents(db, "receipt", ids)
+    index_documents(db, "photo", [pid for (pid,) in db.query(Receipt.photo_id).filter(Receipt.id.in_(ids))])
+    return ids
+
+
+def _ndjson(line: dict) -> str:
+    return json.dumps(line, default=str) + "\n"
+
+
+@router.post("/import")
+async def import_receipts(
+    files: List[UploadFile] = File(...),
+    current_user=Depends(get_current_user)
+):
+    """
+    Bulk import receipt images, uploaded individually and/or as ZIP archives.
+
+    Up to RECEIPT_IMPORT_CONCURRENCY vision calls run at once; analyzed receipts
+    are written RECEIPT_IMPORT_CHUNK_SIZE at a time (one INSERT per table per
+    chunk). The response is NDJSON: an "analyzed"/"saved"/"skipped"/"error"
+    line per file as it happens, then a final "done" summary.
+    """
+    user_id = current_user.id
+
+    async def stream():
+        db = SessionLocal()
+        pending, ready = set(), []
+        summary = {"imported": 0, "skipped": 0, "failed": 0}
+
+        def collect(done) -> list[str]:
+            lines = []
+            for task in done:
+                name = task.get_name()
+                try:
+                    entry = task.result()
+                except Exception as e:
+                    summary["failed"] += 1
+                    lines.append(_ndjson({"file": name, "status": "error", "detail": str(e)}))
+                    continue
+                ready.append(entry)
+                fields = parse_receipt_data(entry["data"])
+                lines.append(_ndjson({"file": name, "status": "analyzed", "merchant": fields["merchant"],
+                                      "amount": fields["amount"], "date": fields["date"]}))
+            return lines
+
+        async def flush() -> list[str]:
+            chunk = ready[:]
+            ready.clear()
+            try:
+                ids = await asyncio.to_thread(_save_chunk, db, user_id, chunk)
+            except Exception:
+                logger.exception("Receipt import chunk of %d failed", len(chunk))
+                summary["failed"] += len(chunk)
+                return [_ndjson({"file": entry["name"], "status": "error", "detail": "Could not save receipt"})
+                        for entry in chunk]
+            summary["imported"] += len(ids)
+            return [_ndjson({"file": entry["name"], "status": "saved", "receipt_id": rid})
+                    for entry, rid in zip(chunk, ids)]
+
+        try:
+            for name, size, opener in await asyncio.to_thread(_import_entries, files):
+                while len(pending) >= IMPORT_CONCURRENCY:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for line in collect(done):
+                        yield line
+                if len(ready) >= IMPORT_CHUNK_SIZE:
+                    for line in await flush():
+                        yield line
+
+                try:
+                    ingested = await asyncio.to_thread(_spool_entry, name, size, opener)
+                except (ValueError, zipfile.BadZipFile, OSError) as e:
+                    summary["skipped"] += 1
+                    yield _ndjson({"file": name, "status": "skipped", "detail": str(e)})
+                    continue
+                pending.add(asyncio.create_task(asyncio.to_thread(_analyze_entry, name, ingested), name=name))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for line in collect(done):
+                    yield line
+                if len(ready) >= IMPORT_CHUNK_SIZE:
+                    for line in await flush():
+                        yield line
+            if ready:
+                for line in await flush():
+                    yield line
+            yield _ndjson({"status": "done", **summary})
+        finally:
+            for task in pending:
+                task.cancel()
+            db.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @router.get("/")
-def get_receipts(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    """Return all receipts for the current user with their photo paths."""
-    receipts = (
-        db.query(Receipt, Photo)
-        .join(Photo, Receipt.photo_id == Photo.id)
-        .filter(Photo.user_id == current_user.id)
-        .order_by(Receipt.id.desc())
-        .all()
-    )
-    total = sum(r.amount or 0 for r, _ in receipts)
-    today = date.today()
-    this_month_start = today.replace(day=1)
-    
-    # Use upload date (photo.created_at) for "This Month" spending to match user expectation of "Recent Activity"
-    # regardless of the actual date on the receipt (which might be old or parsed incorrectly)
-    month_total = sum(
-        r.amount or 0 for r, p in receipts
-        if p.created_at.date() >= this_month_start
-    )
+def get_receipts(
+    limit: int = 50,
+    offset: int = 0,
+    category: str = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Return one page of the current user's receipts plus SQL-computed totals."""
+    limit = max(1, min(limit, 200))
+    page = list_receipts(db, current_user.id, limit=limit, offset=offset, category=category)
+    stats = get_user_stats(db, current_user.id)
 
-    def normalize(path: str) -> str:
-        p = path.replace("\\", "/")
-        if p.startswith("uploads/"):
-            p = p[len("uploads/"):]
-        return p
+    # Use upload date (receipt.created_at) for "This Month" spending to match user expectation of "Recent Activity"
+    # regardless of the actual date on the receipt (which might be old or parsed incorrectly)
+    this_month_start = date.today().replace(day=1)
 
     return {
         "receipts": [
@@ -133,13 +306,77 @@ def get_receipts(db: Session = Depends(get_db), current_user=Depends(get_current
                 "tax": r.tax or 0,
                 "date": str(r.date) if r.date else None,
                 "category": r.category or "General",
-                "photo_path": normalize(p.path)
+                "photo_path": resolve_key(path) if path else None
             }
-            for r, p in receipts
+            for r, path in page
         ],
-        "total_all_time": round(total, 2),
-        "total_this_month": round(month_total, 2),
-        "count": len(receipts)
+        "total_all_time": round(stats.receipt_total or 0, 2),
+        "total_this_month": uploaded_since_total(db, current_user.id, this_month_start),
+        "count": stats.receipt_count,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if len(page) == limit else None
+    }
+
+
+@router.get("/analytics")
+def get_receipt_analytics(
+    group_by: str = "category",
+    start: date = None,
+    end: date = None,
+    year: int = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Spend totals grouped by category, merchant, month or week, computed in SQL.
+    Unfiltered month views are served from the materialized monthly rollup.
+    """
+    if group_by not in GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by. Use one of: {', '.join(GROUPINGS)}")
+    if group_by == "month" and start is None and end is None:
+        groups = monthly_rollup(db, current_user.id, year=year)
+    else:
+        groups = spend_breakdown(db, current_user.id, group_by, start, end, max(1, min(limit, 1000)))
+    return {
+        "group_by": group_by,
+        "summary": receipt_totals(db, current_user.id, start, end),
+        "groups": groups
+    }
+
+
+@router.get("/items/top")
+def get_top_items(
+    start: date = None,
+    end: date = None,
+    order_by: str = "spend",
+    limit: int = 10,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Most-bought line items by total spend (or purchase count with order_by=count)."""
+    return {"items": top_items(db, current_user.id, start, end, order_by, max(1, min(limit, 100)))}
+
+
+@router.get("/items/spend")
+def get_item_spend(
+    name: str,
+    group_by: str = "month",
+    start: date = None,
+    end: date = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Spend over time on an item (prefix match on its normalized name, e.g. 'milk')."""
+    if group_by not in ("month", "week"):
+        raise HTTPException(status_code=400, detail="Invalid group_by. Use one of: month, week")
+    periods = item_spend(db, current_user.id, name, group_by, start, end)
+    return {
+        "item": name,
+        "group_by": group_by,
+        "total": round(sum(p["total"] for p in periods), 2),
+        "periods": periods
     }
 
 
@@ -150,6 +387,7 @@ def delete_receipt(receipt_id: int, db: Session = Depends(get_db), current_user=
     ).first()
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
-    db.delete(receipt)
+    delete_receipt_rows(db, receipt, current_user.id)
     db.commit()
+    remove_documents("receipt", [receipt_id])
     return {"message": "Deleted"}
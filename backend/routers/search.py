@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException
+from ..auth_utils import get_current_user
+from ..search_index import search, KINDS
+from datetime import date
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+)
+
+
+@router.get("/")
+def search_library(
+    q: str = None,
+    kind: str = None,
+    category: str = None,
+    start: date = None,
+    end: date = None,
+    min_amount: float = None,
+    max_amount: float = None,
+    limit: int = 20,
+    offset: int = 0,
+    current_user=Depends(get_current_user)
+):
+    """
+    Search photos, receipts, vault files and people. `q` matches filenames,
+    image descriptions, merchants, receipt items and person names (every word,
+    as a prefix); `kind` is a comma-separated subset of photo,receipt,vault,person.
+    """
+    kinds = [k.strip() for k in kind.split(",") if k.strip()] if kind else None
+    if kinds and any(k not in KINDS for k in kinds):
+        raise HTTPException(status_code=400, detail=f"Invalid kind. Use any of: {', '.join(KINDS)}")
+    limit = max(1, min(limit, 100))
+    results = search(current_user.id, q, kinds=kinds, category=category, start=start, end=end,
+                     min_amount=min_amount, max_amount=max_amount, limit=limit, offset=max(offset, 0))
+    return {
+        "query": q,
+        "results": results,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if len(results) == limit else None
+    }
@@ -1,36 +1,35 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from ..database import get_db
-from ..models.photo import Photo
-from ..models.vault import VaultFile
-from ..models.receipt import Receipt
-from ..models.person import Person
-from ..models.face import Face
 from ..auth_utils import get_current_user
+from ..stats_utils import get_user_stats, CATEGORY_BYTE_COLUMNS
 
 router = APIRouter(
     prefix="/stats",
     tags=["stats"],
 )
 
+GB = 1024 ** 3
+
 @router.get("/")
 def get_dashboard_stats(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    user_id = current_user.id
-    
-    total_photos = db.query(Photo).filter(Photo.user_id == user_id).count()
-    total_vault_items = db.query(VaultFile).filter(VaultFile.user_id == user_id).count()
-    total_receipts = db.query(Receipt).join(Photo).filter(Photo.user_id == user_id).count()
-    total_people = db.query(Person).filter(Person.user_id == user_id).count()
-    
-    # Mock storage usage since we aren't tracking file sizes in DB yet (or sum if we add size column)
-    # Assuming avg 2MB per photo
-    storage_used_mb = (total_photos * 2) + (total_vault_items * 1.5)
-    
+    # Single primary-key lookup on the incrementally maintained counters
+    stats = get_user_stats(db, current_user.id)
+    storage_used = (stats.photo_bytes or 0) + (stats.vault_bytes or 0)
+
     return {
-        "total_photos": total_photos,
-        "total_vault": total_vault_items,
-        "total_receipts": total_receipts,
-        "total_people": total_people,
-        "storage_used_gb": round(storage_used_mb / 1024, 2),
+        "total_photos": stats.photo_count,
+        "total_vault": stats.vault_count,
+        "total_receipts": stats.receipt_count,
+        "total_people": stats.people_count,
+        "tagged_photos": stats.tagged_photo_count,
+        "total_spent": round(stats.receipt_total or 0, 2),
+        "storage_used_gb": round(storage_used / GB, 2),
+        "storage_used_bytes": storage_used,
+        "storage_by_category": {
+            category: getattr(stats, column) or 0
+            for category, column in CATEGORY_BYTE_COLUMNS.items()
+        },
+        "vault_bytes": stats.vault_bytes or 0,
         "storage_limit_gb": 10 # Free tier limit
     }
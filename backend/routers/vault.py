@@ -1,13 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_db, get_async_db, AsyncDB
 from ..models.vault import VaultFile
 from ..auth_utils import verify_password # Use hash check or similar
-import shutil
 import os
-import uuid
+import asyncio
 from pydantic import BaseModel
 from ..auth_utils import get_current_user
+from ..stats_utils import record_vault_added
+from ..search_index import index_documents
+from ..storage import storage, vault_key
+from ..vault_crypto import (
+    encrypt_stream, decrypt_range, read_header, plaintext_size, unwrap_key, VaultDecryptionError, VaultKeyError,
+)
+import mimetypes
+import logging
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/vault",
@@ -34,38 +44,57 @@ def verify_pin(
         raise HTTPException(status_code=403, detail="Invalid PIN")
 
 
-VAULT_DIR = "uploads/vault"
-os.makedirs(VAULT_DIR, exist_ok=True)
+def encrypt_to_vault(src, original_filename: str, user_id: int, mime_type: str = None) -> dict:
+    """
+    Encrypt the binary stream `src` chunk-by-chunk into the vault store and
+    return the VaultFile column values. Memory use is one chunk.
+    """
+    key = vault_key()
+    with storage.writer(key) as buffer:
+        info = encrypt_stream(src, buffer, user_id)
+    return {
+        "user_id": user_id,
+        "original_filename": original_filename,
+        "encrypted_path": key,
+        "encryption_iv": info["nonce_prefix"],
+        "wrapped_key": info["wrapped_key"],
+        "size_bytes": info["size_bytes"],
+        "mime_type": mime_type or mimetypes.guess_type(original_filename)[0],
+    }
+
+
+def save_vault_file(db: Session, fields: dict) -> int:
+    """Insert an encrypted file's row and bookkeeping, commit, and index it. Returns its id."""
+    try:
+        vault_entry = VaultFile(**fields)
+        db.add(vault_entry)
+        record_vault_added(db, fields["user_id"], vault_entry.size_bytes)
+        db.commit()
+    except Exception:
+        db.rollback()
+        storage.delete(fields["encrypted_path"])
+        raise
+    index_documents(db, "vault", [vault_entry.id])
+    return vault_entry.id
+
 
 @router.post("/upload")
 async def upload_to_vault(
     file: UploadFile = File(...),
     pin: str = Form(...), # User's DOB-based PIN
     user_id: int = 1,
-    db: Session = Depends(get_db)
+    db: AsyncDB = Depends(get_async_db)
 ):
     # 1. Verify PIN (hash check against user's stored hash?)
-    # For prototype, we assume PIN is correct key for encryption
-    
-    # 2. Encrypt file
-    # Mock encryption: rename to .enc
-    file_ext = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{file_ext}.enc"
-    file_path = os.path.join(VAULT_DIR, filename)
-    
-    # Real app: use cryptography.fernet or AES with Key derived from PIN
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    new_vault_file = VaultFile(
-        user_id=user_id,
-        original_filename=file.filename,
-        encrypted_path=file_path,
-        encryption_iv="mock_iv"
-    )
-    db.add(new_vault_file)
-    db.commit()
-    
+    # For prototype, the PIN gates the UI; files are encrypted under the user's vault key
+
+    # 2. Stream-encrypt straight from the upload spool into the vault store (off the event loop)
+    try:
+        fields = await asyncio.to_thread(encrypt_to_vault, file.file, file.filename, user_id, file.content_type)
+    except VaultKeyError as e:
+        raise HTTPException(status_code=503, detail=f"Vault is not configured: {e}")
+    await db.run_in_thread(save_vault_file, fields)
+
     return {"message": "File encrypted and vaulted"}
 
 
@@ -80,30 +109,106 @@ def get_vault_files(
             "id": f.id,
             "filename": f.original_filename,
             "created_at": f.created_at,
-            "size": os.path.getsize(f.encrypted_path) if os.path.exists(f.encrypted_path) else 0
+            "size": f.size_bytes or 0,
+            "mime_type": f.mime_type
         }
         for f in files
     ]
 
 
-from fastapi.responses import FileResponse, StreamingResponse
-import mimetypes
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+
+def iter_file(f, chunk_size: int = 64 * 1024):
+    try:
+        while chunk := f.read(chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
+
+def parse_range(header: str, size: int):
+    """Parse a single `bytes=start-end` range. Returns (start, end) inclusive, or None if absent/invalid."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the final N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
 
 @router.get("/{file_id}/content")
 def get_vault_content(
     file_id: int,
+    request: Request,
     user_id: int = 1,
     db: Session = Depends(get_db)
 ):
     vf = db.query(VaultFile).filter(VaultFile.id == file_id, VaultFile.user_id == user_id).first()
-    if not vf or not os.path.exists(vf.encrypted_path):
+    if not vf or not storage.exists(vf.encrypted_path):
         raise HTTPException(status_code=404, detail="File not found")
-    
-    # In real app: decrypt here. 
-    # For now, just serve the file but set correct content-type
-    mime_type, _ = mimetypes.guess_type(vf.original_filename)
-    return FileResponse(
-        vf.encrypted_path,
+
+    mime_type = vf.mime_type or mimetypes.guess_type(vf.original_filename)[0]
+    if not vf.wrapped_key:
+        # Legacy plaintext entry (pre-encryption); run backend/migrate_vault.py to encrypt it
+        legacy = storage.open(vf.encrypted_path)
+        return StreamingResponse(
+            iter_file(legacy),
+            media_type=mime_type or "application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(vf.original_filename)}"}
+        )
+
+    try:
+        file_key = unwrap_key(vf.wrapped_key, user_id)
+    except VaultKeyError as e:
+        raise HTTPException(status_code=503, detail=f"Vault is not configured: {e}")
+
+    src = storage.open(vf.encrypted_path)
+    try:
+        _, chunk_size, _ = read_header(src)
+        src.seek(0, os.SEEK_END)
+        size = plaintext_size(src.tell(), chunk_size)
+        byte_range = parse_range(request.headers.get("range"), size)
+    except VaultDecryptionError as e:
+        src.close()
+        logger.error("Vault file %s is unreadable: %s", file_id, e)
+        raise HTTPException(status_code=500, detail="Vault file failed its integrity check")
+    except HTTPException:
+        src.close()
+        raise
+    start, end = byte_range or (0, size - 1)
+
+    def body():
+        try:
+            yield from decrypt_range(src, file_key, start, end)
+        except VaultDecryptionError as e:
+            logger.error("Decryption failed for vault file %s: %s", file_id, e)
+            raise
+        finally:
+            src.close()
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(max(end - start + 1, 0)),
+        "Content-Disposition": f"attachment; filename*=utf-8''{quote(vf.original_filename)}",
+    }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        body(),
+        status_code=206 if byte_range else 200,
         media_type=mime_type or "application/octet-stream",
-        filename=vf.original_filename
+        headers=headers
     )
@@ -0,0 +1,293 @@
+"""
+Full-text + structured search over photos, receipts, vault files and people.
+
+The index is a SQLite FTS5 sidecar (SEARCH_INDEX_PATH, default
+./search_index.db) so it works the same on MySQL and SQLite deployments:
+
+    documents      one row per (kind, ref_id): owner, title/body text and
+                   the structured fields filtered on (category, date, amount)
+    documents_fts  FTS5 external-content index over documents.title/body,
+                   kept in sync by triggers
+
+Ingest paths call `index_documents` / `remove_documents` after their commit;
+a document is rebuilt from the main database each time, so re-indexing is
+idempotent. Index failures are logged and never fail the request — drift is
+repaired with `rebuild_search_index` (backend/rebuild_stats.py does this).
+"""
+import os
+import re
+import logging
+import sqlite3
+import threading
+from datetime import date, datetime
+from sqlalchemy.orm import Session
+from .models.photo import Photo
+from .models.receipt import Receipt
+from .models.receipt_item import ReceiptItem
+from .models.vault import VaultFile
+from .models.person import Person
+from .models.face import Face
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index.db")
+KINDS = ("photo", "receipt", "vault", "person")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ref_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    title TEXT,
+    body TEXT,
+    category TEXT,
+    doc_date TEXT,
+    amount REAL,
+    path TEXT,
+    UNIQUE (kind, ref_id)
+);
+CREATE INDEX IF NOT EXISTS ix_documents_user_kind_date ON documents (user_id, kind, doc_date);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, body, content='documents', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    INSERT INTO documents_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+"""
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(INDEX_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _conn = conn
+    return _conn
+
+
+def _text(*parts) -> str:
+    return " ".join(str(p) for p in parts if p)
+
+
+def _day(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat()
+
+
+# ─── Document builders (read from the main database) ─────────────────────────
+def _photo_docs(db: Session, ids: list[int]) -> list[dict]:
+    people = {}
+    for photo_id, name in (
+        db.query(Face.photo_id, Person.name).join(Person, Face.person_id == Person.id)
+        .filter(Face.photo_id.in_(ids)).distinct()
+    ):
+        people.setdefault(photo_id, []).append(name)
+    return [
+        {"kind": "photo", "ref_id": p.id, "user_id": p.user_id, "title": p.filename,
+         "body": _text(p.description, (p.doc_type or "").replace("_", " "), p.category,
+                       p.camera_make, p.camera_model, *people.get(p.id, [])),
+         "category": p.category, "doc_date": _day(p.taken_at or p.created_at), "amount": None, "path": p.path}
+        for p in db.query(Photo).filter(Photo.id.in_(ids))
+    ]
+
+
+def _receipt_docs(db: Session, ids: list[int]) -> list[dict]:
+    items = {}
+    for receipt_id, name in db.query(ReceiptItem.receipt_id, ReceiptItem.name).filter(ReceiptItem.receipt_id.in_(ids)):
+        items.setdefault(receipt_id, []).append(name)
+    return [
+        {"kind": "receipt", "ref_id": r.id, "user_id": r.user_id, "title": r.merchant,
+         "body": _text(r.merchant_normalized, (r.merchant_normalized or "").replace(" ", ""),
+                       r.category, *items.get(r.id, [])),
+         "category": r.category, "doc_date": _day(r.date or r.created_at), "amount": r.amount, "path": path}
+        for r, path in db.query(Receipt, Photo.path).outerjoin(Photo, Receipt.photo_id == Photo.id)
+        .filter(Receipt.id.in_(ids))
+    ]
+
+
+def _vault_docs(db: Session, ids: list[int]) -> list[dict]:
+    # Filenames only: vault contents are encrypted and never indexed
+    return [
+        {"kind": "vault", "ref_id": f.id, "user_id": f.user_id, "title": f.original_filename,
+         "body": _text(f.mime_type), "category": "Vault", "doc_date": _day(f.created_at),
+         "amount": None, "path": None}
+        for f in db.query(VaultFile).filter(VaultFile.id.in_(ids))
+    ]
+
+
+def _person_docs(db: Session, ids: list[int]) -> list[dict]:
+    return [
+        {"kind": "person", "ref_id": p.id, "user_id": p.user_id, "title": p.name, "body": "person",
+         "category": "Person", "doc_date": _day(p.created_at), "amount": None, "path": None}
+        for p in db.query(Person).filter(Person.id.in_(ids))
+    ]
+
+
+BUILDERS = {"photo": _photo_docs, "receipt": _receipt_docs, "vault": _vault_docs, "person": _person_docs}
+
+
+# ─── Incremental updates ──────────────────────────────────────────────────────
+def _upsert(conn: sqlite3.Connection, docs: list[dict]):
+    conn.executemany(
+        "INSERT INTO documents (kind, ref_id, user_id, title, body, category, doc_date, amount, path) "
+        "VALUES (:kind, :ref_id, :user_id, :title, :body, :category, :doc_date, :amount, :path) "
+        "ON CONFLICT (kind, ref_id) DO UPDATE SET user_id = excluded.user_id, title = excluded.title, "
+        "body = excluded.body, category = excluded.category, doc_date = excluded.doc_date, "
+        "amount = excluded.amount, path = excluded.path",
+        docs,
+    )
+
+
+def index_documents(db: Session, kind: str, ids: list[int]):
+    """(Re)index the given rows of `kind` from the main database. Call after commit."""
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return
+    try:
+        docs = [d for d in BUILDERS[kind](db, ids) if d["user_id"] is not None]
+        with _lock:
+            conn = _connection()
+            with conn:
+                _upsert(conn, docs)
+    except Exception as e:
+        logger.warning("Could not index %s %s: %s", kind, ids, e)
+
+
+def remove_documents(kind: str, ids: list[int]):
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return
+    try:
+        with _lock:
+            conn = _connection()
+            with conn:
+                conn.executemany("DELETE FROM documents WHERE kind = ? AND ref_id = ?", [(kind, i) for i in ids])
+    except Exception as e:
+        logger.warning("Could not remove %s %s: %s", kind, ids, e)
+
+
+# ─── Queries ──────────────────────────────────────────────────────────────────
+def _match_expression(q: str) -> str | None:
+    """Every word must match, as a prefix: 'dm milk' -> '"dm"* "milk"*'."""
+    tokens = re.findall(r"\w+", (q or "").lower())
+    return " ".join(f'"{t}"*' for t in tokens) or None
+
+
+def search(user_id: int, q: str = None, kinds: list[str] = None, category: str = None,
+           start: date = None, end: date = None, min_amount: float = None, max_amount: float = None,
+           limit: int = 20, offset: int = 0) -> list[dict]:
+    """
+    Ranked full-text matches for `q` (all words, prefix match; title hits
+    weigh more), narrowed by structured filters. Without `q`, returns the
+    filtered documents newest first.
+    """
+    where, params = ["d.user_id = ?"], [user_id]
+    if kinds:
+        where.append(f"d.kind IN ({', '.join('?' for _ in kinds)})")
+        params.extend(kinds)
+    if category:
+        where.append("d.category = ?")
+        params.append(category)
+    if start is not None:
+        where.append("d.doc_date >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        where.append("d.doc_date <= ?")
+        params.append(end.isoformat())
+    if min_amount is not None:
+        where.append("d.amount >= ?")
+        params.append(min_amount)
+    if max_amount is not None:
+        where.append("d.amount <= ?")
+        params.append(max_amount)
+
+    columns = "d.kind, d.ref_id, d.title, d.category, d.doc_date, d.amount, d.path"
+    match = _match_expression(q)
+    if match:
+        sql = (f"SELECT {columns}, snippet(documents_fts, 1, '[', ']', '…', 12) "
+               f"FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+               f"WHERE documents_fts MATCH ? AND {' AND '.join(where)} "
+               f"ORDER BY bm25(documents_fts, 10.0, 1.0) LIMIT ? OFFSET ?")
+        params = [match, *params]
+    else:
+        sql = (f"SELECT {columns}, NULL FROM documents d WHERE {' AND '.join(where)} "
+               f"ORDER BY d.doc_date DESC, d.id DESC LIMIT ? OFFSET ?")
+    params.extend([limit, offset])
+
+    with _lock:
+        rows = _connection().execute(sql, params).fetchall()
+    return [
+        {"kind": kind, "id": ref_id, "title": title, "category": cat, "date": doc_date,
+         "amount": amount, "path": path, "snippet": snippet}
+        for kind, ref_id, title, cat, doc_date, amount, path, snippet in rows
+    ]
+
+
+# ─── Full rebuild ─────────────────────────────────────────────────────────────
+def _owned_ids(db: Session, user_id: int) -> dict:
+    return {
+        "photo": [i for (i,) in db.query(Photo.id).filter(Photo.user_id == user_id)],
+        "receipt": [i for (i,) in db.query(Receipt.id).filter(Receipt.user_id == user_id)],
+        "vault": [i for (i,) in db.query(VaultFile.id).filter(VaultFile.user_id == user_id)],
+        "person": [i for (i,) in db.query(Person.id).filter(Person.user_id == user_id)],
+    }
+
+
+def verify_search_index(db: Session, user_id: int) -> dict:
+    """Return {kind: (indexed, actual)} for every kind whose document count differs."""
+    with _lock:
+        indexed = dict(_connection().execute(
+            "SELECT kind, COUNT(*) FROM documents WHERE user_id = ? GROUP BY kind", (user_id,)
+        ).fetchall())
+    return {
+        kind: (indexed.get(kind, 0), len(ids))
+        for kind, ids in _owned_ids(db, user_id).items()
+        if indexed.get(kind, 0) != len(ids)
+    }
+
+
+def rebuild_search_index(db: Session, user_id: int, batch_size: int = 500):
+    """Drop and re-create every document of the user from the main database."""
+    docs = []
+    for kind, ids in _owned_ids(db, user_id).items():
+        for i in range(0, len(ids), batch_size):
+            docs.extend(d for d in BUILDERS[kind](db, ids[i:i + batch_size]) if d["user_id"] is not None)
+    with _lock:
+        conn = _connection()
+        with conn:
+            conn.execute("DELETE FROM documents WHERE user_id = ?", (user_id,))
+            _upsert(conn, docs)
+
+
+# ─── Photo retrieval (semantic first, keyword fallback) ───────────────────────
+def find_photos(db: Session, user_id: int, q: str, limit: int = 20) -> tuple[str, list[tuple[Photo, float | None]]]:
+    """
+    Photos matching a free-text description, best first. Uses the CLIP vector
+    index when image embeddings are enabled ("semantic"), otherwise the
+    full-text index ("keyword"). Returns (mode, [(photo, score)]).
+    """
+    from .ai_services.image_embeddings import semantic_photo_search
+
+    hits = semantic_photo_search(user_id, q, limit)
+    mode = "semantic"
+    if hits is None:
+        mode = "keyword"
+        hits = [(d["id"], None) for d in search(user_id, q, kinds=["photo"], limit=limit)]
+    photos = {p.id: p for p in db.query(Photo).filter(Photo.user_id == user_id, Photo.id.in_([i for i, _ in hits]))}
+    return mode, [(photos[i], score) for i, score in hits if i in photos]
@@ -0,0 +1,185 @@
+"""
+Incrementally maintained per-user dashboard counters.
+
+Every write path (upload, delete, category move, vault, receipts, people and
+tagging) calls one of the `record_*` helpers *before* its own commit, so the
+counter update lands in the same transaction as the change it describes.
+Deltas are applied with a single `UPDATE user_stats SET col = col + :delta`
+and only touch rows that already exist; a user without a row gets one built
+from scratch by `get_user_stats` on their first dashboard read.
+"""
+import os
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models.user_stats import UserStats
+from .models.photo import Photo
+from .models.vault import VaultFile
+from .models.receipt import Receipt
+from .models.person import Person
+from .models.face import Face
+
+CATEGORY_BYTE_COLUMNS = {
+    "Person": "person_bytes",
+    "Receipt": "receipt_bytes",
+    "Document": "document_bytes",
+    "Note": "note_bytes",
+    "General": "general_bytes",
+}
+
+STAT_FIELDS = [
+    "photo_count", "vault_count", "receipt_count", "people_count", "tagged_photo_count",
+    "photo_bytes", "vault_bytes",
+    *CATEGORY_BYTE_COLUMNS.values(),
+    "receipt_total", "receipt_tax_total",
+]
+
+
+def file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def category_bytes_column(category: str) -> str:
+    return CATEGORY_BYTE_COLUMNS.get(category or "General", "general_bytes")
+
+
+def apply_stats_delta(db: Session, user_id: int, **deltas):
+    """Add `deltas` to the user's counters. Does not commit."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas or user_id is None:
+        return
+    values = {getattr(UserStats, k): getattr(UserStats, k) + v for k, v in deltas.items()}
+    db.query(UserStats).filter(UserStats.user_id == user_id).update(values, synchronize_session=False)
+
+
+# ─── Write-path helpers ───────────────────────────────────────────────────────
+def record_photo_added(db: Session, user_id: int, category: str, size_bytes: int, count: int = 1):
+    apply_stats_delta(db, user_id, photo_count=count, photo_bytes=size_bytes,
+                      **{category_bytes_column(category): size_bytes})
+
+
+def record_photo_removed(db: Session, user_id: int, category: str, size_bytes: int, was_tagged: bool = False):
+    apply_stats_delta(db, user_id, photo_count=-1, photo_bytes=-size_bytes,
+                      tagged_photo_count=-1 if was_tagged else 0,
+                      **{category_bytes_column(category): -size_bytes})
+
+
+def record_photo_moved(db: Session, user_id: int, old_category: str, new_category: str, size_bytes: int):
+    old_col, new_col = category_bytes_column(old_category), category_bytes_column(new_category)
+    if old_col != new_col:
+        apply_stats_delta(db, user_id, **{old_col: -size_bytes, new_col: size_bytes})
+
+
+def record_vault_added(db: Session, user_id: int, size_bytes: int, count: int = 1):
+    apply_stats_delta(db, user_id, vault_count=count, vault_bytes=size_bytes)
+
+
+def record_receipt_added(db: Session, user_id: int, amount: float, tax: float, count: int = 1):
+    apply_stats_delta(db, user_id, receipt_count=count, receipt_total=amount or 0.0, receipt_tax_total=tax or 0.0)
+
+
+def record_receipt_removed(db: Session, user_id: int, amount: float, tax: float):
+    apply_stats_delta(db, user_id, receipt_count=-1,
+                      receipt_total=-(amount or 0.0), receipt_tax_total=-(tax or 0.0))
+
+
+def record_person_added(db: Session, user_id: int):
+    apply_stats_delta(db, user_id, people_count=1)
+
+
+def record_person_removed(db: Session, user_id: int, person_id: int):
+    # Photos tagged only with this person become untagged once their faces are released
+    photo_ids = {pid for (pid,) in db.query(Face.photo_id).filter(Face.person_id == person_id) if pid}
+    still_tagged = {
+        pid for (pid,) in db.query(Face.photo_id).filter(
+            Face.photo_id.in_(photo_ids), Face.person_id.isnot(None), Face.person_id != person_id
+        ).distinct()
+    } if photo_ids else set()
+    apply_stats_delta(db, user_id, people_count=-1, tagged_photo_count=-len(photo_ids - still_tagged))
+
+
+def record_photos_tagged(db: Session, user_id: int, newly_tagged: int):
+    apply_stats_delta(db, user_id, tagged_photo_count=newly_tagged)
+
+
+# ─── Full recompute ───────────────────────────────────────────────────────────
+def compute_user_stats(db: Session, user_id: int) -> dict:
+    """Recompute every counter from the source tables (the slow path)."""
+    stats = {field: 0 for field in STAT_FIELDS}
+
+    for category, count, size in (
+        db.query(Photo.category, func.count(Photo.id), func.coalesce(func.sum(Photo.size_bytes), 0))
+        .filter(Photo.user_id == user_id)
+        .group_by(Photo.category)
+    ):
+        stats["photo_count"] += count
+        stats["photo_bytes"] += int(size)
+        stats[category_bytes_column(category)] += int(size)
+
+    count, size = (
+        db.query(func.count(VaultFile.id), func.coalesce(func.sum(VaultFile.size_bytes), 0))
+        .filter(VaultFile.user_id == user_id)
+        .one()
+    )
+    stats["vault_count"] = count or 0
+    stats["vault_bytes"] = int(size)
+
+    count, total, tax = (
+        db.query(func.count(Receipt.id), func.sum(Receipt.amount), func.sum(Receipt.tax))
+        .join(Photo, Receipt.photo_id == Photo.id)
+        .filter(Photo.user_id == user_id)
+        .one()
+    )
+    stats["receipt_count"] = count or 0
+    stats["receipt_total"] = round(total or 0.0, 2)
+    stats["receipt_tax_total"] = round(tax or 0.0, 2)
+
+    stats["people_count"] = db.query(func.count(Person.id)).filter(Person.user_id == user_id).scalar() or 0
+    stats["tagged_photo_count"] = (
+        db.query(func.count(func.distinct(Face.photo_id)))
+        .join(Photo, Face.photo_id == Photo.id)
+        .filter(Photo.user_id == user_id, Face.person_id.isnot(None))
+        .scalar() or 0
+    )
+    return stats
+
+
+def rebuild_user_stats(db: Session, user_id: int) -> UserStats:
+    """Recompute and store the user's counters. Commits."""
+    values = compute_user_stats(db, user_id)
+    row = db.get(UserStats, user_id)
+    if row is None:
+        row = UserStats(user_id=user_id)
+        db.add(row)
+    for field, value in values.items():
+        setattr(row, field, value)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request materialized the row first; keep theirs.
+        db.rollback()
+        row = db.get(UserStats, user_id)
+    return row
+
+
+def verify_user_stats(db: Session, user_id: int) -> dict:
+    """Return {field: (stored, actual)} for every counter that has drifted."""
+    row = db.get(UserStats, user_id)
+    actual = compute_user_stats(db, user_id)
+    drift = {}
+    for field, value in actual.items():
+        stored = getattr(row, field) if row is not None else None
+        if stored is None or abs((stored or 0) - value) > 0.01:
+            drift[field] = (stored, value)
+    return drift
+
+
+def get_user_stats(db: Session, user_id: int) -> UserStats:
+    """Primary-key lookup, materializing the row on first use."""
+    row = db.get(UserStats, user_id)
+    if row is None:
+        row = rebuild_user_stats(db, user_id)
+    return row
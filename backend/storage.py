@@ -0,0 +1,243 @@
+"""
+Where uploaded files live.
+
+Rows store a storage key, never a filesystem path. A key is a '/'-separated
+path relative to the store, e.g. "photos/ab/cd/<sha256>.jpg". Everything
+that reads, writes, deletes or links to a file goes through `storage` and
+`resolve_key()`. STORAGE_BACKEND picks the backend:
+
+- local (default): files under STORAGE_ROOT ("uploads"), served by the API
+  at /static/uploads/<key>.
+- s3: an S3-compatible bucket via boto3 (STORAGE_S3_BUCKET, optional
+  STORAGE_S3_PREFIX). Set STORAGE_S3_ENDPOINT to use MinIO or another local
+  stand-in. Links are STORAGE_PUBLIC_URL/<key> if set, presigned otherwise;
+  /static/uploads/<key> redirects there.
+
+Photos, receipts and thumbnails are content-addressed. content_key() builds
+the key from the SHA-256 computed at ingest, sharded two levels deep
+(<kind>/ab/cd/<hash><ext>). A million files then spread over 65,536
+directories of ~15 entries each, and every lookup is a direct stat, never a
+scan. Identical uploads share one stored file (and thumbnails are shared
+across extensions, being keyed by hash alone), so photo files are deleted
+through release_photo_files(), which keeps any file another row still uses.
+Deletes and duplicate uploads meet in the database: the deleter locks the
+rows that could reference the key, and an upload that skipped its write as
+a duplicate re-checks the file inside its insert transaction
+(IngestedFile.restore()), so one of them always sees the other.
+Vault blobs are encrypted per upload and get random sharded keys
+(vault_key()).
+
+Rows written before this keep their flat keys ("photos/<uuid>.jpg").
+resolve_key() also accepts the older stored forms, so no path fix-up
+migration is needed: Windows separators, an "uploads/" prefix, and vault
+rows that stored "uploads/vault/<uuid>.enc".
+"""
+import os
+import uuid
+import shutil
+import logging
+import tempfile
+import posixpath
+from contextlib import contextmanager
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+STORAGE_ROOT = os.getenv("STORAGE_ROOT", "uploads")
+STATIC_PREFIX = "/static/uploads"
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_key(raw: str) -> str:
+    """Canonical storage key for any stored path form. Raises ValueError for keys escaping the store."""
+    key = str(raw).replace("\\", "/").lstrip("/")
+    if key.startswith(STORAGE_ROOT.rstrip("/") + "/"):
+        key = key[len(STORAGE_ROOT.rstrip("/")) + 1:]
+    elif key.startswith("uploads/"):
+        key = key[len("uploads/"):]
+    key = posixpath.normpath(key)
+    if key in ("", ".") or key == ".." or key.startswith("../"):
+        raise ValueError(f"Invalid storage key: {raw!r}")
+    return key
+
+
+def content_key(kind: str, sha256: str, ext: str = "") -> str:
+    """Sharded key for content with this hash, e.g. photos/ab/cd/abcd....jpg."""
+    ext = ext.lower().lstrip(".")
+    return f"{kind}/{sha256[:2]}/{sha256[2:4]}/{sha256}{'.' + ext if ext else ''}"
+
+
+def vault_key() -> str:
+    name = uuid.uuid4().hex
+    return f"vault/{name[:2]}/{name[2:4]}/{name}.enc"
+
+
+class LocalStorage:
+    def __init__(self, root: str = STORAGE_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *resolve_key(key).split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.path(key))
+
+    def put_file(self, key: str, src_path: str):
+        """Move a local (staging) file to `key`."""
+        dest = self.path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.replace(src_path, dest)
+        except OSError:
+            shutil.move(src_path, dest)  # staging dir on another filesystem
+
+    def put_bytes(self, key: str, data: bytes):
+        dest = self.path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dest)
+
+    @contextmanager
+    def writer(self, key: str):
+        """Binary file to stream into `key`; removed if the block raises."""
+        dest = self.path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            with open(dest, "wb") as f:
+                yield f
+        except BaseException:
+            if os.path.exists(dest):
+                os.remove(dest)
+            raise
+
+    def open(self, key: str):
+        return open(self.path(key), "rb")
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def local_file(self, key: str):
+        """A filesystem path for libraries that need one."""
+        yield self.path(key)
+
+    def url(self, key: str) -> str:
+        return f"{STATIC_PREFIX}/{resolve_key(key)}"
+
+
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = None, public_url: str = None):
+        import boto3  # only needed with STORAGE_BACKEND=s3
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.public_url = public_url.rstrip("/") if public_url else None
+
+    def _object(self, key: str) -> str:
+        return self.prefix + resolve_key(key)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object(key))
+            return True
+        except ClientError:
+            return False
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self._object(key))["ContentLength"]
+
+    def put_file(self, key: str, src_path: str):
+        self.client.upload_file(src_path, self.bucket, self._object(key))
+        os.remove(src_path)
+
+    def put_bytes(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._object(key), Body=data)
+
+    @contextmanager
+    def writer(self, key: str):
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as f:
+            yield f
+            f.seek(0)
+            self.client.upload_fileobj(f, self.bucket, self._object(key))
+
+    def open(self, key: str):
+        """Seekable copy of the object (spooled to disk past 8 MB)."""
+        f = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        self.client.download_fileobj(self.bucket, self._object(key), f)
+        f.seek(0)
+        return f
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object(key))
+
+    @contextmanager
+    def local_file(self, key: str):
+        suffix = posixpath.splitext(key)[1]
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                self.client.download_fileobj(self.bucket, self._object(key), f)
+            yield path
+        finally:
+            os.remove(path)
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{self._object(key)}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._object(key)},
+            ExpiresIn=int(os.getenv("STORAGE_URL_TTL", 3600)),
+        )
+
+
+def _create_storage():
+    if STORAGE_BACKEND == "s3":
+        return S3Storage(
+            bucket=os.environ["STORAGE_S3_BUCKET"],
+            prefix=os.getenv("STORAGE_S3_PREFIX", ""),
+            endpoint_url=os.getenv("STORAGE_S3_ENDPOINT") or None,
+            public_url=os.getenv("STORAGE_PUBLIC_URL") or None,
+        )
+    return LocalStorage(STORAGE_ROOT)
+
+
+storage = _create_storage()
+IS_LOCAL = isinstance(storage, LocalStorage)
+
+
+def release_photo_files(db, files: list[tuple[str, str | None]]):
+    """
+    Delete the stored files and thumbnails of photo rows, given as
+    (path, thumbnail_path), that no remaining row references as either.
+    Call inside the transaction that deletes the rows, after the delete and
+    before commit: the reference check is a SELECT ... FOR UPDATE over the
+    path indexes, so a concurrent insert of the same content either commits
+    first and is seen here, or waits for this transaction and then puts the
+    file back (IngestedFile.restore()). Also used to clean up after a failed
+    insert, with nothing to delete; commit or roll back afterwards to drop
+    the locks.
+    """
+    from .models.photo import Photo
+
+    keys = {resolve_key(key) for pair in files for key in pair if key}
+    if not keys:
+        return
+    db.flush()
+    # Rows may hold the same key in an older form; those predate content addressing and are never shared
+    in_use = {key for (key,) in db.query(Photo.path).filter(Photo.path.in_(keys)).with_for_update()}
+    in_use |= {key for (key,) in db.query(Photo.thumbnail_path).filter(Photo.thumbnail_path.in_(keys)).with_for_update()}
+    for key in sorted(keys - in_use):
+        try:
+            storage.delete(key)
+        except Exception as e:
+            logger.warning("Could not delete %s: %s", key, e)
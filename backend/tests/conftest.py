@@ -0,0 +1,74 @@
+"""
+Shared fixtures. Tests run against a throwaway SQLite database, so no MySQL
+is needed:
+
+    python -m pytest backend/tests
+"""
+import os
+import pkgutil
+import importlib
+import tempfile
+
+# Before anything imports backend.database, which reads these at import time
+_workdir = tempfile.mkdtemp(prefix="personalens-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    SEARCH_INDEX_PATH=os.path.join(_workdir, "search_index.db"),
+    VECTOR_INDEX_DIR=os.path.join(_workdir, "vector_index"),
+    INGEST_TMP_DIR=os.path.join(_workdir, "ingest_tmp"),
+    STORAGE_ROOT=os.path.join(_workdir, "uploads"),
+    VAULT_MASTER_KEY="test-vault-master-key",
+)
+
+import pytest
+from backend import models
+from backend.database import Base, engine, SessionLocal
+from backend.models.user import User
+from backend.models.photo import Photo
+
+for _module in pkgutil.iter_modules(models.__path__):
+    importlib.import_module(f"backend.models.{_module.name}")  # register every mapper
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    for table in reversed(Base.metadata.sorted_tables):
+        session.execute(table.delete())
+    session.commit()
+    session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    def make(email: str = "owner@example.com") -> int:
+        row = User(email=email)
+        db.add(row)
+        db.commit()
+        return row.id
+    return make
+
+
+@pytest.fixture
+def make_photos(db):
+    """Stage photo rows for a user and return their ids (in order)."""
+    def make(user_id: int, count: int = 1, **fields) -> list[int]:
+        rows = [
+            Photo(user_id=user_id, **{"path": f"photos/test/{user_id}-{i}-{os.urandom(4).hex()}.jpg",
+                                      "filename": f"IMG_{i:04d}.jpg", "category": "General",
+                                      "is_sensitive": False, **fields})
+            for i in range(count)
+        ]
+        db.add_all(rows)
+        db.flush()
+        return [row.id for row in rows]
+    return make
@@ -0,0 +1,67 @@
+"""The verified-token -> user snapshot cache (backend/auth_utils.py)."""
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+from backend import auth_utils
+from backend.auth_utils import create_access_token, forget_user, get_current_user
+from backend.models.user import User
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    forget_user()
+    yield
+    forget_user()
+
+
+def token_for(user_id: int, email: str = "owner@example.com", minutes: int = 30) -> str:
+    return create_access_token({"sub": email, "user_id": user_id}, expires_delta=timedelta(minutes=minutes))
+
+
+def rename(db, user_id: int, name: str):
+    db.query(User).filter(User.id == user_id).update({User.full_name: name})
+    db.commit()
+
+
+def test_snapshot_is_served_from_cache_until_forgotten(db, make_user):
+    uid = make_user()
+    token = token_for(uid)
+    assert get_current_user(token, db).id == uid
+
+    rename(db, uid, "Renamed")
+    assert get_current_user(token, db).full_name is None  # cached
+    forget_user(uid)
+    assert get_current_user(token, db).full_name == "Renamed"
+
+
+def test_entries_expire_after_the_ttl(db, make_user, monkeypatch):
+    uid = make_user()
+    token = token_for(uid)
+    clock = [1_000_000.0]
+    monkeypatch.setattr(auth_utils.time, "time", lambda: clock[0])
+    get_current_user(token, db)
+
+    rename(db, uid, "Renamed")
+    clock[0] += auth_utils.USER_CACHE_TTL + 1
+    assert get_current_user(token, db).full_name == "Renamed"
+
+
+def test_cache_is_lru_bounded(db, make_user, monkeypatch):
+    monkeypatch.setattr(auth_utils, "USER_CACHE_SIZE", 2)
+    uid = make_user()
+    tokens = [token_for(uid, minutes=m) for m in (10, 20, 30)]
+    for token in tokens:
+        get_current_user(token, db)
+    assert list(auth_utils._user_cache) == tokens[1:]
+
+
+def test_deleted_user_and_foreign_tokens_are_rejected(db, make_user):
+    uid = make_user()
+    with pytest.raises(HTTPException):
+        get_current_user(token_for(uid, email="someone@example.com"), db)  # id reused by another email
+    with pytest.raises(HTTPException):
+        get_current_user("not-a-token", db)
+    db.query(User).filter(User.id == uid).delete()
+    db.commit()
+    with pytest.raises(HTTPException):
+        get_current_user(token_for(uid), db)
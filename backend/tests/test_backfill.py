@@ -0,0 +1,132 @@
+"""Resumable backfill of derived photo data (backend/backfill.py)."""
+import io
+import json
+import pytest
+from PIL import Image
+from backend import backfill
+from backend.ai_services.groq_client import GroqClient
+from backend.models.photo import Photo
+from backend.storage import storage
+
+
+def jpeg(color) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (32, 24), color).save(out, "JPEG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def photos(db, make_user, make_photos):
+    """Five stored photos of one user; returns their ids."""
+    uid = make_user()
+    ids = []
+    for i in range(5):
+        key = f"photos/backfill/{i}.jpg"
+        storage.put_bytes(key, jpeg((i * 40, 0, 0)))
+        ids += make_photos(uid, 1, path=key, filename=f"{i}.jpg")
+    db.commit()
+    return ids
+
+
+@pytest.fixture
+def classified(monkeypatch):
+    """Stub the vision model; records the photos it was asked about."""
+    seen = []
+
+    def analyze_image(image, filename):
+        seen.append(filename)
+        return {"description": f"about {filename}"}
+
+    monkeypatch.setattr(GroqClient, "analyze_image", staticmethod(analyze_image))
+    return seen
+
+
+def run(checkpoint, **kwargs) -> int:
+    return backfill.run(["classify"], batch_size=2, workers=2, checkpoint_path=str(checkpoint), **kwargs)
+
+
+def test_a_completed_run_updates_every_photo_and_drops_its_checkpoint(db, photos, classified, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    assert run(checkpoint) == 0
+    assert sorted(classified) == [f"{i}.jpg" for i in range(5)]
+    assert not checkpoint.exists()
+    assert {d for (d,) in db.query(Photo.description)} == {f"about {i}.jpg" for i in range(5)}
+
+
+def test_an_interrupted_run_resumes_after_the_last_committed_batch(db, photos, classified, tmp_path, monkeypatch):
+    checkpoint = tmp_path / "checkpoint.json"
+    stub = GroqClient.analyze_image
+
+    def interrupted(image, filename):
+        if filename == "2.jpg":
+            raise KeyboardInterrupt
+        return stub(image, filename)
+
+    monkeypatch.setattr(GroqClient, "analyze_image", staticmethod(interrupted))
+    with pytest.raises(KeyboardInterrupt):
+        run(checkpoint)
+    saved = json.loads(checkpoint.read_text())
+    assert (saved["last_id"], saved["processed"], saved["updated"]) == (photos[1], 2, 2)
+
+    monkeypatch.setattr(GroqClient, "analyze_image", staticmethod(stub))
+    classified.clear()
+    assert run(checkpoint) == 0
+    assert sorted(classified) == ["2.jpg", "3.jpg", "4.jpg"]
+    assert not checkpoint.exists()
+
+
+def test_a_checkpoint_from_another_run_is_refused_unless_restarted(photos, classified, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(json.dumps({"stages": ["exif"], "user_id": None, "last_id": photos[2],
+                                      "processed": 3, "updated": 0, "failed": 0}))
+    with pytest.raises(SystemExit):
+        run(checkpoint)
+    assert run(checkpoint, restart=True) == 0
+    assert len(classified) == 5
+
+
+def test_failed_photos_are_kept_and_retried(db, photos, classified, tmp_path, monkeypatch):
+    checkpoint = tmp_path / "checkpoint.json"
+    stub = GroqClient.analyze_image
+    flaky = {"1.jpg", "3.jpg"}
+
+    def analyze_image(image, filename):
+        if filename in flaky:
+            return None  # no answer from the model
+        return stub(image, filename)
+
+    monkeypatch.setattr(GroqClient, "analyze_image", staticmethod(analyze_image))
+    assert run(checkpoint) == 1
+    saved = json.loads(checkpoint.read_text())
+    assert saved["failed_ids"] == [photos[1], photos[3]] and saved["complete"]
+    assert {d for (d,) in db.query(Photo.description).filter(Photo.id.in_([photos[1], photos[3]]))} == {None}
+    assert run(checkpoint) == 1  # a completed run is not silently redone
+
+    # The retry only looks at the failures; one still fails, then the other is deleted
+    flaky.discard("1.jpg")
+    classified.clear()
+    assert run(checkpoint, retry_failed=True) == 1
+    assert sorted(classified) == ["1.jpg"]
+    assert json.loads(checkpoint.read_text())["failed_ids"] == [photos[3]]
+
+    db.query(Photo).filter(Photo.id == photos[3]).delete()
+    db.commit()
+    assert run(checkpoint, retry_failed=True) == 0
+    assert not checkpoint.exists()
+
+
+def test_receipt_and_vault_moves_are_held_for_review(db, photos, tmp_path, monkeypatch, capsys):
+    answers = {"0.jpg": {"category": "Receipt", "description": "a bill"},
+               "1.jpg": {"is_sensitive": True, "description": "a passport"},
+               "2.jpg": {"category": "Nature", "description": "a tree"}}
+    monkeypatch.setattr(GroqClient, "analyze_image",
+                        staticmethod(lambda image, filename: answers.get(filename, {"description": "other"})))
+    assert run(tmp_path / "checkpoint.json") == 0
+
+    rows = {p.id: p for p in db.query(Photo)}
+    assert (rows[photos[0]].category, rows[photos[0]].description) == ("General", "a bill")
+    assert (rows[photos[1]].is_sensitive, rows[photos[1]].description) == (False, "a passport")
+    assert rows[photos[2]].category == "Nature"  # an ordinary move is applied
+    out = capsys.readouterr().out
+    assert f"photo {photos[0]}: category General -> Receipt" in out
+    assert f"photo {photos[1]}: is_sensitive False -> True" in out
@@ -0,0 +1,60 @@
+"""Face embedding matching and clustering primitives (backend/face_matching.py)."""
+import json
+import numpy as np
+import pytest
+from backend.face_matching import (
+    DIM, BruteForceIndex, IVFIndex, cluster_faces, decode_embeddings, encode_embedding, normalize,
+)
+
+
+def people(count: int, faces_each: int, noise: float = 0.01, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Embeddings of `count` synthetic people, `faces_each` noisy faces apiece, and their person labels.
+
+    `noise` is per dimension: 0.01 keeps a person's faces at ~0.95 similarity.
+    """
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((count, DIM)))
+    labels = np.repeat(np.arange(count), faces_each)
+    return normalize(centers[labels] + noise * rng.standard_normal((len(labels), DIM))), labels
+
+
+def test_stored_encodings_decode_to_normalised_rows():
+    vector = np.arange(1, DIM + 1, dtype=np.float32)
+    expected = vector / np.linalg.norm(vector)
+    decoded = decode_embeddings([encode_embedding(vector), json.dumps(vector.tolist()), vector.tolist(), None, [1.0]])
+    for row in decoded[:3]:
+        np.testing.assert_allclose(row, expected, rtol=1e-6)
+    assert not decoded[3:].any()  # placeholders and malformed rows match nothing
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+def test_brute_force_finds_each_face_itself(dtype):
+    vectors, _ = people(20, 3)
+    index = BruteForceIndex(dtype=dtype)
+    index.add(np.arange(100, 160), vectors)
+    for i, vector in enumerate(vectors):
+        (best, score), *_ = index.search(vector, k=3)
+        assert best == 100 + i and score == pytest.approx(1.0, abs=1e-2)
+    assert BruteForceIndex().search(vectors[0]) == []
+
+
+def test_ivf_recall_against_brute_force():
+    vectors, _ = people(50, 4, noise=0.03)
+    exact, approx = BruteForceIndex(), IVFIndex(nprobe=4)
+    exact.add(np.arange(len(vectors)), vectors)
+    approx.add(np.arange(len(vectors)), vectors)
+    hits = sum(
+        len({i for i, _ in exact.search(q, 4)} & {i for i, _ in approx.search(q, 4)})
+        for q in vectors[::5]
+    )
+    assert hits / (4 * len(vectors[::5])) >= 0.9
+    # Probing every cell is exact
+    assert approx.search(vectors[7], 4, nprobe=approx.nlist) == pytest.approx(exact.search(vectors[7], 4))
+
+
+def test_clusters_follow_people():
+    vectors, labels = people(6, 5)
+    clusters = cluster_faces(vectors, block=7)  # blocks that cut across people
+    assert len(set(clusters)) == 6
+    for person in range(6):
+        assert len(set(clusters[labels == person])) == 1
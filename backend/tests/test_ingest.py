@@ -0,0 +1,71 @@
+"""Single-pass streaming upload ingestion (backend/ingest_utils.py)."""
+import hashlib
+import io
+import os
+import pytest
+from backend import ingest_utils
+from backend.ingest_utils import RequestBudget, UploadTooLarge, ingest_upload, sniff_mime
+from backend.storage import storage
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 60
+
+
+@pytest.fixture(autouse=True)
+def staging_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_utils, "INGEST_TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest_utils, "INGEST_CHUNK_BYTES", 16)  # force several chunks
+    return tmp_path
+
+
+@pytest.mark.parametrize("head, mime", [
+    (JPEG, "image/jpeg"),
+    (PNG, "image/png"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+    (b"\x00\x00\x00\x18ftypheic", "image/heic"),
+    (b"%PDF-1.7", "application/pdf"),
+    (b"<html>", None),
+])
+def test_sniff_mime(head, mime):
+    assert sniff_mime(head[:16]) == mime
+
+
+def test_one_pass_hashes_counts_and_sniffs(staging_dir):
+    ingested = ingest_upload(io.BytesIO(JPEG), "a.jpg")
+    assert (ingested.size_bytes, ingested.data) == (len(JPEG), JPEG)
+    assert ingested.sha256 == hashlib.sha256(JPEG).hexdigest()
+    assert ingested.mime_type == "image/jpeg"
+    with open(ingested.path, "rb") as f:
+        assert f.read() == JPEG
+
+    assert ingested.store("photos")
+    ingested.discard()  # a stored file belongs to the store
+    with storage.open(ingested.key) as f:
+        assert f.read() == JPEG
+    assert os.listdir(staging_dir) == []
+
+    duplicate = ingest_upload(io.BytesIO(JPEG), "b.jpg")
+    assert not duplicate.store("photos")  # same content, same key: the staged copy is dropped
+    assert duplicate.key == ingested.key
+    assert os.listdir(staging_dir) == []
+
+
+def test_discard_removes_the_staging_file(staging_dir):
+    ingest_upload(io.BytesIO(PNG), "a.png").discard()
+    assert os.listdir(staging_dir) == []
+
+
+def test_file_limit_is_checked_up_front_and_while_streaming(staging_dir):
+    with pytest.raises(UploadTooLarge):
+        ingest_upload(io.BytesIO(b""), "declared.jpg", size=100, max_bytes=50)
+    with pytest.raises(UploadTooLarge):
+        ingest_upload(io.BytesIO(JPEG), "actual.jpg", max_bytes=50)
+    assert os.listdir(staging_dir) == []
+
+
+def test_request_budget_is_shared_across_files(staging_dir):
+    budget = RequestBudget(limit=100)
+    ingest_upload(io.BytesIO(JPEG), "a.jpg", budget).discard()
+    with pytest.raises(UploadTooLarge, match="Upload exceeds"):
+        ingest_upload(io.BytesIO(PNG), "b.png", budget)
+    assert os.listdir(staging_dir) == []
@@ -0,0 +1,86 @@
+"""Receipt field normalization and merchant canonicalization (backend/normalize_utils.py)."""
+from datetime import date
+import pytest
+from backend import normalize_utils
+from backend.normalize_utils import (
+    MerchantIndex, forget_merchants, merchant_index, normalize_category, parse_amount, parse_receipt_date,
+)
+from backend.receipt_utils import save_receipt, spend_breakdown
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    forget_merchants()
+    yield
+    forget_merchants()
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("₹1,23,456.50", 123456.5),
+    ("Rs. 1.234,50", 1234.5),
+    ("12,50", 12.5),
+    ("1,234", 1234.0),
+    ("(12.00)", -12.0),
+    ("$ 7", 7.0),
+    (12, 12.0),
+    ("n/a", 0.0),
+    (None, 0.0),
+])
+def test_parse_amount(raw, expected):
+    assert parse_amount(raw) == expected
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("2024-03-05", date(2024, 3, 5)),
+    ("05/03/2024", date(2024, 3, 5)),
+    ("03/25/2024", date(2024, 3, 25)),   # day-first impossible, falls back to MDY
+    ("5th Mar, 2024", date(2024, 3, 5)),
+    ("March 5 2024", date(2024, 3, 5)),
+    ("01/01/1850", None),
+    ("soon", None),
+])
+def test_parse_receipt_date(raw, expected):
+    assert parse_receipt_date(raw) == expected
+
+
+def test_normalize_category():
+    assert normalize_category("Groceries") == "Food"
+    assert normalize_category("Something odd") == "General"
+    assert normalize_category(None) == "General"
+
+
+def test_merchant_spellings_share_one_key():
+    index = MerchantIndex()
+    key, _ = index.resolve("DMart")
+    assert index.resolve("D-Mart")[0] == key
+    assert index.resolve("DMART Ltd")[0] == key
+    assert index.resolve("Reliance Fresh")[0] != key
+
+
+def test_known_category_fills_in_general():
+    index = MerchantIndex()
+    index.resolve("Cafe Coffee Day", "Food")
+    assert index.resolve("Cafe Coffee Day Pvt Ltd", "General") == ("cafe coffee day", "Food")
+
+
+def test_saved_receipts_group_on_canonical_merchant(db, make_user, make_photos):
+    uid = make_user()
+    names = ["DMart", "D-Mart", "DMART Ltd"]
+    for photo_id, name in zip(make_photos(uid, 3, category="Receipt"), names):
+        save_receipt(db, photo_id, uid, {"Merchant Name": name, "Total Amount": "10", "Date": "2024-03-05"})
+    db.commit()
+    (group,) = spend_breakdown(db, uid, "merchant")
+    assert group["merchant"] in names and group["total"] == 30.0
+
+    # A cold index is rebuilt from the stored keys
+    forget_merchants(uid)
+    assert merchant_index(db, uid).match(["d", "mart"]) == "dmart"
+
+
+def test_index_cache_is_lru(db, make_user, monkeypatch):
+    monkeypatch.setattr(normalize_utils, "MERCHANT_CACHE_USERS", 1)
+    first, second = make_user("a@example.com"), make_user("b@example.com")
+    index = merchant_index(db, first)
+    assert merchant_index(db, first) is index
+    merchant_index(db, second)
+    assert merchant_index(db, first) is not index
@@ -0,0 +1,53 @@
+"""Saving an analyzed receipt upload (backend/routers/receipts.py)."""
+import io
+import zipfile
+from types import SimpleNamespace
+import pytest
+from backend.models.photo import Photo
+from backend.routers import receipts
+from backend.storage import content_key, storage
+
+KEY = content_key("receipts", "cd" * 32, "jpg")
+METADATA = {"size_bytes": 5, "taken_at": None}
+
+
+def failing_save_receipt(*args):
+    raise RuntimeError("insert failed")
+
+
+def test_a_failed_save_rolls_back_and_releases_the_new_file(db, make_user, monkeypatch):
+    uid = make_user()
+    storage.put_bytes(KEY, b"bytes")
+    monkeypatch.setattr(receipts, "save_receipt", failing_save_receipt)
+    with pytest.raises(RuntimeError):
+        receipts._save_analyzed_receipt(db, uid, KEY, "bill.jpg", dict(METADATA), {})
+    assert db.query(Photo).count() == 0
+    assert not storage.exists(KEY)
+
+
+def test_a_failed_save_keeps_content_another_row_uses(db, make_user, make_photos, monkeypatch):
+    uid = make_user()
+    storage.put_bytes(KEY, b"bytes")
+    make_photos(uid, 1, path=KEY, category="Receipt")
+    db.commit()
+    monkeypatch.setattr(receipts, "save_receipt", failing_save_receipt)
+    with pytest.raises(RuntimeError):
+        receipts._save_analyzed_receipt(db, uid, KEY, "bill.jpg", dict(METADATA), {})
+    assert db.query(Photo).count() == 1
+    assert storage.exists(KEY)
+
+
+def test_import_entries_list_plain_files_and_zip_members():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("march/a.jpg", b"a")
+        zf.writestr("march/", b"")
+        zf.writestr("__MACOSX/march/._a.jpg", b"x")
+        zf.writestr(".hidden.jpg", b"x")
+    archive.seek(0)
+    files = [SimpleNamespace(filename="bills.zip", file=archive),
+             SimpleNamespace(filename="b.jpg", file=io.BytesIO(b"bb"))]
+    entries = receipts._import_entries(files)
+    assert [(name, size) for name, size, _ in entries] == [("march/a.jpg", 1), ("b.jpg", 2)]
+    with entries[0][2]() as member:
+        assert member.read() == b"a"
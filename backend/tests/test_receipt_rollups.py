@@ -0,0 +1,119 @@
+"""Monthly receipt rollups and SQL-side spend analytics (backend/receipt_utils.py)."""
+from datetime import date
+from backend import receipt_utils
+from backend.models.receipt import Receipt
+from backend.models.receipt_monthly import ReceiptMonthly
+from backend.receipt_utils import (
+    add_receipts_bulk, monthly_rollup, rebuild_receipt_rollups, receipt_totals, record_receipt_deleted,
+    record_receipt_saved, save_receipt, spend_breakdown, verify_receipt_rollups,
+)
+
+
+def add_receipt(db, make_photos, user_id, amount, when=None, category="Food", tax=0.0) -> Receipt:
+    (photo_id,) = make_photos(user_id, 1, category="Receipt")
+    receipt = Receipt(photo_id=photo_id, user_id=user_id, merchant="Corner Shop", amount=amount, tax=tax,
+                      date=when, category=category)
+    db.add(receipt)
+    db.flush()
+    record_receipt_saved(db, receipt)
+    return receipt
+
+
+def test_rollups_follow_inserts_and_deletes(db, make_user, make_photos):
+    uid = make_user()
+    add_receipt(db, make_photos, uid, 10.0, date(2024, 3, 1), tax=1.0)
+    add_receipt(db, make_photos, uid, 5.0, date(2024, 3, 31))
+    add_receipt(db, make_photos, uid, 7.0, date(2024, 4, 2), "Travel")
+    single = add_receipt(db, make_photos, uid, 2.0, date(2024, 3, 15))
+    db.commit()
+    assert verify_receipt_rollups(db, uid) == {}
+    assert monthly_rollup(db, uid, year=2024) == [
+        {"year": 2024, "month": 4, "total": 7.0, "tax": 0.0, "count": 1},
+        {"year": 2024, "month": 3, "total": 17.0, "tax": 1.0, "count": 3},
+    ]
+
+    record_receipt_deleted(db, single)
+    db.delete(single)
+    db.commit()
+    assert verify_receipt_rollups(db, uid) == {}
+    # The materialized rollup agrees with the live GROUP BY
+    live = {(r["year"], r["month"]): r["total"] for r in spend_breakdown(db, uid, "month")}
+    stored = {(r["year"], r["month"]): r["total"] for r in monthly_rollup(db, uid)}
+    assert live == stored == {(2024, 4): 7.0, (2024, 3): 15.0}
+
+
+def test_breakdowns_and_totals(db, make_user, make_photos):
+    uid = make_user()
+    add_receipt(db, make_photos, uid, 10.0, date(2024, 3, 10))
+    add_receipt(db, make_photos, uid, 5.0, date(2024, 3, 20), "Travel")
+    add_receipt(db, make_photos, uid, 7.0, date(2024, 5, 2), "Travel")
+    db.commit()
+    by_category = {r["category"]: r["total"] for r in spend_breakdown(db, uid, "category")}
+    assert by_category == {"Travel": 12.0, "Food": 10.0}
+    assert receipt_totals(db, uid, date(2024, 3, 5), date(2024, 4, 30)) == {"count": 2, "total": 15.0, "tax": 0.0}
+    assert receipt_totals(db, uid)["count"] == 3
+
+
+def vision(amount: str, when: str = None) -> dict:
+    data = {"Merchant Name": "Corner Shop", "Total Amount": amount, "Category": "Food"}
+    if when:
+        data["Date"] = when
+    return data
+
+
+def test_undated_receipts_bucket_by_upload_date_on_every_path(db, make_user, make_photos, monkeypatch):
+    class Yesteryear(date):
+        @classmethod
+        def today(cls):
+            return cls(2001, 1, 1)
+    # Neither write path may fall back to the clock when the row has a created_at
+    monkeypatch.setattr(receipt_utils, "date", Yesteryear)
+    uid = make_user()
+    photos = make_photos(uid, 2, category="Receipt")
+    add_receipts_bulk(db, uid, [(photos[0], vision("4"))])
+    save_receipt(db, photos[1], uid, vision("6"))
+    db.commit()
+    assert verify_receipt_rollups(db, uid) == {}
+    created = db.query(Receipt.created_at).filter(Receipt.user_id == uid).first()[0]
+    assert [(r.year, r.month) for r in db.query(ReceiptMonthly)] == [(created.year, created.month)]
+
+
+def test_date_filters_include_both_ends(db, make_user, make_photos):
+    uid = make_user()
+    photos = make_photos(uid, 4, category="Receipt")
+    add_receipts_bulk(db, uid, [(photos[0], vision("10", "2024-03-01")), (photos[1], vision("5", "2024-03-31")),
+                                (photos[2], vision("7", "2024-04-01")), (photos[3], vision("3"))])
+    db.commit()
+    assert receipt_totals(db, uid, date(2024, 3, 1), date(2024, 3, 31)) == {"count": 2, "total": 15.0, "tax": 0.0}
+    assert receipt_totals(db, uid, date(2024, 3, 31), date(2024, 3, 31))["count"] == 1
+    assert receipt_totals(db, uid, start=date(2024, 4, 1))["count"] == 2  # the undated one counts from its upload
+    created = db.query(Receipt.created_at).filter(Receipt.date.is_(None)).scalar().date()
+    assert receipt_totals(db, uid, created, created) == {"count": 1, "total": 3.0, "tax": 0.0}
+
+
+def test_weeks_are_iso_weeks(db, make_user, make_photos):
+    days = [date(2024, 3, 14), date(2024, 12, 30), date(2021, 1, 3), date(2021, 1, 4), date(2020, 12, 31)]
+    uid = make_user()
+    photos = make_photos(uid, len(days), category="Receipt")
+    add_receipts_bulk(db, uid, [(pid, vision("1", day.isoformat())) for pid, day in zip(photos, days)])
+    db.commit()
+    expected = {}
+    for day in days:
+        iso = day.isocalendar()
+        expected[iso.year * 100 + iso.week] = expected.get(iso.year * 100 + iso.week, 0) + 1
+    assert {r["week"]: r["count"] for r in spend_breakdown(db, uid, "week")} == expected
+    assert 202501 in expected and 202053 in expected  # weeks that belong to the neighbouring year
+
+
+def test_drift_is_reported_and_rebuilt(db, make_user, make_photos):
+    uid = make_user()
+    add_receipt(db, make_photos, uid, 10.0, date(2024, 3, 1))
+    add_receipt(db, make_photos, uid, 5.0, date(2024, 5, 1))
+    db.commit()
+    db.query(ReceiptMonthly).filter(ReceiptMonthly.month == 3).update({ReceiptMonthly.total: 99.0})
+    db.query(ReceiptMonthly).filter(ReceiptMonthly.month == 5).delete()
+    db.commit()
+    assert set(verify_receipt_rollups(db, uid)) == {(2024, 3, "Food"), (2024, 5, "Food")}
+
+    rebuild_receipt_rollups(db, uid)
+    assert verify_receipt_rollups(db, uid) == {}
@@ -0,0 +1,73 @@
+"""FTS5 search sidecar (backend/search_index.py)."""
+from datetime import date
+import pytest
+from backend import search_index
+from backend.models.person import Person
+from backend.models.receipt import Receipt
+from backend.search_index import index_documents, rebuild_search_index, remove_documents, search, verify_search_index
+
+
+@pytest.fixture(autouse=True)
+def empty_index():
+    with search_index._lock:
+        conn = search_index._connection()
+        with conn:
+            conn.execute("DELETE FROM documents")
+    yield
+
+
+def add_receipt(db, make_photos, user_id, merchant, amount, when, category="Food") -> int:
+    (photo_id,) = make_photos(user_id, 1, category="Receipt")
+    receipt = Receipt(photo_id=photo_id, user_id=user_id, merchant=merchant,
+                      merchant_normalized=merchant.lower(), amount=amount, tax=0.0, date=when, category=category)
+    db.add(receipt)
+    db.commit()
+    index_documents(db, "photo", [photo_id])
+    index_documents(db, "receipt", [receipt.id])
+    return receipt.id
+
+
+def test_prefix_match_and_filters(db, make_user, make_photos):
+    uid = make_user()
+    dmart = add_receipt(db, make_photos, uid, "DMart", 120.0, date(2024, 3, 5))
+    add_receipt(db, make_photos, uid, "Metro Cabs", 40.0, date(2024, 4, 1), "Transport")
+
+    assert [r["id"] for r in search(uid, "dma")] == [dmart]
+    assert search(uid, "dmart cabs") == []  # every word must match
+    assert [r["title"] for r in search(uid, kinds=["receipt"], category="Transport")] == ["Metro Cabs"]
+    assert [r["title"] for r in search(uid, kinds=["receipt"], start=date(2024, 3, 10))] == ["Metro Cabs"]
+    assert [r["title"] for r in search(uid, min_amount=100)] == ["DMart"]
+    # Without a query, newest first
+    assert [r["title"] for r in search(uid, kinds=["receipt"])] == ["Metro Cabs", "DMart"]
+
+
+def test_reindex_is_idempotent_and_removal(db, make_user, make_photos):
+    uid = make_user()
+    rid = add_receipt(db, make_photos, uid, "DMart", 120.0, date(2024, 3, 5))
+    db.query(Receipt).filter(Receipt.id == rid).update({Receipt.merchant: "Reliance Fresh"})
+    db.commit()
+    index_documents(db, "receipt", [rid])
+    assert [r["title"] for r in search(uid, "reliance")] == ["Reliance Fresh"]
+    assert verify_search_index(db, uid) == {}
+
+    remove_documents("receipt", [rid])
+    assert search(uid, "reliance") == []
+    assert verify_search_index(db, uid) == {"receipt": (0, 1)}
+
+
+def test_results_are_per_user(db, make_user, make_photos):
+    owner, other = make_user("a@example.com"), make_user("b@example.com")
+    add_receipt(db, make_photos, owner, "DMart", 10.0, date(2024, 3, 5))
+    assert search(other, "dmart") == []
+
+
+def test_rebuild_restores_missing_documents(db, make_user, make_photos):
+    uid = make_user()
+    make_photos(uid, 2)
+    db.add(Person(user_id=uid, name="Asha"))
+    db.commit()
+    assert verify_search_index(db, uid) == {"photo": (0, 2), "person": (0, 1)}
+
+    rebuild_search_index(db, uid)
+    assert verify_search_index(db, uid) == {}
+    assert [r["kind"] for r in search(uid, "asha")] == ["person"]
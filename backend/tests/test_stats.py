@@ -0,0 +1,90 @@
+"""Incremental dashboard counters (backend/stats_utils.py) against a full recompute."""
+from backend.models.face import Face
+from backend.models.person import Person
+from backend.models.photo import Photo
+from backend.models.receipt import Receipt
+from backend.models.user_stats import UserStats
+from backend.stats_utils import (
+    get_user_stats, rebuild_user_stats, verify_user_stats,
+    record_photo_added, record_photo_moved, record_photo_removed, record_person_added, record_person_removed,
+    record_photos_tagged, record_receipt_added, record_receipt_removed,
+)
+
+
+def add_photos(db, make_photos, user_id, count, category="General", size=1000):
+    ids = make_photos(user_id, count, category=category, size_bytes=size)
+    for _ in ids:
+        record_photo_added(db, user_id, category, size)
+    return ids
+
+
+def add_person(db, user_id, name="Ann") -> int:
+    person = Person(name=name, user_id=user_id)
+    db.add(person)
+    record_person_added(db, user_id)
+    db.flush()
+    return person.id
+
+
+def test_counters_track_every_write_path(db, make_user, make_photos):
+    uid = make_user()
+    get_user_stats(db, uid)  # materialize the row, as the first dashboard read does
+
+    general = add_photos(db, make_photos, uid, 3)
+    people_photos = add_photos(db, make_photos, uid, 2, category="Person", size=2500)
+    db.commit()
+    assert verify_user_stats(db, uid) == {}
+
+    photo = db.get(Photo, general[0])
+    record_photo_moved(db, uid, photo.category, "Document", photo.size_bytes)
+    photo.category = "Document"
+    receipt = Receipt(photo_id=general[1], amount=12.5, tax=1.25, merchant="Shop")
+    db.add(receipt)
+    record_receipt_added(db, uid, 12.5, 1.25)
+    db.commit()
+    assert verify_user_stats(db, uid) == {}
+
+    ann, bob = add_person(db, uid, "Ann"), add_person(db, uid, "Bob")
+    db.add_all([Face(photo_id=people_photos[0], person_id=ann, encoding=[]),
+                Face(photo_id=people_photos[1], person_id=bob, encoding=[])])
+    record_photos_tagged(db, uid, 2)
+    db.commit()
+    assert get_user_stats(db, uid).tagged_photo_count == 2
+    assert verify_user_stats(db, uid) == {}
+
+    record_person_removed(db, uid, bob)
+    db.query(Face).filter(Face.person_id == bob).update({Face.person_id: None})
+    db.delete(db.get(Person, bob))
+    record_receipt_removed(db, uid, receipt.amount, receipt.tax)
+    db.delete(receipt)
+    photo = db.get(Photo, people_photos[0])
+    record_photo_removed(db, uid, photo.category, photo.size_bytes, was_tagged=True)
+    db.query(Face).filter(Face.photo_id == photo.id).delete()
+    db.delete(photo)
+    db.commit()
+    assert verify_user_stats(db, uid) == {}
+    assert get_user_stats(db, uid).photo_count == 4
+
+
+def test_drift_is_reported_and_rebuilt(db, make_user, make_photos):
+    uid = make_user()
+    get_user_stats(db, uid)
+    add_photos(db, make_photos, uid, 2)
+    db.commit()
+
+    db.query(UserStats).filter(UserStats.user_id == uid).update({UserStats.photo_count: 5, UserStats.general_bytes: 0})
+    db.commit()
+    assert verify_user_stats(db, uid) == {"photo_count": (5, 2), "general_bytes": (0, 2000)}
+
+    rebuild_user_stats(db, uid)
+    assert verify_user_stats(db, uid) == {}
+
+
+def test_counters_are_per_user(db, make_user, make_photos):
+    first, second = make_user("a@example.com"), make_user("b@example.com")
+    get_user_stats(db, first), get_user_stats(db, second)
+    add_photos(db, make_photos, first, 4)
+    db.commit()
+    assert get_user_stats(db, first).photo_count == 4
+    assert get_user_stats(db, second).photo_count == 0
+    assert verify_user_stats(db, first) == {} and verify_user_stats(db, second) == {}
@@ -0,0 +1,89 @@
+"""Storage keys and reference-counted release of shared photo files (backend/storage.py)."""
+import io
+import pytest
+from backend.ingest_utils import ingest_upload
+from backend.models.photo import Photo
+from backend.storage import content_key, release_photo_files, resolve_key, storage
+
+SHA = "ab" * 32
+
+
+@pytest.mark.parametrize("raw, key", [
+    ("photos/ab/cd/x.jpg", "photos/ab/cd/x.jpg"),
+    ("uploads/photos/x.jpg", "photos/x.jpg"),
+    ("uploads\\vault\\x.enc", "vault/x.enc"),
+    ("/photos//x.jpg", "photos/x.jpg"),
+])
+def test_resolve_key_accepts_stored_forms(raw, key):
+    assert resolve_key(raw) == key
+
+
+@pytest.mark.parametrize("raw", ["", "..", "../etc/passwd", "photos/../../x"])
+def test_resolve_key_rejects_escapes(raw):
+    with pytest.raises(ValueError):
+        resolve_key(raw)
+
+
+def test_content_keys_are_sharded():
+    assert content_key("photos", SHA, ".JPG") == f"photos/ab/ab/{SHA}.jpg"
+    assert content_key("thumbnails", SHA) == f"thumbnails/ab/ab/{SHA}"
+
+
+def test_shared_files_are_released_with_their_last_row(db, make_user, make_photos):
+    uid = make_user()
+    key, thumb = content_key("photos", SHA, "jpg"), content_key("thumbnails", SHA, "jpg")
+    storage.put_bytes(key, b"photo")
+    storage.put_bytes(thumb, b"thumb")
+    first, second = make_photos(uid, 2, path=key, thumbnail_path=thumb)
+    db.commit()
+
+    for photo_id, still_stored in ((first, True), (second, False)):
+        db.query(Photo).filter(Photo.id == photo_id).delete()
+        release_photo_files(db, [(key, thumb)])  # inside the deleting transaction
+        db.commit()
+        assert storage.exists(key) is still_stored
+        assert storage.exists(thumb) is still_stored
+
+
+def test_a_thumbnail_shared_across_extensions_outlives_one_of_them(db, make_user, make_photos):
+    uid = make_user()
+    jpg, jpeg = content_key("photos", SHA, "jpg"), content_key("photos", SHA, "jpeg")
+    thumb = content_key("thumbnails", SHA, "jpg")
+    for key in (jpg, jpeg, thumb):
+        storage.put_bytes(key, b"x")
+    (first,) = make_photos(uid, 1, path=jpg, thumbnail_path=thumb)
+    make_photos(uid, 1, path=jpeg, thumbnail_path=thumb)
+    db.commit()
+
+    db.query(Photo).filter(Photo.id == first).delete()
+    release_photo_files(db, [(jpg, thumb)])
+    db.commit()
+    assert not storage.exists(jpg)
+    assert storage.exists(jpeg) and storage.exists(thumb)
+
+
+def test_a_duplicate_upload_restores_files_a_concurrent_delete_removed(db, make_user, make_photos):
+    ingested = ingest_upload(io.BytesIO(b"\xff\xd8\xff" + b"\x00" * 61), "dup.jpg")
+    ingested.store("photos")
+    uid = make_user()
+    (original,) = make_photos(uid, 1, path=ingested.key)
+    db.commit()
+
+    duplicate = ingest_upload(io.BytesIO(ingested.data), "dup.jpg")
+    assert not duplicate.store("photos")  # skipped as already present...
+    db.query(Photo).filter(Photo.id == original).delete()
+    release_photo_files(db, [(ingested.key, None)])  # ...then the only row goes
+    db.commit()
+    assert not storage.exists(duplicate.key)
+
+    make_photos(uid, 1, path=duplicate.key)
+    duplicate.restore()
+    db.commit()
+    with storage.open(duplicate.key) as f:
+        assert f.read() == ingested.data
+
+
+def test_legacy_flat_keys_are_released(db, make_user):
+    storage.put_bytes("photos/legacy.jpg", b"photo")
+    release_photo_files(db, [("uploads/photos/legacy.jpg", None)])
+    assert not storage.exists("photos/legacy.jpg")
@@ -0,0 +1,101 @@
+"""Bulk face tagging (backend/people_utils.tag_people)."""
+import pytest
+from backend import people_utils
+from backend.models.face import Face
+from backend.models.person import Person
+from backend.people_utils import tag_people
+from backend.stats_utils import get_user_stats, verify_user_stats
+
+
+@pytest.fixture
+def owner(db, make_user):
+    uid = make_user()
+    get_user_stats(db, uid)
+    return uid
+
+
+def person(db, user_id, name="Ann") -> int:
+    row = Person(name=name, user_id=user_id)
+    db.add(row)
+    db.flush()
+    return row.id
+
+
+def faces(db, photo_id, count) -> list[int]:
+    rows = [Face(photo_id=photo_id, encoding=[]) for _ in range(count)]
+    db.add_all(rows)
+    db.flush()
+    return [f.id for f in rows]
+
+
+def people_of(db, photo_id) -> list:
+    return [p for (p,) in db.query(Face.person_id).filter(Face.photo_id == photo_id).order_by(Face.id)]
+
+
+def test_photo_tags_cover_every_face_or_add_a_placeholder(db, owner, make_photos):
+    with_faces, without = make_photos(owner, 2, category="Person")
+    faces(db, with_faces, 2)
+    ann = person(db, owner)
+    result = tag_people(db, owner, photo_tags=[(with_faces, ann), (without, ann)])
+    db.commit()
+    assert people_of(db, with_faces) == [ann, ann]
+    assert people_of(db, without) == [ann]
+    assert result["photo_ids"] == sorted([with_faces, without])
+    assert result["faces"] == 3 and result["newly_tagged"] == 2
+    assert get_user_stats(db, owner).tagged_photo_count == 2
+    assert "tagged_photo_count" not in verify_user_stats(db, owner)
+
+
+def test_face_tags_win_over_their_photo(db, owner, make_photos):
+    (photo_id,) = make_photos(owner, 1, category="Person")
+    first, second = faces(db, photo_id, 2)
+    ann, bob = person(db, owner, "Ann"), person(db, owner, "Bob")
+    tag_people(db, owner, photo_tags=[(photo_id, ann)], face_tags=[(second, bob)])
+    db.commit()
+    assert people_of(db, photo_id) == [ann, bob]
+
+
+def test_retagging_does_not_count_a_photo_twice(db, owner, make_photos):
+    (photo_id,) = make_photos(owner, 1, category="Person")
+    faces(db, photo_id, 1)
+    ann, bob = person(db, owner, "Ann"), person(db, owner, "Bob")
+    tag_people(db, owner, photo_tags=[(photo_id, ann)])
+    db.commit()
+    result = tag_people(db, owner, photo_tags=[(photo_id, bob)])
+    db.commit()
+    assert result["newly_tagged"] == 0 and result["faces"] == 1
+    assert people_of(db, photo_id) == [bob]
+    assert get_user_stats(db, owner).tagged_photo_count == 1
+    assert tag_people(db, owner, photo_tags=[(photo_id, bob)])["faces"] == 0  # already so: nothing written
+
+
+def test_conflicting_and_oversized_requests_are_refused(db, owner, make_photos, monkeypatch):
+    (photo_id,) = make_photos(owner, 1)
+    ann, bob = person(db, owner, "Ann"), person(db, owner, "Bob")
+    with pytest.raises(ValueError, match="more than one person"):
+        tag_people(db, owner, photo_tags=[(photo_id, ann), (photo_id, bob)])
+    monkeypatch.setattr(people_utils, "MAX_BULK_TAGS", 1)
+    with pytest.raises(ValueError, match="At most 1"):
+        tag_people(db, owner, photo_tags=[(photo_id, ann)], face_tags=[(1, ann)])
+
+
+def test_other_users_rows_are_not_found_and_nothing_is_staged(db, owner, make_user, make_photos):
+    stranger = make_user("stranger@example.com")
+    (mine,) = make_photos(owner, 1)
+    (theirs,) = make_photos(stranger, 1)
+    (their_face,) = faces(db, theirs, 1)
+    ann, their_person = person(db, owner), person(db, stranger, "Zed")
+    db.commit()
+    with pytest.raises(LookupError) as error:
+        tag_people(db, owner, photo_tags=[(mine, ann), (theirs, ann)],
+                   face_tags=[(their_face, ann)])
+    assert str(error.value) == f"Photo {theirs}, Face {their_face} not found"
+    with pytest.raises(LookupError, match=f"Person {their_person} not found"):
+        tag_people(db, owner, photo_tags=[(mine, their_person)])
+    db.rollback()
+    assert people_of(db, mine) == [] and people_of(db, theirs) == [None]
+    assert "tagged_photo_count" not in verify_user_stats(db, owner)
+
+
+def test_empty_request_is_a_no_op(db, owner):
+    assert tag_people(db, owner) == {"photo_ids": [], "faces": 0, "newly_tagged": 0, "people": {}}
@@ -0,0 +1,74 @@
+"""Capture-time timeline buckets and range browsing (backend/timeline_utils.py)."""
+from datetime import date, datetime
+from backend.models.photo_timeline import PhotoTimelineBucket
+from backend.timeline_utils import (
+    get_timeline, photos_in_range, rebuild_timeline, record_timeline_added, record_timeline_removed,
+    verify_timeline,
+)
+
+
+def add_photo(db, make_photos, user_id, taken_at, **fields) -> int:
+    (photo_id,) = make_photos(user_id, 1, taken_at=taken_at, **fields)
+    record_timeline_added(db, user_id, taken_at)
+    return photo_id
+
+
+def test_buckets_follow_adds_and_removes(db, make_user, make_photos):
+    uid = make_user()
+    for when in (datetime(2023, 12, 31, 23, 59), datetime(2024, 1, 5, 9), datetime(2024, 1, 5, 18),
+                 datetime(2024, 2, 1)):
+        add_photo(db, make_photos, uid, when)
+    add_photo(db, make_photos, uid, None)  # no capture time: not on the timeline
+    db.commit()
+    assert verify_timeline(db, uid) == {}
+    assert get_timeline(db, uid, "year") == [{"year": 2024, "count": 3}, {"year": 2023, "count": 1}]
+    assert get_timeline(db, uid, "month", year=2024) == [
+        {"year": 2024, "month": 2, "count": 1}, {"year": 2024, "month": 1, "count": 2},
+    ]
+    assert get_timeline(db, uid, "day", year=2024, month=1) == [{"year": 2024, "month": 1, "day": 5, "count": 2}]
+
+    record_timeline_removed(db, uid, datetime(2024, 2, 1))
+    db.commit()
+    # The emptied bucket stays at zero and is left out of the overview
+    assert db.query(PhotoTimelineBucket.photo_count).filter(PhotoTimelineBucket.month == 2).scalar() == 0
+    assert get_timeline(db, uid, "month", year=2024) == [{"year": 2024, "month": 1, "count": 2}]
+
+
+def test_drift_is_reported_and_rebuilt(db, make_user, make_photos):
+    uid = make_user()
+    make_photos(uid, 2, taken_at=datetime(2024, 3, 3))  # rows written without bumping their bucket
+    add_photo(db, make_photos, uid, datetime(2024, 3, 4))
+    record_timeline_added(db, uid, datetime(2020, 1, 1))  # a bucket with no photo behind it
+    db.commit()
+    assert verify_timeline(db, uid) == {(2024, 3, 3): (0, 2), (2020, 1, 1): (1, 0)}
+
+    rebuild_timeline(db, uid)
+    assert verify_timeline(db, uid) == {}
+    assert get_timeline(db, uid, "year") == [{"year": 2024, "count": 3}]
+
+
+def test_buckets_are_per_user(db, make_user, make_photos):
+    first, second = make_user("a@example.com"), make_user("b@example.com")
+    add_photo(db, make_photos, first, datetime(2024, 1, 1))
+    db.commit()
+    assert get_timeline(db, second) == []
+    assert verify_timeline(db, second) == {}
+
+
+def test_range_is_inclusive_and_pages_by_keyset(db, make_user, make_photos):
+    uid = make_user()
+    same_time = datetime(2024, 5, 31, 12)
+    ids = [add_photo(db, make_photos, uid, same_time) for _ in range(3)]
+    first_day = add_photo(db, make_photos, uid, datetime(2024, 5, 1, 0, 0))
+    add_photo(db, make_photos, uid, datetime(2024, 6, 1, 0, 0))
+    receipt = add_photo(db, make_photos, uid, datetime(2024, 5, 10), category="Receipt")
+    db.commit()
+
+    in_may = photos_in_range(db, uid, date(2024, 5, 1), date(2024, 5, 31))
+    assert [p.id for p in in_may] == [*reversed(ids), receipt, first_day]
+    assert [p.id for p in photos_in_range(db, uid, date(2024, 5, 1), date(2024, 5, 31), category="Receipt")] == [receipt]
+
+    page = photos_in_range(db, uid, date(2024, 5, 1), date(2024, 5, 31), limit=2)
+    rest = photos_in_range(db, uid, date(2024, 5, 1), date(2024, 5, 31),
+                           before=page[-1].taken_at, before_id=page[-1].id)
+    assert [p.id for p in page + rest] == [p.id for p in in_may]
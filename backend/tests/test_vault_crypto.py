@@ -0,0 +1,107 @@
+"""The PLV1 vault file format (backend/vault_crypto.py)."""
+import io
+import os
+import pytest
+from backend import vault_crypto
+from backend.vault_crypto import (
+    HEADER_SIZE, TAG_SIZE, VaultDecryptionError, VaultKeyError,
+    decrypt_range, encrypt_stream, plaintext_size, read_header, unwrap_key,
+)
+
+CHUNK = 64
+USER_ID = 7
+
+
+def encrypt(data: bytes, chunk_size: int = CHUNK) -> tuple[bytes, bytes]:
+    out = io.BytesIO()
+    meta = encrypt_stream(io.BytesIO(data), out, USER_ID, chunk_size=chunk_size)
+    assert meta["size_bytes"] == len(data)
+    return out.getvalue(), unwrap_key(meta["wrapped_key"], USER_ID)
+
+
+def decrypt(blob: bytes, key: bytes, start: int = 0, end: int = None) -> bytes:
+    return b"".join(decrypt_range(io.BytesIO(blob), key, start, end))
+
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 3 * CHUNK + 17])
+def test_round_trip(size):
+    data = os.urandom(size)
+    blob, key = encrypt(data)
+    assert decrypt(blob, key) == data
+    assert plaintext_size(len(blob), CHUNK) == size
+
+
+def test_layout_is_header_plus_one_tag_per_chunk():
+    blob, _ = encrypt(b"x" * (2 * CHUNK + 5))
+    assert len(blob) == HEADER_SIZE + 3 * TAG_SIZE + 2 * CHUNK + 5
+    header, chunk_size, _ = read_header(io.BytesIO(blob))
+    assert header.startswith(b"PLV1") and chunk_size == CHUNK
+
+
+@pytest.mark.parametrize("start,end", [(0, 0), (5, 70), (CHUNK - 1, CHUNK), (CHUNK, 2 * CHUNK - 1),
+                                       (100, 10_000), (3 * CHUNK + 16, None), (50, 10)])
+def test_range_reads_match_slices(start, end):
+    data = os.urandom(3 * CHUNK + 17)
+    blob, key = encrypt(data)
+    expected = data[start:] if end is None else data[start:end + 1]
+    assert decrypt(blob, key, start, end) == expected
+
+
+def test_every_truncation_is_detected():
+    data = os.urandom(2 * CHUNK + 10)
+    blob, key = encrypt(data)
+    for length in range(len(blob)):
+        with pytest.raises(VaultDecryptionError):
+            decrypt(blob[:length], key)
+
+
+def test_dropping_or_cutting_chunks_is_detected():
+    blob, key = encrypt(os.urandom(3 * CHUNK))
+    for length in (HEADER_SIZE + 2 * (CHUNK + TAG_SIZE), HEADER_SIZE + 2 * (CHUNK + TAG_SIZE) + 40, len(blob) - 1):
+        with pytest.raises(VaultDecryptionError):
+            decrypt(blob[:length], key)
+
+
+def test_tampering_is_detected():
+    blob, key = encrypt(os.urandom(2 * CHUNK))
+    for offset in (HEADER_SIZE + 3, HEADER_SIZE + CHUNK + TAG_SIZE + 1, len(blob) - 1, 10):
+        tampered = bytearray(blob)
+        tampered[offset] ^= 0x01
+        with pytest.raises(VaultDecryptionError):
+            decrypt(bytes(tampered), key)
+
+
+def test_foreign_files_are_rejected():
+    blob, key = encrypt(b"hello")
+    with pytest.raises(VaultDecryptionError, match="Not a vault"):
+        read_header(io.BytesIO(b"XXXX" + blob[4:]))
+    with pytest.raises(VaultDecryptionError, match="truncated"):
+        read_header(io.BytesIO(blob[:HEADER_SIZE - 1]))
+    zero_chunk = blob[:4] + b"\0\0\0\0" + blob[8:]
+    with pytest.raises(VaultDecryptionError, match="corrupt"):
+        decrypt(zero_chunk, key)
+
+
+def test_plaintext_size_rejects_impossible_lengths():
+    for ciphertext_size in (HEADER_SIZE, HEADER_SIZE + TAG_SIZE - 1,
+                            HEADER_SIZE + CHUNK + TAG_SIZE + TAG_SIZE):
+        with pytest.raises(VaultDecryptionError):
+            plaintext_size(ciphertext_size, CHUNK)
+
+
+def test_file_keys_are_bound_to_their_user():
+    out = io.BytesIO()
+    meta = encrypt_stream(io.BytesIO(b"secret"), out, USER_ID)
+    with pytest.raises(VaultDecryptionError):
+        unwrap_key(meta["wrapped_key"], USER_ID + 1)
+
+
+def test_master_key_is_required_and_separate_from_the_jwt_secret(monkeypatch):
+    from backend.auth_utils import SECRET_KEY
+    monkeypatch.delenv("VAULT_MASTER_KEY")
+    with pytest.raises(VaultKeyError):
+        encrypt_stream(io.BytesIO(b"x"), io.BytesIO(), USER_ID)
+    monkeypatch.setenv("VAULT_MASTER_KEY", SECRET_KEY)
+    assert vault_crypto.master_key_problem()
+    with pytest.raises(VaultKeyError):
+        vault_crypto.user_key(USER_ID)
@@ -0,0 +1,84 @@
+"""The per-user semantic search index (backend/vector_index.py)."""
+import json
+import os
+import threading
+import numpy as np
+import pytest
+from backend import vector_index
+
+DIM = 8
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "INDEX_DIR", str(tmp_path))
+    assert vector_index.compatible("test-model", DIM)
+    return tmp_path
+
+
+def vectors(count: int, seed: int = 0) -> list[np.ndarray]:
+    rows = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return list((rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float16))
+
+
+def best(user_id: int, query: np.ndarray) -> int:
+    return vector_index.search(user_id, query.astype(np.float32), limit=1)[0][0]
+
+
+def test_search_returns_the_nearest_photo():
+    vs = vectors(10)
+    vector_index.add(1, list(range(1, 11)), vs)
+    assert [best(1, v) for v in vs] == list(range(1, 11))
+    assert vector_index.search(2, vs[0].astype(np.float32)) == []
+
+
+def test_a_torn_append_cannot_misalign_ids_and_vectors(index_dir):
+    vs = vectors(4)
+    vector_index.add(1, [1, 2, 3], vs[:3])
+    with open(index_dir / "1.idx", "ab") as f:
+        f.write(b"\x07" * 13)  # a crash part-way through the next record
+    assert vector_index.indexed_ids(1) == {1, 2, 3}
+
+    vector_index.add(1, [4], vs[3:])
+    assert os.path.getsize(index_dir / "1.idx") == 4 * vector_index._record(DIM).itemsize
+    assert vector_index.indexed_ids(1) == {1, 2, 3, 4}
+    assert [best(1, v) for v in vs] == [1, 2, 3, 4]
+
+
+def test_remove_replace_and_compact(index_dir):
+    vs = vectors(8)
+    vector_index.add(1, list(range(1, 9)), vs)
+    vector_index.add(1, [3], [vs[5]])  # re-adding replaces the old row
+    assert vector_index.indexed_ids(1) == set(range(1, 9))
+
+    vector_index.remove(1, [1, 2])
+    assert vector_index.indexed_ids(1) == set(range(3, 9))
+    assert os.path.getsize(index_dir / "1.idx") == 6 * vector_index._record(DIM).itemsize  # compacted
+    assert best(1, vs[7]) == 8
+
+    vector_index.drop(1)
+    assert vector_index.indexed_ids(1) == set()
+
+
+def test_indexes_from_another_model_or_format_are_incompatible(index_dir):
+    assert not vector_index.compatible("other-model", DIM)
+    (index_dir / "meta.json").write_text(json.dumps({"model": "test-model", "dim": DIM}))  # format 1
+    assert not vector_index.compatible("test-model", DIM)
+
+
+def test_concurrent_re_adds_leave_one_live_row():
+    vs = vectors(8)
+    barrier = threading.Barrier(8)
+
+    def re_add(i):
+        barrier.wait()
+        for _ in range(10):
+            vector_index.add(1, [5], [vs[i]])
+
+    threads = [threading.Thread(target=re_add, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    records = vector_index._load(1, DIM)
+    assert list(records["id"][records["id"] != -1]) == [5]
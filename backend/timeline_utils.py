@@ -0,0 +1,150 @@
+"""
+Capture-time timeline: per-day bucket counts kept in `photo_timeline`.
+
+Buckets are bumped in the same transaction as the photo insert/delete, so the
+timeline overview is a read of at most a few thousand tiny rows per user and
+never touches `photos`. Date-range listings go through the
+(user_id, taken_at) index on `photos`.
+"""
+from datetime import datetime, date, time
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models.photo import Photo
+from .models.photo_timeline import PhotoTimelineBucket
+
+GRANULARITIES = ("year", "month", "day")
+
+
+def capture_time(taken_at: datetime | None) -> datetime:
+    """Timeline position for a new photo: EXIF capture time, else now."""
+    return taken_at or datetime.utcnow()
+
+
+def _bucket_filter(user_id: int, when: datetime):
+    return (
+        PhotoTimelineBucket.user_id == user_id,
+        PhotoTimelineBucket.year == when.year,
+        PhotoTimelineBucket.month == when.month,
+        PhotoTimelineBucket.day == when.day,
+    )
+
+
+def record_timeline_added(db: Session, user_id: int, taken_at: datetime | None, count: int = 1):
+    """Add `count` photos to the day bucket of `taken_at`, creating it if needed. Does not commit."""
+    if taken_at is None:
+        return
+    updated = db.query(PhotoTimelineBucket).filter(*_bucket_filter(user_id, taken_at)).update(
+        {PhotoTimelineBucket.photo_count: PhotoTimelineBucket.photo_count + count},
+        synchronize_session=False,
+    )
+    if updated:
+        return
+    try:
+        with db.begin_nested():
+            db.add(PhotoTimelineBucket(user_id=user_id, year=taken_at.year, month=taken_at.month,
+                                       day=taken_at.day, photo_count=count))
+    except IntegrityError:
+        # Bucket was created concurrently — fall back to the increment
+        db.query(PhotoTimelineBucket).filter(*_bucket_filter(user_id, taken_at)).update(
+            {PhotoTimelineBucket.photo_count: PhotoTimelineBucket.photo_count + count},
+            synchronize_session=False,
+        )
+
+
+def record_timeline_added_many(db: Session, user_id: int, taken_ats: list[datetime | None]):
+    """Add a batch of photos with one bump per day bucket. Does not commit."""
+    days = {}
+    for taken_at in taken_ats:
+        if taken_at is not None:
+            day = taken_at.date()
+            days[day] = (days[day][0] + 1, days[day][1]) if day in days else (1, taken_at)
+    for count, taken_at in days.values():
+        record_timeline_added(db, user_id, taken_at, count=count)
+
+
+def record_timeline_removed(db: Session, user_id: int, taken_at: datetime | None):
+    if taken_at is None:
+        return
+    db.query(PhotoTimelineBucket).filter(*_bucket_filter(user_id, taken_at)).update(
+        {PhotoTimelineBucket.photo_count: PhotoTimelineBucket.photo_count - 1},
+        synchronize_session=False,
+    )
+
+
+def get_timeline(db: Session, user_id: int, granularity: str = "month",
+                 year: int = None, month: int = None) -> list[dict]:
+    """Bucket counts at year/month/day granularity, newest first."""
+    keys = [PhotoTimelineBucket.year, PhotoTimelineBucket.month, PhotoTimelineBucket.day]
+    keys = keys[:GRANULARITIES.index(granularity) + 1]
+
+    query = db.query(*keys, func.sum(PhotoTimelineBucket.photo_count)).filter(
+        PhotoTimelineBucket.user_id == user_id,
+        PhotoTimelineBucket.photo_count > 0,
+    )
+    if year is not None:
+        query = query.filter(PhotoTimelineBucket.year == year)
+    if month is not None:
+        query = query.filter(PhotoTimelineBucket.month == month)
+    rows = query.group_by(*keys).order_by(*[k.desc() for k in keys]).all()
+
+    names = GRANULARITIES[:len(keys)]
+    return [dict(zip(names, row[:-1]), count=int(row[-1])) for row in rows]
+
+
+def photos_in_range(db: Session, user_id: int, start: date = None, end: date = None,
+                    category: str = None, before: datetime = None, before_id: int = None,
+                    limit: int = 100) -> list[Photo]:
+    """
+    Photos captured in [start, end], newest first. Pages with a keyset cursor
+    (`before`, `before_id` = taken_at/id of the last row of the previous page).
+    """
+    query = db.query(Photo).filter(Photo.user_id == user_id, Photo.taken_at.isnot(None))
+    if start is not None:
+        query = query.filter(Photo.taken_at >= datetime.combine(start, time.min))
+    if end is not None:
+        query = query.filter(Photo.taken_at <= datetime.combine(end, time.max))
+    if category:
+        query = query.filter(Photo.category == category)
+    if before is not None:
+        if before_id is not None:
+            query = query.filter(
+                (Photo.taken_at < before) | ((Photo.taken_at == before) & (Photo.id < before_id))
+            )
+        else:
+            query = query.filter(Photo.taken_at < before)
+    return query.order_by(Photo.taken_at.desc(), Photo.id.desc()).limit(limit).all()
+
+
+def compute_timeline(db: Session, user_id: int) -> dict:
+    """{(year, month, day): count} straight from `photos` (the slow path)."""
+    counts = {}
+    for (taken_at,) in db.query(Photo.taken_at).filter(Photo.user_id == user_id, Photo.taken_at.isnot(None)):
+        key = (taken_at.year, taken_at.month, taken_at.day)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def verify_timeline(db: Session, user_id: int) -> dict:
+    """Return {(year, month, day): (stored, actual)} for every drifted bucket."""
+    actual = compute_timeline(db, user_id)
+    stored = {
+        (b.year, b.month, b.day): b.photo_count
+        for b in db.query(PhotoTimelineBucket).filter(PhotoTimelineBucket.user_id == user_id)
+    }
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in set(actual) | set(stored)
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
+
+
+def rebuild_timeline(db: Session, user_id: int):
+    """Replace the user's buckets with a fresh recompute. Commits."""
+    counts = compute_timeline(db, user_id)
+    db.query(PhotoTimelineBucket).filter(PhotoTimelineBucket.user_id == user_id).delete(synchronize_session=False)
+    db.add_all(
+        PhotoTimelineBucket(user_id=user_id, year=y, month=m, day=d, photo_count=c)
+        for (y, m, d), c in counts.items()
+    )
+    db.commit()
@@ -0,0 +1,195 @@
+"""
+Chunked, authenticated encryption for vault files.
+
+File layout (all integers big-endian):
+
+    header  = b"PLV1" | chunk_size (u32) | nonce_prefix (8 bytes)
+    chunk_i = AES-256-GCM(file_key, nonce = nonce_prefix | i (u32),
+                          aad = header | i (u32) | is_last (u8))
+
+Every chunk but the last holds exactly `chunk_size` plaintext bytes, so the
+ciphertext offset of any plaintext byte is known without reading the file:
+range reads seek straight to the chunks they need and decrypt only those.
+Binding the chunk index and the last-chunk flag into the AAD stops chunks
+being reordered, dropped or the file being truncated.
+
+Each file gets a random 256-bit key, stored wrapped (AES-GCM) under a
+per-user key derived with HKDF from VAULT_MASTER_KEY, so rotating a user's
+key only rewraps 60 bytes per file. VAULT_MASTER_KEY is required and must
+differ from the JWT SECRET_KEY: without it nothing is encrypted or
+decrypted. Files wrapped under the old SECRET_KEY fallback are rewrapped by
+backend/migrate_vault.py.
+"""
+import os
+import struct
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+MAGIC = b"PLV1"
+HEADER = struct.Struct(">4sI8s")
+HEADER_SIZE = HEADER.size
+TAG_SIZE = 16
+CHUNK_SIZE = int(os.getenv("VAULT_CHUNK_SIZE", 64 * 1024))
+
+
+class VaultDecryptionError(Exception):
+    """Raised when a vault file fails authentication (tampered, truncated or wrong key)."""
+
+
+class VaultKeyError(RuntimeError):
+    """Raised when VAULT_MASTER_KEY is missing or reuses the JWT secret."""
+
+
+def master_key_problem() -> str | None:
+    """Why the configured VAULT_MASTER_KEY cannot be used, or None when it can."""
+    from .auth_utils import SECRET_KEY
+    secret = os.getenv("VAULT_MASTER_KEY")
+    if not secret:
+        return "VAULT_MASTER_KEY is not set"
+    if secret == SECRET_KEY:
+        return "VAULT_MASTER_KEY must differ from the JWT SECRET_KEY"
+    return None
+
+
+def _master_key() -> bytes:
+    problem = master_key_problem()
+    if problem:
+        raise VaultKeyError(problem)
+    return os.environ["VAULT_MASTER_KEY"].encode("utf-8")
+
+
+def user_key(user_id: int, master: bytes = None) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=f"personalens-vault-user:{user_id}".encode(),
+    ).derive(master or _master_key())
+
+
+def wrap_key(file_key: bytes, user_id: int) -> str:
+    nonce = os.urandom(12)
+    wrapped = AESGCM(user_key(user_id)).encrypt(nonce, file_key, b"vault-file-key")
+    return (nonce + wrapped).hex()
+
+
+def unwrap_key(wrapped_hex: str, user_id: int, master: bytes = None) -> bytes:
+    raw = bytes.fromhex(wrapped_hex)
+    try:
+        return AESGCM(user_key(user_id, master)).decrypt(raw[:12], raw[12:], b"vault-file-key")
+    except InvalidTag as e:
+        raise VaultDecryptionError("Could not unwrap vault file key") from e
+
+
+def _aad(header: bytes, index: int, last: bool) -> bytes:
+    return header + struct.pack(">IB", index, 1 if last else 0)
+
+
+def _nonce(prefix: bytes, index: int) -> bytes:
+    return prefix + struct.pack(">I", index)
+
+
+def _read_full(src, n: int) -> bytes:
+    """Read exactly n bytes unless EOF comes first (tolerates short reads)."""
+    data = src.read(n)
+    while data and len(data) < n:
+        more = src.read(n - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def encrypt_stream(src, dst, user_id: int, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Encrypt the binary stream `src` into `dst` one chunk at a time (constant memory).
+    Returns {"wrapped_key", "nonce_prefix", "size_bytes"} for the VaultFile row.
+    """
+    file_key = AESGCM.generate_key(bit_length=256)
+    wrapped_key = wrap_key(file_key, user_id)  # before any output: fails fast without VAULT_MASTER_KEY
+    aead = AESGCM(file_key)
+    prefix = os.urandom(8)
+    header = HEADER.pack(MAGIC, chunk_size, prefix)
+    dst.write(header)
+
+    index, total = 0, 0
+    chunk = _read_full(src, chunk_size)
+    while True:
+        # One chunk of look-ahead tells us whether this chunk is the last one
+        following = _read_full(src, chunk_size) if len(chunk) == chunk_size else b""
+        last = not following
+        dst.write(aead.encrypt(_nonce(prefix, index), chunk, _aad(header, index, last)))
+        total += len(chunk)
+        index += 1
+        if last:
+            break
+        chunk = following
+
+    return {"wrapped_key": wrapped_key, "nonce_prefix": prefix.hex(), "size_bytes": total}
+
+
+def read_header(src) -> tuple[bytes, int, bytes]:
+    src.seek(0)
+    header = src.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE:
+        raise VaultDecryptionError("Vault file is truncated")
+    magic, chunk_size, prefix = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise VaultDecryptionError("Not a vault-encrypted file")
+    if chunk_size == 0:
+        raise VaultDecryptionError("Vault file header is corrupt")
+    return header, chunk_size, prefix
+
+
+def plaintext_size(ciphertext_size: int, chunk_size: int) -> int:
+    """
+    Plaintext length implied by the ciphertext length. Only an empty file has
+    an empty (tag-only) chunk, so a body shorter than one tag, or a final
+    chunk with no room for plaintext, means the file was cut short.
+    """
+    body = ciphertext_size - HEADER_SIZE
+    full, tail = divmod(body, chunk_size + TAG_SIZE)
+    if body < TAG_SIZE or (0 < tail <= TAG_SIZE and full > 0) or (full == 0 and tail < TAG_SIZE):
+        raise VaultDecryptionError("Vault file is truncated")
+    return body - (full + (tail > 0)) * TAG_SIZE
+
+
+def decrypt_range(src, file_key: bytes, start: int = 0, end: int = None):
+    """
+    Yield plaintext bytes [start, end] (inclusive) from the seekable encrypted
+    stream `src`, decrypting only the chunks that overlap the range. `file_key`
+    comes from unwrap_key(), called up front so key errors surface before a
+    response starts.
+    """
+    header, chunk_size, prefix = read_header(src)
+    aead = AESGCM(file_key)
+
+    src.seek(0, os.SEEK_END)
+    size = plaintext_size(src.tell(), chunk_size)
+    last_index = max(0, -(-size // chunk_size) - 1)
+    end = size - 1 if end is None else min(end, size - 1)
+    if size == 0:
+        # Still authenticate the (empty) final chunk so a forged empty file is detected
+        src.seek(HEADER_SIZE)
+        _decrypt_chunk(aead, prefix, header, 0, src.read(TAG_SIZE), last=True)
+        return
+    if start > end:
+        return
+
+    for index in range(start // chunk_size, end // chunk_size + 1):
+        src.seek(HEADER_SIZE + index * (chunk_size + TAG_SIZE))
+        plain = _decrypt_chunk(aead, prefix, header, index, src.read(chunk_size + TAG_SIZE),
+                               last=index == last_index)
+        chunk_start = index * chunk_size
+        lo = max(start - chunk_start, 0)
+        hi = min(end - chunk_start + 1, len(plain))
+        yield plain[lo:hi]
+
+
+def _decrypt_chunk(aead: AESGCM, prefix: bytes, header: bytes, index: int, data: bytes, last: bool) -> bytes:
+    try:
+        return aead.decrypt(_nonce(prefix, index), data, _aad(header, index, last))
+    except InvalidTag as e:
+        raise VaultDecryptionError(f"Vault chunk {index} failed authentication") from e
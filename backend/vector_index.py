@@ -0,0 +1,187 @@
+"""
+Compact on-disk vector index for semantic photo search.
+
+One append-only file per user under VECTOR_INDEX_DIR, <user_id>.idx, of
+fixed-size records: an int64 photo id (-1 marks a deleted row) followed by
+`dim` float16 values (1,032 bytes per photo at dim 512). Keeping the id and
+its vector in one record means a crash mid-append can only leave a partial
+record at the end of the file; readers ignore it and the next append
+truncates it away first, so ids and vectors can never drift apart.
+
+Adding a photo appends one record; deleting rewrites its 8-byte id in place.
+Writers (add, remove, compact, drop) hold an exclusive flock on
+<user_id>.lock, so several API worker processes can share the directory;
+readers need no lock. Search memory-maps the file and does one
+matrix-vector product — exact cosine similarity, which stays in the low
+milliseconds for tens of thousands of photos per user. `compact()` drops
+deleted rows once they pile up. meta.json records the model, dimension and
+file format the vectors were built with; a mismatch disables search until
+backend/build_image_index.py --rebuild runs.
+"""
+import os
+import json
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialised
+    fcntl = None
+
+INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+COMPACT_RATIO = 0.25  # compact once a quarter of the rows are deleted
+FORMAT = 2  # 1: separate .vec / .ids files
+
+_lock = threading.Lock()
+
+
+def _path(user_id: int) -> str:
+    return os.path.join(INDEX_DIR, f"{int(user_id)}.idx")
+
+
+def _record(dim: int) -> np.dtype:
+    return np.dtype([("id", "<i8"), ("vector", "<f2", (dim,))])
+
+
+@contextmanager
+def _writer(user_id: int):
+    """Exclusive write access to a user's index, across threads and processes."""
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with _lock, open(os.path.join(INDEX_DIR, f"{int(user_id)}.lock"), "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_meta() -> dict | None:
+    try:
+        with open(os.path.join(INDEX_DIR, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(model: str, dim: int):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with open(os.path.join(INDEX_DIR, "meta.json"), "w") as f:
+        json.dump({"model": model, "dim": dim, "format": FORMAT}, f)
+
+
+def compatible(model: str, dim: int) -> bool:
+    """True if the on-disk vectors were built with `model` in this format (claims an empty index)."""
+    meta = read_meta()
+    if meta is None:
+        write_meta(model, dim)
+        return True
+    return meta.get("model") == model and meta.get("dim") == dim and meta.get("format") == FORMAT
+
+
+def _load(user_id: int, dim: int, mode: str = "r") -> np.ndarray:
+    """The user's records (memory-mapped); a torn final record is left out."""
+    path = _path(user_id)
+    record = _record(dim)
+    rows = os.path.getsize(path) // record.itemsize if os.path.exists(path) else 0
+    if rows == 0:
+        return np.zeros(0, dtype=record)
+    return np.memmap(path, dtype=record, mode=mode, shape=(rows,))
+
+
+def add(user_id: int, photo_ids: list[int], vectors: list[np.ndarray]):
+    """Append vectors for photos (replacing any existing rows for those ids)."""
+    pairs = [(pid, v) for pid, v in zip(photo_ids, vectors) if v is not None]
+    if not pairs:
+        return
+    records = np.zeros(len(pairs), dtype=_record(len(pairs[0][1])))
+    records["id"] = [pid for pid, _ in pairs]
+    records["vector"] = np.stack([v for _, v in pairs])
+    dim = records.dtype["vector"].shape[0]
+    # One writer section, so no other add of these ids can land between the tombstones and the append
+    with _writer(user_id):
+        if _remove_locked(user_id, records["id"], dim):
+            _compact_locked(user_id, dim)
+        with open(_path(user_id), "ab") as f:
+            # Drop a partial record left by a crashed append, so every record stays aligned
+            f.truncate(f.tell() - f.tell() % records.itemsize)
+            f.write(records.tobytes())
+
+
+def _remove_locked(user_id: int, photo_ids, dim: int) -> bool:
+    """Tombstone rows for these photos; the caller holds _writer. True if the index is due for compaction."""
+    records = _load(user_id, dim, mode="r+")
+    if len(records) == 0:
+        return False
+    ids = records["id"]
+    hit = np.isin(ids, np.asarray(photo_ids, dtype=np.int64))
+    if hit.any():
+        ids[hit] = -1
+        records.flush()
+    deleted = int((ids == -1).sum())
+    total = len(ids)
+    del ids, records
+    return deleted > COMPACT_RATIO * total
+
+
+def remove(user_id: int, photo_ids: list[int]):
+    """Tombstone rows for these photos in place."""
+    meta = read_meta()
+    if not photo_ids or meta is None or not os.path.exists(_path(user_id)):
+        return
+    with _writer(user_id):
+        if _remove_locked(user_id, photo_ids, meta["dim"]):
+            _compact_locked(user_id, meta["dim"])
+
+
+def _compact_locked(user_id: int, dim: int):
+    path = _path(user_id)
+    records = _load(user_id, dim)
+    kept = np.array(records[records["id"] != -1])
+    del records
+    with open(path + ".tmp", "wb") as f:
+        f.write(kept.tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def compact(user_id: int):
+    meta = read_meta()
+    if meta is None:
+        return
+    with _writer(user_id):
+        _compact_locked(user_id, meta["dim"])
+
+
+def drop(user_id: int):
+    with _writer(user_id):
+        base = os.path.join(INDEX_DIR, str(int(user_id)))
+        for path in (base + ".idx", base + ".vec", base + ".ids"):  # .vec / .ids: format 1
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def search(user_id: int, query: np.ndarray, limit: int = 20, min_score: float = None) -> list[tuple[int, float]]:
+    """[(photo_id, cosine similarity)] best first."""
+    records = _load(user_id, len(query))
+    if len(records) == 0:
+        return []
+    ids = np.asarray(records["id"])
+    scores = np.asarray(records["vector"], dtype=np.float32) @ query.astype(np.float32)
+    scores[ids == -1] = -np.inf
+    k = min(limit, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [
+        (int(ids[i]), float(scores[i])) for i in top
+        if np.isfinite(scores[i]) and (min_score is None or scores[i] >= min_score)
+    ]
+
+
+def indexed_ids(user_id: int) -> set[int]:
+    meta = read_meta()
+    if meta is None:
+        return set()
+    ids = _load(user_id, meta["dim"])["id"]
+    return {int(i) for i in ids if i != -1}
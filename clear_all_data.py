@@ -12,7 +12,7 @@ with engine.connect() as conn:
     # Disable FK checks temporarily (MySQL)
     conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
 
-    tables = ["faces", "receipts", "vault", "people", "photos", "users"]
+    tables = ["user_stats", "photo_timeline", "receipt_monthly", "faces", "receipt_items", "receipts", "vault", "people", "photos", "users"]
     for table in tables:
         result = conn.execute(text(f"DELETE FROM {table}"))
         print(f"  Cleared {table}: {result.rowcount} row(s)")
@@ -25,10 +25,23 @@ with engine.connect() as conn:
 
 print("\nDB cleared.")
 
-# Delete uploaded files
-for folder in ["uploads/photos", "uploads/vault", "uploads/receipts"]:
+# The search and vector indexes are derived data; they are recreated empty on next use
+for suffix in ["", "-wal", "-shm"]:
+    index_file = os.getenv("SEARCH_INDEX_PATH", "search_index.db") + suffix
+    if os.path.exists(index_file):
+        os.remove(index_file)
+        print(f"  Removed {index_file}")
+
+vector_dir = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+if os.path.exists(vector_dir):
+    shutil.rmtree(vector_dir)
+    print(f"  Removed {vector_dir}/")
+
+# Delete uploaded files (local storage; files are sharded into nested folders)
+storage_root = os.getenv("STORAGE_ROOT", "uploads")
+for folder in [os.path.join(storage_root, kind) for kind in ("photos", "vault", "receipts", "thumbnails")] + [os.getenv("INGEST_TMP_DIR", "ingest_tmp")]:
     if os.path.exists(folder):
-        count = len(os.listdir(folder))
+        count = sum(len(files) for _, _, files in os.walk(folder))
         shutil.rmtree(folder)
         os.makedirs(folder, exist_ok=True)
         print(f"  Cleared {folder}: {count} file(s) deleted")
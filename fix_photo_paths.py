@@ -1,23 +1,37 @@
+"""
+Rewrites stored file paths to canonical storage keys (backend/storage.py:
+resolve_key). Reads already accept the legacy forms ('uploads/' prefix,
+Windows separators); this just makes stored keys comparable again.
+"""
 import sys
 sys.path.insert(0, '.')
-from backend.database import engine
-from sqlalchemy import text
+from backend.database import SessionLocal
+from backend.models.photo import Photo
+from backend.models.vault import VaultFile
+from backend.storage import resolve_key
+
+db = SessionLocal()
+try:
+    fixed = 0
+    for column in (Photo.path, Photo.thumbnail_path, VaultFile.encrypted_path):
+        model = column.class_
+        last_id = 0
+        while True:
+            batch = (db.query(model.id, column).filter(model.id > last_id, column.isnot(None))
+                     .order_by(model.id).limit(1000).all())
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            for row_id, path in batch:
+                key = resolve_key(path)
+                if key != path:
+                    db.query(model).filter(model.id == row_id).update({column: key}, synchronize_session=False)
+                    fixed += 1
+            db.commit()
+    print(f"Fixed {fixed} stored path(s) in DB")
 
-with engine.connect() as conn:
-    # Fix paths that start with 'uploads/' or 'uploads\'
-    result = conn.execute(text("""
-        UPDATE photos
-        SET path = CASE
-            WHEN path LIKE 'uploads/%' THEN SUBSTRING(path, 9)
-            WHEN path LIKE 'uploads\\\\%' THEN SUBSTRING(path, 9)
-            ELSE path
-        END
-        WHERE path LIKE 'uploads/%' OR path LIKE 'uploads\\\\%'
-    """))
-    conn.commit()
-    print(f"Fixed {result.rowcount} photo path(s) in DB")
-    
     # Verify
-    rows = conn.execute(text("SELECT id, path FROM photos LIMIT 10")).fetchall()
-    for r in rows:
-        print(f"  id={r[0]}  path={r[1]}")
+    for row_id, path in db.query(Photo.id, Photo.path).limit(10):
+        print(f"  id={row_id}  path={path}")
+finally:
+    db.close()